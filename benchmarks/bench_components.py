@@ -0,0 +1,277 @@
+"""Benchmarks offline do DataSystem, LogSystem e EmbedSystem, com dublês de Guild/TextChannel/Member.
+
+Para cada tamanho de histórico de logs mede: carga inicial (migração do logs.json e leitura dos
+segmentos), custo por evento e bytes gravados do log_action, compactação (save_logs) e carga de
+documentos JSON grandes. Mede também a vazão de montagem de embeds.
+
+Uso:
+    python benchmarks/bench_components.py --sizes 1000,10000 --output bench.json
+
+O resultado é um JSON (commit, ambiente e uma lista de medições) para comparar entre commits.
+O tamanho de 1M de logs precisa de ~2 GB de memória livre."""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fakes import REPO_DIR, FakeGuild, FakeHTTP, load_main  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+ACTIONS = ('message_delete', 'message_edit', 'user_join', 'user_leave', 'command_used', 'clear')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def latency_summary(seconds):
+    """Resumo de uma lista de durações, em microssegundos"""
+    return {
+        'count': len(seconds),
+        'total_s': round(sum(seconds), 6),
+        'mean_us': round(statistics.mean(seconds) * 1e6, 2),
+        'p50_us': round(percentile(seconds, 0.50) * 1e6, 2),
+        'p99_us': round(percentile(seconds, 0.99) * 1e6, 2),
+        'max_us': round(max(seconds) * 1e6, 2)
+    }
+
+
+def sample_entry(guild_id, index, timestamp):
+    """Log no mesmo formato que o LogSystem grava"""
+    user_id = 200_000_000_000_000_000 + index % 5_000
+    return {
+        'action': ACTIONS[index % len(ACTIONS)],
+        'guild_id': guild_id,
+        'timestamp': timestamp.isoformat(),
+        'author': f"usuario{index % 5_000} ({user_id})",
+        'channel': f"canal-{index % 20}",
+        'content': f"mensagem de teste número {index} " * 3
+    }
+
+
+def write_legacy_logs(path, size, guild_ids):
+    """Gera um logs.json antigo com `size` logs de hoje, gravado aos poucos para não montar o dict inteiro"""
+    start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for index in range(size):
+            guild_id = guild_ids[index % len(guild_ids)]
+            timestamp = start + datetime.timedelta(microseconds=index * 10)
+            log_id = f"{guild_id}-{int(timestamp.timestamp())}-{index}"
+            f.write(('' if index == 0 else ',') + json.dumps(log_id) + ':' + json.dumps(sample_entry(guild_id, index, timestamp)))
+        f.write('}')
+    return os.path.getsize(path)
+
+
+def write_embeds_document(path, guilds):
+    """embeds.json com 3 embeds por servidor"""
+    document = {
+        str(guild_id): {
+            f"embed{n}": {
+                'title': f"Bem-vindo {{member.name}} #{n}",
+                'description': "Você é o membro {guild.member_count} do {guild.name}!",
+                'color': 0x3498db,
+                'fields': [{'name': 'Regras', 'value': 'Leia o canal {channel}', 'inline': False}],
+                'footer': "{date} às {time}",
+                'thumbnail': "{member.avatar}",
+                'image': ''
+            }
+            for n in range(3)
+        }
+        for guild_id in range(guilds)
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f)
+    return os.path.getsize(path)
+
+
+class Bench:
+    """Roda os cenários dentro de um diretório temporário e acumula os resultados"""
+
+    def __init__(self, main, workdir, events):
+        self.main = main
+        self.workdir = workdir
+        self.events = events
+        self.results = []
+
+    def record(self, benchmark, size=None, **values):
+        result = {'benchmark': benchmark, 'size': size, **values}
+        self.results.append(result)
+        print(f"  {benchmark} (size={size}): {values}", file=sys.stderr)
+
+    def bytes_written(self):
+        return self.main.persistence.stats['bytes_written']
+
+    def fresh_dir(self, name):
+        path = os.path.join(self.workdir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        os.chdir(path)
+        return path
+
+    def run_history(self, size):
+        """Carga inicial, log_action e save_logs com `size` logs no histórico"""
+        main = self.main
+        self.fresh_dir(f"history-{size}")
+        guild_ids = [1_000 + n for n in range(10)]
+        legacy_bytes = write_legacy_logs("logs.json", size, guild_ids)
+
+        data_system = main.DataSystem()
+        before, started = self.bytes_written(), time.perf_counter()
+        data_system.storage.load_logs()
+        main.persistence.flush_sync()
+        self.record('startup.migrate_legacy_logs', size, seconds=round(time.perf_counter() - started, 6),
+                    input_bytes=legacy_bytes, bytes_written=self.bytes_written() - before)
+
+        data_system = main.DataSystem()
+        started = time.perf_counter()
+        data_system.storage.load_logs()
+        self.record('startup.load_log_segments', size, seconds=round(time.perf_counter() - started, 6),
+                    entries=len(data_system.storage.log_store.entries))
+
+        main.data_system = data_system
+        self.record('log_action', size, **asyncio.run(self.log_actions()))
+
+        before, started = self.bytes_written(), time.perf_counter()
+        data_system.save_logs()
+        main.persistence.flush_sync()
+        self.record('save_logs', size, seconds=round(time.perf_counter() - started, 6),
+                    bytes_written=self.bytes_written() - before)
+
+    async def log_actions(self):
+        """`events` chamadas ao log_action contra um servidor falso, com a entrega de logs rodando"""
+        main = self.main
+        http = FakeHTTP()
+        guild = FakeGuild(http=http, guild_id=1_000)
+        guild.add_text_channel(main.LOG_CHANNEL_NAME)
+        member = guild.add_member("usuario")
+
+        before = self.bytes_written()
+        durations = []
+        for index in range(self.events):
+            started = time.perf_counter()
+            await main.LogSystem.log_action(
+                guild, ACTIONS[index % len(ACTIONS)],
+                author=f"{member} ({member.id})",
+                channel=f"canal-{index % 20}",
+                content=f"mensagem de teste número {index}"
+            )
+            durations.append(time.perf_counter() - started)
+            if index % 100 == 0:
+                await asyncio.sleep(0)  # Deixa a entrega de logs rodar, como entre eventos reais
+        main.persistence.flush_sync()
+        written = self.bytes_written() - before
+
+        for worker in main.log_delivery._workers.values():
+            worker.cancel()
+        main.log_delivery._workers.clear()
+        main.log_delivery._queues.clear()
+        main.log_delivery._wakeups.clear()
+        main.LogSystem._log_channel_ids.clear()
+        return {**latency_summary(durations), 'bytes_written': written,
+                'bytes_per_event': round(written / self.events, 1), 'http_requests': http.stats['requests']}
+
+    def run_documents(self, size):
+        """Carga de um embeds.json grande: documento inteiro e um único servidor"""
+        main = self.main
+        self.fresh_dir(f"documents-{size}")
+        guilds = max(1, size // 10)
+        document_bytes = write_embeds_document("embeds.json", guilds)
+
+        started = time.perf_counter()
+        len(main.DataSystem().embeds_data)
+        full_load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        main.DataSystem().embeds_data.get(str(guilds - 1))
+        single_key = time.perf_counter() - started
+        self.record('startup.load_embeds_document', size, guilds=guilds, input_bytes=document_bytes,
+                    full_load_s=round(full_load, 6), single_guild_s=round(single_key, 6))
+
+    def run_embeds(self, iterations):
+        """Vazão de montagem de embeds: compilando a cada envio vs. template em cache"""
+        main = self.main
+        self.fresh_dir("embeds")
+        write_embeds_document("embeds.json", 1)
+        main.data_system = main.DataSystem()
+        main.EmbedSystem.invalidate_templates(0)
+
+        guild = FakeGuild(guild_id=0, member_count=1_234)
+        channel = guild.add_text_channel("geral")
+        member = guild.add_member("usuario")
+        embed_data = main.data_system.embeds_data['0']['embed0']
+
+        def throughput(build):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                build()
+            elapsed = time.perf_counter() - started
+            return {'iterations': iterations, 'seconds': round(elapsed, 6), 'ops_per_s': round(iterations / elapsed, 1)}
+
+        self.record('embed.build_embed', **throughput(
+            lambda: main.EmbedSystem.build_embed(embed_data, member=member, guild=guild, channel=channel)))
+        self.record('embed.template_render', **throughput(
+            lambda: main.EmbedSystem.get_template(0, 'embed0').render(member=member, guild=guild, channel=channel)))
+        self.record('embed.template_to_embed', **throughput(
+            lambda: main.EmbedSystem.get_template(0, 'embed0').to_embed(member=member, guild=guild, channel=channel)))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline dos componentes do bot")
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                        help="tamanhos do histórico de logs, separados por vírgula")
+    parser.add_argument('--events', type=int, default=1_000, help="chamadas ao log_action por tamanho")
+    parser.add_argument('--embed-iterations', type=int, default=10_000)
+    parser.add_argument('--output', help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        # Os prints do bot vão para o stderr: o stdout fica só com o JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            bench = Bench(load_main(workdir), workdir, args.events)
+            for size in sizes:
+                bench.run_history(size)
+                bench.run_documents(size)
+            bench.run_embeds(args.embed_iterations)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps({
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'events': args.events,
+        'results': bench.results
+    }, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
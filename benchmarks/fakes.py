@@ -0,0 +1,279 @@
+"""Dublês leves de Guild/TextChannel/Member para rodar os sistemas do bot sem conexão com o Discord.
+
+Só implementam o que main.py usa. Toda chamada que iria à API passa pelo FakeHTTP,
+que simula latência e os buckets de rate limit (esperando no 429, como o discord.py faz)."""
+import asyncio
+import collections
+import datetime
+import importlib
+import itertools
+import logging
+import os
+import re
+import sys
+import time
+
+import discord
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_snowflakes = itertools.count(1_100_000_000_000_000_000)
+_http_log = logging.getLogger('discord.http')
+
+
+def snowflake():
+    return next(_snowflakes)
+
+
+def load_main(workdir):
+    """Importa main.py com os arquivos de dados dentro de `workdir` (caminhos do bot são relativos)"""
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return importlib.import_module('main')
+
+
+class FakeHTTP:
+    """Camada HTTP simulada: latência fixa e rate limit por bucket (limite de requisições por janela).
+
+    Como no Discord, o bucket é a rota com os parâmetros principais (canal, servidor, webhook):
+    cargos de membros diferentes do mesmo servidor disputam o mesmo bucket."""
+
+    MINOR_IDS = re.compile(r'(?<!/channels)(?<!/guilds)(?<!/webhooks)/\d+')
+
+    def __init__(self, latency=0.0, bucket_limit=5, bucket_window=5.0):
+        self.latency = latency
+        self.bucket_limit = bucket_limit
+        self.bucket_window = bucket_window
+        self._buckets = {}  # (método, rota com os IDs principais) -> instantes das requisições dentro da janela
+        self.stats = collections.Counter()
+
+    async def request(self, method, route):
+        """Espera o bucket da rota liberar (contando cada 429) e simula a latência da resposta"""
+        bucket = self._buckets.setdefault((method, self.MINOR_IDS.sub('/{id}', route)), collections.deque())
+        while True:
+            now = time.monotonic()
+            while bucket and now - bucket[0] >= self.bucket_window:
+                bucket.popleft()
+            if self.bucket_limit and len(bucket) >= self.bucket_limit:
+                retry_after = self.bucket_window - (now - bucket[0])
+                self.stats['rate_limited'] += 1
+                # Mesma mensagem do discord.http: alimenta o RateLimitLogHandler das métricas
+                _http_log.warning(
+                    'We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.',
+                    method, f"https://discord.com/api/v10{route}", retry_after
+                )
+                await asyncio.sleep(retry_after)
+                continue
+            bucket.append(now)
+            break
+        self.stats['requests'] += 1
+        self.stats[f"{method} {route}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeResponse:
+    """O que o discord.HTTPException lê da resposta"""
+
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+
+class FakeAsset:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeRole:
+    def __init__(self, guild, name, role_id=None, position=1):
+        self.guild = guild
+        self.id = role_id or snowflake()
+        self.name = name
+        self.position = position
+        self.mention = f"<@&{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeUser:
+    def __init__(self, name, user_id=None, bot=False):
+        self.id = user_id or snowflake()
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+        self.created_at = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.display_avatar = FakeAsset(f"https://cdn.discordapp.com/embed/avatars/{self.id % 5}.png")
+
+    def __str__(self):
+        return self.name
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMember(FakeUser):
+    def __init__(self, guild, name, user_id=None, bot=False):
+        super().__init__(name, user_id, bot)
+        self.guild = guild
+        self.roles = [guild.default_role] if guild.default_role else []
+        self.joined_at = datetime.datetime.now(datetime.timezone.utc)
+        self.guild_permissions = guild.permissions
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda role: role.position)
+
+    async def add_roles(self, *roles, reason=None):
+        for role in roles:
+            await self.guild.http.request('PUT', f"/guilds/{self.guild.id}/members/{self.id}/roles/{role.id}")
+            self.roles.append(role)
+
+    async def remove_roles(self, *roles, reason=None):
+        for role in roles:
+            await self.guild.http.request('DELETE', f"/guilds/{self.guild.id}/members/{self.id}/roles/{role.id}")
+            if role in self.roles:
+                self.roles.remove(role)
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content='', embeds=(), attachments=(), message_id=None):
+        self.id = message_id or snowflake()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.embeds = list(embeds)
+        self.attachments = list(attachments)
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+
+    async def edit(self, **fields):
+        await self.guild.http.request('PATCH', f"/channels/{self.channel.id}/messages")
+        self.content = fields.get('content', self.content)
+
+    async def delete(self):
+        await self.guild.http.request('DELETE', f"/channels/{self.channel.id}/messages")
+
+
+class FakeTextChannel:
+    def __init__(self, guild, name, channel_id=None, category=None):
+        self.guild = guild
+        self.id = channel_id or snowflake()
+        self.name = name
+        self.category = category
+        self.mention = f"<#{self.id}>"
+        self.sent = []  # mensagens enviadas pelo bot, em ordem
+
+    def __str__(self):
+        return self.name
+
+    def permissions_for(self, member):
+        return self.guild.permissions
+
+    async def send(self, content=None, **fields):
+        await self.guild.http.request('POST', f"/channels/{self.id}/messages")
+        embeds = fields.get('embeds') or ([fields['embed']] if fields.get('embed') else [])
+        # Mesmos limites que o Discord valida: até 10 embeds e 6000 caracteres somados por mensagem
+        if len(embeds) > 10 or sum(len(embed) for embed in embeds) > 6000:
+            self.guild.http.stats['bad_request'] += 1
+            raise discord.HTTPException(FakeResponse(400, "Bad Request"), "Embed size exceeds maximum size of 6000")
+        message = FakeMessage(self, self.guild.me, content or '', embeds)
+        self.sent.append(message)
+        return message
+
+    async def delete_messages(self, messages, reason=None):
+        await self.guild.http.request('POST', f"/channels/{self.id}/messages/bulk-delete")
+
+    async def delete(self, reason=None):
+        await self.guild.http.request('DELETE', f"/channels/{self.id}")
+        self.guild.channels.remove(self)
+
+
+class FakeContext:
+    """Contexto de comando mínimo: o que os hooks before/after_invoke e o on_command leem"""
+
+    def __init__(self, command, channel, author, content=''):
+        self.command = command
+        self.guild = channel.guild
+        self.channel = channel
+        self.author = author
+        self.message = FakeMessage(channel, author, content)
+        self.command_failed = False
+
+    async def send(self, content=None, **fields):
+        return await self.channel.send(content, **fields)
+
+
+class FakeGuild:
+    def __init__(self, name="Servidor de teste", http=None, guild_id=None, member_count=0):
+        self.id = guild_id or snowflake()
+        self.name = name
+        self.http = http or FakeHTTP()
+        self.icon = None
+        self.shard_id = 0
+        self.chunked = True
+        self.permissions = discord.Permissions.all()
+        self.default_role = FakeRole(self, "@everyone", role_id=self.id, position=0)
+        self.roles = [self.default_role]
+        self.channels = []
+        self.categories = []
+        self._members = {}
+        self._extra_member_count = member_count
+        self.me = self.add_member("26ix", bot=True)
+        self.me.roles.append(self.add_role("Bot", position=100))
+        self.owner_id = self.me.id
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    @property
+    def member_count(self):
+        return len(self._members) + self._extra_member_count
+
+    @property
+    def text_channels(self):
+        return [channel for channel in self.channels if isinstance(channel, FakeTextChannel)]
+
+    def add_member(self, name, bot=False, user_id=None):
+        member = FakeMember(self, name, user_id=user_id, bot=bot)
+        self._members[member.id] = member
+        return member
+
+    def remove_member(self, member):
+        self._members.pop(member.id, None)
+
+    def add_role(self, name, position=1):
+        role = FakeRole(self, name, position=position)
+        self.roles.append(role)
+        return role
+
+    def add_text_channel(self, name, category=None, channel_id=None):
+        channel = FakeTextChannel(self, name, channel_id=channel_id, category=category)
+        self.channels.append(channel)
+        return channel
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_channel(self, channel_id):
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+    get_channel_or_thread = get_channel
+
+    async def create_text_channel(self, name, overwrites=None, category=None, topic=None, reason=None):
+        await self.http.request('POST', f"/guilds/{self.id}/channels")
+        return self.add_text_channel(name, category=category)
+
+    async def chunk(self, cache=True):
+        return self.members
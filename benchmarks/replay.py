@@ -0,0 +1,319 @@
+"""Replay de um trace do EventTraceRecorder (TRACE_FILE) contra os handlers reais do bot.
+
+Os eventos gravados (mensagens, exclusões, edições, exclusões em massa, entradas, saídas e
+comandos) são entregues aos handlers de main.py na ordem e no ritmo originais (--speed 1),
+acelerados (--speed 10) ou o mais rápido possível (--speed 0). A API do Discord é o FakeHTTP,
+com latência e buckets de rate limit configuráveis. Ao final sai um JSON com a latência dos
+handlers por evento, o atraso de despacho, o backlog das filas e os 429 simulados.
+
+Comandos passam pelo on_command e pelos hooks before/after_invoke (log, métricas e s!stats),
+não pelo corpo do comando.
+
+Uso:
+    python benchmarks/replay.py trace.jsonl.gz --speed 10 --output replay.json
+    python benchmarks/replay.py --synthesize raid.jsonl.gz --joins 2000 --messages 5000"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_components import git_commit, latency_summary  # noqa: E402
+from fakes import REPO_DIR, FakeContext, FakeGuild, FakeHTTP, FakeMessage, load_main, snowflake  # noqa: E402
+
+HANDLERS = {
+    'm': 'cache_message',
+    'd': 'on_raw_message_delete',
+    'b': 'on_raw_bulk_message_delete',
+    'e': 'on_raw_message_edit',
+    'j': 'on_member_join',
+    'l': 'on_member_remove',
+    'c': 'on_command'
+}
+BACKLOG_SAMPLE_INTERVAL = 0.1  # segundos
+
+
+def open_trace(path, mode):
+    return gzip.open(path, mode + 't', encoding='utf-8') if path.endswith(".gz") else open(path, mode, encoding='utf-8')
+
+
+def read_trace(path):
+    """Eventos (ms, código, campos) do trace; várias execuções gravadas no mesmo arquivo ficam em sequência"""
+    offset = last = 0
+    with open_trace(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                offset = last  # Cabeçalho de uma nova execução: o tempo recomeça do zero
+                continue
+            last = offset + item[0]
+            yield last, item[1], item[2:]
+
+
+class Replayer:
+    """Monta servidores, canais e membros falsos sob demanda e entrega cada evento ao handler real"""
+
+    def __init__(self, main, http, speed, welcome_role):
+        self.main = main
+        self.http = http
+        self.speed = speed
+        self.welcome_role = welcome_role
+        self.guilds = {}
+        self.durations = collections.defaultdict(list)
+        self.dispatch_lag = []
+        self.backlog = collections.defaultdict(list)
+        self.skipped = collections.Counter()
+        self.final_backlog = {}
+        # Os handlers raw resolvem o servidor pelo ID
+        main.bot.get_guild = self.guilds.get
+
+    def guild(self, guild_id):
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = FakeGuild(f"Servidor {guild_id}", http=self.http, guild_id=guild_id)
+            if self.welcome_role:
+                self.main.data_system.welcome_roles_data[str(guild_id)] = guild.add_role("Membro").id
+        return guild
+
+    def channel(self, guild, channel_id):
+        return guild.get_channel(channel_id) or guild.add_text_channel(f"canal-{len(guild.channels)}", channel_id=channel_id)
+
+    def member(self, guild, user_id, name, bot):
+        return guild.get_member(user_id) or guild.add_member(name, bot=bool(bot), user_id=user_id)
+
+    def build(self, code, fields):
+        """(handler, argumentos) do evento, ou None se não der para reproduzi-lo"""
+        main = self.main
+        guild = self.guild(fields[0])
+        if code == 'm':
+            _, channel_id, message_id, author_id, name, bot, content, attachments = fields
+            author = self.member(guild, author_id, name, bot)
+            return main.cache_message, (FakeMessage(self.channel(guild, channel_id), author, content, attachments=[None] * attachments, message_id=message_id),)
+        if code == 'd':
+            _, channel_id, message_id = fields
+            return main.on_raw_message_delete, (discord.RawMessageDeleteEvent({'id': message_id, 'channel_id': channel_id, 'guild_id': guild.id}),)
+        if code == 'b':
+            _, channel_id, message_ids = fields
+            return main.on_raw_bulk_message_delete, (discord.RawBulkMessageDeleteEvent({'ids': message_ids, 'channel_id': channel_id, 'guild_id': guild.id}),)
+        if code == 'e':
+            _, channel_id, message_id, content, bot = fields
+            data = {'id': message_id, 'channel_id': channel_id, 'guild_id': guild.id, 'author': {'bot': bool(bot)}}
+            if content is not None:
+                data['content'] = content
+            return main.on_raw_message_edit, (discord.RawMessageUpdateEvent(data),)
+        if code in ('j', 'l'):
+            _, user_id, name, bot = fields
+            member = self.member(guild, user_id, name, bot)
+            if code == 'l':
+                guild.remove_member(member)
+            return (main.on_member_join if code == 'j' else main.on_member_remove), (member,)
+        if code == 'c':
+            _, channel_id, author_id, name, command_name, content = fields
+            command = main.bot.get_command(command_name)
+            if command is None:
+                return None
+            ctx = FakeContext(command, self.channel(guild, channel_id), self.member(guild, author_id, name, False), content)
+            return self.run_command, (ctx,)
+        return None
+
+    async def run_command(self, ctx):
+        main = self.main
+        await main.start_command_timer(ctx)
+        await main.on_command(ctx)
+        await main.record_command_metrics(ctx)
+
+    async def dispatch(self, code, handler, args):
+        # Como o discord.py: cada evento vira uma tarefa; a duração vai do despacho ao fim do handler
+        started = time.perf_counter()
+        try:
+            await handler(*args)
+        except Exception as e:
+            print(f"Erro no handler {HANDLERS[code]}: {e}", file=sys.stderr)
+        self.durations[HANDLERS[code]].append(time.perf_counter() - started)
+
+    def backlog_depths(self):
+        main = self.main
+        return {
+            'log_delivery_queue': main.log_delivery.depth(),
+            'join_queue': main.join_pipeline.queue_depth(),
+            'pending_edits': len(main.edit_coalescer._pending),
+            'pending_writes': main.persistence.stats['pending_writes']
+        }
+
+    async def sample_backlog(self):
+        while True:
+            for name, depth in self.backlog_depths().items():
+                self.backlog[name].append(depth)
+            await asyncio.sleep(BACKLOG_SAMPLE_INTERVAL)
+
+    async def run(self, events, drain_timeout):
+        loop = asyncio.get_running_loop()
+        sampler = asyncio.ensure_future(self.sample_backlog())
+        tasks = set()
+        started = loop.time()
+        count = 0
+        for at_ms, code, fields in events:
+            if self.speed:
+                target = started + at_ms / 1000 / self.speed
+                if target > loop.time():
+                    await asyncio.sleep(target - loop.time())
+                self.dispatch_lag.append(max(0.0, loop.time() - target))
+            else:
+                await asyncio.sleep(0)
+            event = self.build(code, fields)
+            if event is None:
+                self.skipped[HANDLERS.get(code, code)] += 1
+                continue
+            count += 1
+            task = asyncio.ensure_future(self.dispatch(code, *event))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        replay_seconds = loop.time() - started
+
+        # Espera as filas esvaziarem (entregas de logs, cargos, edições agrupadas)
+        drained_at = loop.time()
+        while any(self.backlog_depths().values()) and loop.time() - drained_at < drain_timeout:
+            await asyncio.sleep(BACKLOG_SAMPLE_INTERVAL)
+        drain_seconds = loop.time() - drained_at
+        sampler.cancel()
+        self.final_backlog = self.backlog_depths()
+        self.main.persistence.flush_sync()
+        return count, replay_seconds, drain_seconds
+
+    def report(self, count, replay_seconds, drain_seconds):
+        main = self.main
+        routes = collections.Counter({route: hits for route, hits in main.metrics._counters.items() if route[0] == 'discord_http_rate_limited_total'})
+        return {
+            'events': count,
+            'skipped': dict(self.skipped),
+            'guilds': len(self.guilds),
+            'replay_seconds': round(replay_seconds, 3),
+            'drain_seconds': round(drain_seconds, 3),
+            'handlers': {name: latency_summary(durations) for name, durations in sorted(self.durations.items())},
+            'dispatch_lag': latency_summary(self.dispatch_lag) if self.dispatch_lag else None,
+            'backlog': {
+                name: {'max': max(samples), 'mean': round(sum(samples) / len(samples), 2), 'final': self.final_backlog[name]}
+                for name, samples in self.backlog.items()
+            },
+            'http': {
+                'requests': self.http.stats['requests'],
+                'rate_limited': self.http.stats['rate_limited'],
+                'rate_limited_routes': {dict(labels)['route']: hits for (_, labels), hits in routes.most_common(10)}
+            },
+            'systems': {
+                'log_delivery': dict(main.log_delivery.stats),
+                'join_pipeline': dict(main.join_pipeline.stats),
+                'edit_coalescer': dict(main.edit_coalescer.stats),
+                'message_cache': dict(main.message_cache.stats),
+                'persistence_bytes_written': main.persistence.stats['bytes_written']
+            }
+        }
+
+
+def synthesize(path, guilds, joins, messages, duration, seed):
+    """Trace sintético de uma raid: entradas e spam concentrados, edições, exclusões, limpeza e comandos"""
+    rng = random.Random(seed)
+    events = []
+    for guild_id in [snowflake() for _ in range(guilds)]:
+        channels = [snowflake() for _ in range(5)]
+        members = []
+        for n in range(joins):
+            member = (snowflake(), f"raider{n}", 0)
+            members.append(member)
+            events.append((rng.uniform(0, duration * 0.5), 'j', [guild_id, *member]))
+        messages_by_channel = collections.defaultdict(list)
+        for n in range(messages):
+            at = rng.uniform(duration * 0.1, duration * 0.8)
+            user_id, name, bot = rng.choice(members)
+            channel_id, message_id = rng.choice(channels), snowflake()
+            messages_by_channel[channel_id].append((at, message_id))
+            events.append((at, 'm', [guild_id, channel_id, message_id, user_id, name, bot, "x" * rng.randint(5, 300), 0]))
+            if rng.random() < 0.1:
+                for edit in range(rng.randint(1, 4)):
+                    events.append((at + 0.5 + edit, 'e', [guild_id, channel_id, message_id, "y" * rng.randint(5, 300), 0]))
+            if rng.random() < 0.2:
+                events.append((at + rng.uniform(1, 10), 'd', [guild_id, channel_id, message_id]))
+        moderator = (snowflake(), "moderador")
+        for channel_id, sent in messages_by_channel.items():
+            # Moderação limpando o canal no fim da raid
+            ids = [message_id for _, message_id in sorted(sent)[-100:]]
+            events.append((duration * 0.9, 'c', [guild_id, channel_id, moderator[0], moderator[1], 'clear', "s!clear 100"]))
+            events.append((duration * 0.9 + 1, 'b', [guild_id, channel_id, ids]))
+        for user_id, name, bot in rng.sample(members, len(members) // 2):
+            events.append((rng.uniform(duration * 0.6, duration), 'l', [guild_id, user_id, name, bot]))
+
+    with open_trace(path, 'w') as f:
+        f.write(json.dumps({'version': 1, 'started': None, 'content': False, 'synthetic': True}) + "\n")
+        for at, code, fields in sorted(events, key=lambda event: event[0]):
+            f.write(json.dumps([round(at * 1000), code, *fields], separators=(',', ':')) + "\n")
+    print(f"{len(events)} eventos gravados em {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de traces de eventos contra os handlers do bot")
+    parser.add_argument('trace', help="arquivo de trace (.jsonl ou .jsonl.gz)")
+    parser.add_argument('--speed', type=float, default=1.0, help="1 = ritmo gravado, 10 = 10x mais rápido, 0 = sem esperas")
+    parser.add_argument('--latency', type=float, default=0.05, help="latência simulada de cada requisição (segundos)")
+    parser.add_argument('--bucket-limit', type=int, default=5, help="requisições por rota dentro da janela (0 = sem rate limit)")
+    parser.add_argument('--bucket-window', type=float, default=5.0, help="janela do rate limit (segundos)")
+    parser.add_argument('--no-welcome-role', action='store_true', help="não configura cargo de boas-vindas nos servidores")
+    parser.add_argument('--drain-timeout', type=float, default=300.0, help="tempo máximo esperando as filas esvaziarem")
+    parser.add_argument('--output', help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument('--synthesize', action='store_true', help="em vez de reproduzir, gera um trace sintético de raid em TRACE")
+    parser.add_argument('--guilds', type=int, default=1)
+    parser.add_argument('--joins', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=3000)
+    parser.add_argument('--duration', type=float, default=60.0, help="duração do trace sintético (segundos)")
+    parser.add_argument('--seed', type=int, default=26)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize(args.trace, args.guilds, args.joins, args.messages, args.duration, args.seed)
+        return
+
+    trace = os.path.abspath(args.trace)
+    output = os.path.abspath(args.output) if args.output else None
+    os.environ['TRACE_FILE'] = ''  # O replay não grava um novo trace
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            bot_main = load_main(workdir)
+            http = FakeHTTP(args.latency, args.bucket_limit, args.bucket_window)
+            replayer = Replayer(bot_main, http, args.speed, not args.no_welcome_role)
+            count, replay_seconds, drain_seconds = asyncio.run(replayer.run(read_trace(trace), args.drain_timeout))
+            report = replayer.report(count, replay_seconds, drain_seconds)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps({
+        'commit': git_commit(),
+        'trace': trace,
+        'speed': args.speed,
+        'http_latency': args.latency,
+        'bucket': [args.bucket_limit, args.bucket_window],
+        **report
+    }, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
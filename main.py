@@ -2,415 +2,3700 @@
 import os
 os.environ['DISCORD_INSTALL_VOICE'] = '0'  # Desativa funcionalidades de voz
 
-# Forçar reinstalação do discord.py sem suporte a voz se necessário
-import subprocess
+import time
+PROCESS_STARTED_AT = time.perf_counter()
+
+# Verificar dependências sem reinstalar nada (o pip no boot custava segundos e exigia rede)
+import importlib.util
 import sys
-try:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "discord.py==2.3.2"])
-except:
-    pass
+for _module, _package in (("discord", "discord.py"), ("aiohttp", "aiohttp")):
+    if importlib.util.find_spec(_module) is None:
+        sys.exit(f"❌ Dependência ausente: {_package}. Instale com: pip install -r requirements.txt")
 
 import discord
+from discord import app_commands
 from discord.ext import commands
 import asyncio
+import atexit
+import bisect
+import collections
+import copy
 import datetime
+import fnmatch
+import functools
+import gzip
+import hashlib
+import inspect
+import io
+import itertools
 import json
+import logging
+import math
+import random
 import os
+import re
+import shlex
+import signal
+import sqlite3
+import subprocess
+import threading
+import traceback
+import urllib.request
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
-from flask import Flask
-from threading import Thread
+from aiohttp import web
+
+try:
+    import fcntl  # Trava de arquivo entre processos do modo cluster (só em sistemas POSIX)
+except ImportError:
+    fcntl = None
+
+try:
+    import resource  # Pico de memória do processo no relatório de inicialização (só em sistemas POSIX)
+except ImportError:
+    resource = None
 
 # CONFIGURAÇÃO
 TOKEN = os.environ.get('DISCORD_TOKEN')
 PREFIX = "s!"
 
+# CONFIGURAÇÕES DE COMANDOS
+# 'full': comandos por prefixo e de barra; 'loggers': só comandos de barra, conteúdo recebido só para os
+# logs de exclusão/edição; 'off': sem a intent message_content (gateway sem o texto das mensagens)
+MESSAGE_CONTENT = os.environ.get('MESSAGE_CONTENT', 'full')
+PREFIX_COMMANDS = MESSAGE_CONTENT == 'full'
+COMMAND_HINT = PREFIX if PREFIX_COMMANDS else "/"  # Como os comandos aparecem nas mensagens do bot
+APP_COMMANDS_SYNC = os.environ.get('APP_COMMANDS_SYNC', 'auto')  # 'auto' (só quando mudam), 'always' ou 'off'
+APP_COMMANDS_HASH_FILE = "app_commands.sha256"
+
 # CONFIGURAÇÕES
 TICKET_CATEGORY_NAME = "tickets"
 SUPPORT_ROLE_NAME = "Support Team"
 LOG_CHANNEL_NAME = "logs"
 
-intents = discord.Intents.default()
-intents.messages = True
-intents.guilds = True
-intents.members = True
-intents.message_content = True
-intents.reactions = True
-intents.moderation = True
-intents.message_content = True
+# CONFIGURAÇÕES DE TICKETS
+TICKET_POOL_SIZE = int(os.environ.get('TICKET_POOL_SIZE', '3'))  # canais ocultos pré-criados por servidor
+TICKET_TRANSCRIPT_DIR = "transcripts"
+TICKET_TRANSCRIPT_PAGE_SIZE = 100  # mensagens por escrita no arquivo (uma página do histórico)
+TICKET_TRANSCRIPT_UPLOAD_LIMIT = 8 * 1024 * 1024  # bytes; transcrições maiores ficam só em disco
+TICKET_CLOSE_DELAY = 5  # segundos entre o aviso e o fechamento
 
-bot = commands.Bot(command_prefix=PREFIX, intents=intents, help_command=None)
+# CONFIGURAÇÕES DE ARMAZENAMENTO DE LOGS
+LOGS_JOURNAL_FILE = "logs.jsonl"  # Journal antigo, migrado para LOGS_SEGMENT_DIR
+LOGS_SEGMENT_DIR = "logs"
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', '90'))  # padrão global
+LOG_PRUNE_INTERVAL = int(os.environ.get('LOG_PRUNE_INTERVAL', '3600'))  # segundos
+LOG_COMPACT_MIN_LINES = 1000  # Compacta quando o segmento ativo passa disso e tem o dobro de linhas vivas
 
-# SISTEMA DE ARMAZENAMENTO
-class DataSystem:
-    def __init__(self):
-        self.tickets_file = "tickets.json"
-        self.autoroles_file = "autoroles.json"
-        self.logs_file = "logs.json"
-        self.embeds_file = "embeds.json"
-        self.welcome_roles_file = "welcome_roles.json"
-        self.load_data()
+# CONFIGURAÇÕES DE PERSISTÊNCIA
+PERSIST_COALESCE_WINDOW = float(os.environ.get('PERSIST_COALESCE_WINDOW', '1.0'))  # segundos
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')  # 'json' ou 'sqlite'
+SQLITE_DB_FILE = os.environ.get('SQLITE_DB_FILE', 'bot.db')
 
-    def load_data(self):
-        """Carrega dados dos arquivos"""
-        try:
-            # Carregar tickets
-            if os.path.exists(self.tickets_file):
-                with open(self.tickets_file, 'r', encoding='utf-8') as f:
-                    self.tickets_data = json.load(f)
-            else:
-                self.tickets_data = {}
+# CONFIGURAÇÕES DA FILA DE ENTREGA DE LOGS
+LOG_BATCH_SIZE = 10  # Máximo de embeds por mensagem no Discord
+LOG_BATCH_CHARS = 6000  # Máximo de caracteres somados dos embeds de uma mensagem no Discord
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '2.0'))  # segundos
+LOG_QUEUE_MAX = int(os.environ.get('LOG_QUEUE_MAX', '500'))  # por servidor
+LOG_OVERFLOW_POLICY = os.environ.get('LOG_OVERFLOW_POLICY', 'summarize')  # 'summarize' ou 'drop'
 
-            # Carregar autoroles
-            if os.path.exists(self.autoroles_file):
-                with open(self.autoroles_file, 'r', encoding='utf-8') as f:
-                    self.autoroles_data = json.load(f)
-            else:
-                self.autoroles_data = {}
+# CONFIGURAÇÕES DO PIPELINE DE ENTRADAS
+JOIN_WORKERS = int(os.environ.get('JOIN_WORKERS', '4'))  # atribuições de cargo simultâneas
+JOIN_QUEUE_MAX = int(os.environ.get('JOIN_QUEUE_MAX', '10000'))
+JOIN_SUMMARY_WINDOW = float(os.environ.get('JOIN_SUMMARY_WINDOW', '10'))  # segundos
+JOIN_ROLE_RETRIES = 3
 
-            # Carregar logs
-            if os.path.exists(self.logs_file):
-                with open(self.logs_file, 'r', encoding='utf-8') as f:
-                    self.logs_data = json.load(f)
-            else:
-                self.logs_data = {}
+# CONFIGURAÇÕES DO BACKFILL DE CARGOS
+BACKFILL_CONCURRENCY = int(os.environ.get('BACKFILL_CONCURRENCY', '5'))
+BACKFILL_CHUNK_SIZE = 100  # membros por checkpoint
+BACKFILL_PROGRESS_INTERVAL = 15  # segundos entre atualizações de progresso
 
-            # Carregar embeds
-            if os.path.exists(self.embeds_file):
-                with open(self.embeds_file, 'r', encoding='utf-8') as f:
-                    self.embeds_data = json.load(f)
-            else:
-                self.embeds_data = {}
+# CONFIGURAÇÕES DE EMBEDS
+EMBED_TEMPLATE_CACHE_SIZE = int(os.environ.get('EMBED_TEMPLATE_CACHE_SIZE', '256'))  # servidores com templates compilados em memória
+BROADCAST_CONCURRENCY = int(os.environ.get('BROADCAST_CONCURRENCY', '5'))  # envios simultâneos no s!embed_broadcast
+BROADCAST_RETRIES = 3
 
-            # Carregar welcome roles
-            if os.path.exists(self.welcome_roles_file):
-                with open(self.welcome_roles_file, 'r', encoding='utf-8') as f:
-                    self.welcome_roles_data = json.load(f)
-            else:
-                self.welcome_roles_data = {}
+# CONFIGURAÇÕES DE LIMPEZA DE MENSAGENS
+PURGE_MAX = int(os.environ.get('PURGE_MAX', '10000'))  # mensagens por s!clear
+PURGE_SCAN_LIMIT = int(os.environ.get('PURGE_SCAN_LIMIT', '50000'))  # mensagens verificadas no histórico por s!clear
+PURGE_PROGRESS_INTERVAL = 5  # segundos entre atualizações de progresso
+PURGE_RETRIES = 3
 
-        except Exception as e:
-            print(f"Erro ao carregar dados: {e}")
-            self.tickets_data = {}
-            self.autoroles_data = {}
-            self.logs_data = {}
-            self.embeds_data = {}
-            self.welcome_roles_data = {}
+# CONFIGURAÇÕES DO CACHE DE MENSAGENS
+MESSAGE_CACHE_BUDGET = int(os.environ.get('MESSAGE_CACHE_BUDGET', str(32 * 1024 * 1024)))  # bytes para todas as mensagens guardadas
+MESSAGE_CACHE_CONTENT_LIMIT = 500  # caracteres guardados de cada mensagem
 
-    def save_tickets(self):
-        """Salva dados dos tickets"""
-        try:
-            with open(self.tickets_file, 'w', encoding='utf-8') as f:
-                json.dump(self.tickets_data, f, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar tickets: {e}")
+# CONFIGURAÇÕES DO AGRUPAMENTO DE EDIÇÕES
+EDIT_COALESCE_WINDOW = float(os.environ.get('EDIT_COALESCE_WINDOW', '5'))  # segundos sem nova edição para fechar o log; 0 desativa
+EDIT_COALESCE_MAX_DELAY = float(os.environ.get('EDIT_COALESCE_MAX_DELAY', '30'))  # segundos máximos segurando um log
 
-    def save_autoroles(self):
-        """Salva dados dos autoroles"""
-        try:
-            with open(self.autoroles_file, 'w', encoding='utf-8') as f:
-                json.dump(self.autoroles_data, f, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar autoroles: {e}")
+# CONFIGURAÇÕES DE ESTATÍSTICAS DE COMANDOS
+COMMAND_STATS_FLUSH_INTERVAL = int(os.environ.get('COMMAND_STATS_FLUSH_INTERVAL', '60'))  # segundos entre consolidações
+COMMAND_STATS_HOURLY_RETENTION = 48  # horas
+COMMAND_STATS_DAILY_RETENTION = 90  # dias
+COMMAND_LOG_MODE = os.environ.get('COMMAND_LOG_MODE', 'sample')  # 'all', 'sample' ou 'off' (log de cada comando usado)
+COMMAND_LOG_SAMPLE_RATE = float(os.environ.get('COMMAND_LOG_SAMPLE_RATE', '0.1'))
 
-    def save_logs(self):
-        """Salva dados dos logs"""
-        try:
-            with open(self.logs_file, 'w', encoding='utf-8') as f:
-                json.dump(self.logs_data, f, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar logs: {e}")
+# CONFIGURAÇÕES DE INICIALIZAÇÃO
+FAST_START = os.environ.get('FAST_START', '1') == '1'  # Dados carregados sob demanda
+STARTUP_BUDGET = float(os.environ.get('STARTUP_BUDGET', '0'))  # segundos; 0 desativa o alerta
 
-    def save_embeds(self):
-        """Salva dados dos embeds"""
-        try:
-            with open(self.embeds_file, 'w', encoding='utf-8') as f:
-                json.dump(self.embeds_data, f, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar embeds: {e}")
+# CONFIGURAÇÕES DE SHARDING
+SHARD_MODE = os.environ.get('SHARD_MODE', 'none')  # 'none', 'auto' ou 'cluster'
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', '0'))  # 0 = quantidade recomendada pelo Discord
+SHARD_CLUSTERS = int(os.environ.get('SHARD_CLUSTERS', '2'))  # processos no modo cluster
+SHARD_IDS = os.environ.get('SHARD_IDS', '')  # definido pelo lançador para cada processo do cluster
+CLUSTER_ID = int(os.environ.get('CLUSTER_ID', '0'))
+IS_CLUSTER_WORKER = SHARD_MODE == 'cluster' and bool(SHARD_IDS)
+SHARD_STATUS_DIR = "shard_status"
+SHARD_STATUS_INTERVAL = 30  # segundos
 
-    def save_welcome_roles(self):
-        """Salva dados dos welcome roles"""
-        try:
-            with open(self.welcome_roles_file, 'w', encoding='utf-8') as f:
-                json.dump(self.welcome_roles_data, f, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar welcome roles: {e}")
+# CONFIGURAÇÕES DO SERVIDOR WEB
+WEB_HOST = os.environ.get('WEB_HOST', '0.0.0.0')
+WEB_PORT = int(os.environ.get('PORT', '8080'))  # Render e Replit informam a porta em PORT
 
-data_system = DataSystem()
+# CONFIGURAÇÕES DE MÉTRICAS
+LOOP_LAG_INTERVAL = float(os.environ.get('LOOP_LAG_INTERVAL', '1.0'))  # segundos entre amostras do atraso do event loop
 
-# SISTEMA DE LOGS CORRIGIDO
-class LogSystem:
-    @staticmethod
-    async def get_log_channel(guild):
-        """Encontra ou cria canal de logs"""
-        log_channel = discord.utils.get(guild.text_channels, name=LOG_CHANNEL_NAME)
-        if not log_channel:
-            try:
-                overwrites = {
-                    guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                    guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-                }
+# CONFIGURAÇÕES DO WATCHDOG DO EVENT LOOP
+WATCHDOG_STALL_THRESHOLD = float(os.environ.get('WATCHDOG_STALL_THRESHOLD', '0.5'))  # segundos sem o loop responder
+SLOW_HANDLER_THRESHOLD = float(os.environ.get('SLOW_HANDLER_THRESHOLD', '1.0'))  # segundos
+PROFILER_SAMPLE_INTERVAL = float(os.environ.get('PROFILER_SAMPLE_INTERVAL', '0.02'))  # segundos; 0 desativa o profiler
+PROFILER_WINDOW = int(os.environ.get('PROFILER_WINDOW', '300'))  # segundos de amostras guardadas
 
-                log_channel = await guild.create_text_channel(
-                    name=LOG_CHANNEL_NAME,
-                    overwrites=overwrites,
-                    topic="Canal de logs do sistema"
-                )
-            except Exception as e:
-                print(f"Erro ao criar canal de logs: {e}")
-                return None
-        return log_channel
+# CONFIGURAÇÕES DO GRAVADOR DE EVENTOS
+TRACE_FILE = os.environ.get('TRACE_FILE', '')  # ex.: trace.jsonl.gz; vazio desativa a gravação
+TRACE_CONTENT = os.environ.get('TRACE_CONTENT', '0') == '1'  # grava o texto das mensagens (senão só o tamanho)
 
-    @staticmethod
-    async def log_action(guild, action_type, **details):
-        """Sistema de logs simplificado"""
-        try:
-            log_channel = await LogSystem.get_log_channel(guild)
-            if not log_channel:
-                return
+# CONFIGURAÇÕES DE MEMÓRIA
+MEMORY_PROFILE = os.environ.get('MEMORY_PROFILE', 'default')  # 'default' ou 'low'
+LOW_MEMORY = MEMORY_PROFILE == 'low'
+MEMBER_CACHE = os.environ.get('MEMBER_CACHE', 'joined' if LOW_MEMORY else 'all')  # 'all', 'joined' ou 'none'
+MAX_MESSAGES = int(os.environ.get('MAX_MESSAGES', '100' if LOW_MEMORY else '1000'))  # discord.Message guardados pelo discord.py
+LAZY_CHUNK_MAX_MEMBERS = int(os.environ.get('LAZY_CHUNK_MAX_MEMBERS', '1000'))  # perfil low: maior servidor com chunk sob demanda
 
-            # Cores para diferentes tipos de ações
-            colors = {
-                'ban': 0xff0000,
-                'kick': 0xffa500,
-                'mute': 0x808080,
-                'unmute': 0x00ff00,
-                'clear': 0x00ff00,
-                'ticket_create': 0x00ff00,
-                'ticket_close': 0xff0000,
-                'autorole_add': 0x9b59b6,
-                'autorole_remove': 0xe74c3c,
-                'embed_create': 0x3498db,
-                'embed_send': 0x2ecc71,
-                'message_delete': 0xe74c3c,
-                'message_edit': 0xf39c12,
-                'message_bulk_delete': 0xc0392b,
-                'command_used': 0x9b59b6,
-                'user_join': 0x2ecc71,
-                'user_leave': 0xe74c3c,
-                'role_add': 0x3498db,
-                'role_remove': 0xe74c3c,
-                'welcome_role_add': 0x1abc9c
-            }
+if LOW_MEMORY:
+    # Só os eventos que o bot usa: servidores, entradas/saídas, mensagens e conteúdo
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.members = True
+    intents.messages = True
+    intents.message_content = MESSAGE_CONTENT != 'off'
+else:
+    intents = discord.Intents.default()
+    intents.messages = True
+    intents.guilds = True
+    intents.members = True
+    intents.message_content = MESSAGE_CONTENT != 'off'
+    intents.reactions = True
+    intents.moderation = True
 
-            embed = discord.Embed(
-                title=f"Log - {action_type.replace('_', ' ').title()}",
-                color=colors.get(action_type, 0x0000ff),
-                timestamp=datetime.datetime.utcnow()
-            )
+def member_cache_flags():
+    """MemberCacheFlags a partir de MEMBER_CACHE (o 'all' respeita as intents ativas)"""
+    if MEMBER_CACHE == 'none':
+        return discord.MemberCacheFlags.none()
+    if MEMBER_CACHE == 'joined':
+        return discord.MemberCacheFlags(joined=True, voice=False)
+    return discord.MemberCacheFlags.from_intents(intents)
 
-            # Adicionar detalhes
-            for key, value in details.items():
-                if value and str(value).strip():
-                    embed.add_field(
-                        name=key.replace('_', ' ').title(),
-                        value=str(value)[:1024],
-                        inline=len(str(value)) < 50
-                    )
-
-            await log_channel.send(embed=embed)
-
-            # Salvar no arquivo
-            log_id = f"{guild.id}-{int(datetime.datetime.now().timestamp())}"
-            data_system.logs_data[log_id] = {
-                'action': action_type,
-                'guild_id': guild.id,
-                'timestamp': datetime.datetime.now().isoformat(),
-                **details
-            }
-            data_system.save_logs()
+def create_bot():
+    """Cria o bot conforme SHARD_MODE: processo único, auto-sharded ou um processo do cluster"""
+    options = dict(
+        command_prefix=PREFIX,
+        intents=intents,
+        help_command=None,
+        member_cache_flags=member_cache_flags(),
+        max_messages=MAX_MESSAGES or None
+    )
+    if LOW_MEMORY:
+        # Sem baixar a lista de membros de cada servidor no login; o MemberChunker busca quando preciso
+        options['chunk_guilds_at_startup'] = False
+    if SHARD_MODE == 'auto':
+        return commands.AutoShardedBot(shard_count=SHARD_COUNT or None, **options)
+    if IS_CLUSTER_WORKER:
+        shard_ids = [int(shard_id) for shard_id in SHARD_IDS.split(',')]
+        return commands.AutoShardedBot(shard_ids=shard_ids, shard_count=SHARD_COUNT, **options)
+    return commands.Bot(**options)
 
-        except Exception as e:
-            print(f"Erro no sistema de logs: {e}")
+bot = create_bot()
 
-    @staticmethod
-    async def log_message_delete(message):
-        """Log quando uma mensagem é deletada"""
-        if not message.guild or message.author.bot:
+# RELATÓRIO DE TEMPO DE INICIALIZAÇÃO
+class StartupTimer:
+    """Marca as etapas do boot (imports, dados, login, gateway, ready) para o relatório de inicialização"""
+
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.marks = []
+        self.reported = False
+
+    def mark(self, stage):
+        """Registra o fim de uma etapa (só a primeira vez que acontece)"""
+        if all(name != stage for name, _ in self.marks):
+            self.marks.append((stage, time.perf_counter()))
+
+    def report(self):
+        """Tempo de cada etapa e total desde o início do processo"""
+        stages = []
+        previous = self.started_at
+        for stage, at in self.marks:
+            stages.append((stage, at - previous))
+            previous = at
+        return stages, previous - self.started_at
+
+    def print_report(self):
+        if self.reported:
             return
+        self.reported = True
+        stages, total = self.report()
+        print("⏱️ Inicialização: " + " | ".join(f"{stage} {elapsed:.2f}s" for stage, elapsed in stages) + f" | total {total:.2f}s")
+        if STARTUP_BUDGET and total > STARTUP_BUDGET:
+            print(f"⚠️ Inicialização acima do orçamento de {STARTUP_BUDGET:.1f}s")
 
-        # Limitar conteúdo muito longo
-        content = message.content
-        if len(content) > 500:
-            content = content[:500] + "..."
+startup_timer = StartupTimer(PROCESS_STARTED_AT)
+startup_timer.mark('imports')
 
-        await LogSystem.log_action(
-            message.guild,
-            'message_delete',
-            author=f"{message.author} ({message.author.id})",
-            channel=message.channel.name,
-            content=content,
-            message_id=message.id,
-            attachments_count=len(message.attachments)
-        )
+# UTILITÁRIOS
+def split_arguments(text):
+    """Divide o texto de um argumento em partes, respeitando aspas como o parser de comandos por prefixo"""
+    try:
+        return shlex.split(text or '')
+    except ValueError:
+        return (text or '').split()
+
+def retry_after_seconds(error):
+    """Segundos a aguardar se o erro for um 429 do Discord, ou None"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if getattr(error, 'status', None) == 429:
+        return float(error.response.headers.get('Retry-After', 1))
+    return None
+
+# MÉTRICAS (FORMATO PROMETHEUS)
+class Histogram:
+    """Histograma de buckets fixos: observar custa uma busca binária e três somas"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Contadores e histogramas em memória, exportados em /metrics no formato texto do Prometheus.
+
+    Cada série é escrita por uma única thread (event loop ou persistência) e a coleta só lê,
+    então o caminho quente não usa travas. Valores que já existem em outros sistemas
+    (filas, caches, latência) são lidos só na coleta, por funções registradas."""
+
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._meta = {}        # nome -> (tipo, descrição)
+        self._counters = {}    # (nome, rótulos) -> valor
+        self._histograms = {}  # (nome, rótulos) -> Histogram
+        self._collectors = []  # (nome, função) lidas só na coleta
+        self.loop_lag = 0.0
+        self._lag_task = None
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self.LATENCY_BUCKETS)
+        histogram.observe(value)
+
+    def total(self, name):
+        """Soma de um contador em todos os rótulos"""
+        return sum(value for (counter, _), value in list(self._counters.items()) if counter == name)
+
+    def register(self, name, kind, help_text, collect):
+        """Métrica calculada na coleta: collect() devolve um número ou {rótulos: valor}"""
+        self.describe(name, kind, help_text)
+        self._collectors.append((name, collect))
+
+    def timed_event(self, func):
+        """Decorador para handlers de evento: mede a duração de cada chamada"""
+        labels = (('event', func.__name__),)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.observe('discord_event_duration_seconds', elapsed, labels)
+                loop_watchdog.record_call('evento', func.__name__, elapsed)
+        return wrapper
+
+    def start(self):
+        """Inicia a amostragem do atraso do event loop (uma vez só)"""
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.ensure_future(self._sample_loop_lag())
+
+    async def _sample_loop_lag(self):
+        # Quanto o sleep acorda depois do previsto = tempo que o loop passou ocupado com outra coisa
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, time.monotonic() - expected)
+            self.observe('discord_event_loop_lag_seconds', self.loop_lag)
 
     @staticmethod
-    async def log_message_edit(before, after):
-        """Log quando uma mensagem é editada"""
-        if not before.guild or before.author.bot or before.content == after.content:
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus"""
+        series = collections.defaultdict(list)
+        for (name, labels), value in list(self._counters.items()):
+            series[name].append(f"{name}{self._format_labels(labels)} {value}")
+        for (name, labels), histogram in list(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), list(histogram.counts)):
+                cumulative += count
+                series[name].append(f"{name}_bucket{self._format_labels(labels + (('le', bound),))} {cumulative}")
+            series[name].append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+            series[name].append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        for name, collect in self._collectors:
+            try:
+                value = collect()
+            except Exception as e:
+                print(f"Erro ao coletar métrica {name}: {e}")
+                continue
+            samples = value.items() if isinstance(value, dict) else [((), value)]
+            for labels, sample in samples:
+                if sample is not None and math.isfinite(sample):
+                    series[name].append(f"{name}{self._format_labels(labels)} {sample}")
+
+        lines = []
+        for name in sorted(series):
+            kind, help_text = self._meta.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+class RateLimitLogHandler(logging.Handler):
+    """Conta os 429 do Discord por rota a partir dos avisos que o discord.http já registra"""
+
+    ROUTE_IDS = re.compile(r'/\d{15,21}')
+
+    def __init__(self, registry):
+        super().__init__(level=logging.WARNING)
+        self.registry = registry
+
+    def emit(self, record):
+        message = str(record.msg)
+        if 'responded with 429' in message and len(record.args or ()) >= 2:
+            method, url = record.args[0], str(record.args[1])
+            # https://discord.com/api/v10/channels/123/messages -> /channels/{id}/messages
+            path = "/" + url.split('/api/v', 1)[-1].split('?', 1)[0].partition('/')[2]
+            route = self.ROUTE_IDS.sub('/{id}', path)
+            self.registry.inc('discord_http_rate_limited_total', (('method', method), ('route', route)))
+        elif message.startswith('Global rate limit has been hit'):
+            self.registry.inc('discord_http_rate_limited_total', (('method', '*'), ('route', 'global')))
+
+metrics = MetricsRegistry()
+metrics.describe('discord_event_duration_seconds', 'histogram', 'Duração dos handlers de evento')
+metrics.describe('discord_command_duration_seconds', 'histogram', 'Duração dos comandos')
+metrics.describe('discord_commands_total', 'counter', 'Comandos executados por resultado')
+metrics.describe('discord_event_loop_lag_seconds', 'histogram', 'Atraso do event loop em relação ao previsto')
+metrics.describe('discord_http_rate_limited_total', 'counter', 'Respostas 429 do Discord por rota')
+metrics.describe('bot_persistence_write_seconds', 'histogram', 'Duração das escritas em disco')
+logging.getLogger('discord.http').addHandler(RateLimitLogHandler(metrics))
+
+# WATCHDOG DO EVENT LOOP E PROFILER POR AMOSTRAGEM
+class LoopWatchdog:
+    """Thread que vigia o event loop: registra travamentos com a pilha do código que bloqueou
+    e amostra a pilha do loop continuamente, guardando os últimos segundos para o comando profile.
+
+    O loop só agenda um heartbeat a cada 100 ms; todo o resto roda na thread do watchdog."""
+
+    HEARTBEAT_INTERVAL = 0.1
+    MAX_STACK_DEPTH = 40
+    IDLE = ()  # Amostra com o loop parado no select, esperando eventos
+    ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+    def __init__(self, stall_threshold, sample_interval, window):
+        self.stall_threshold = stall_threshold
+        self.sample_interval = sample_interval
+        self.stalls = collections.deque(maxlen=20)
+        self.slow_calls = collections.deque(maxlen=50)  # (quando, tipo, nome, segundos)
+        self._buckets = collections.deque(maxlen=window)  # (segundo, Counter(pilha -> amostras))
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = 0.0
+        self._current_stall = None
+        self._thread = None
+
+    def start(self):
+        """Chamado de dentro do event loop que será vigiado"""
+        if self._thread is not None:
             return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
 
-        # Limitar conteúdo muito longo
-        before_content = before.content
-        after_content = after.content
-        if len(before_content) > 300:
-            before_content = before_content[:300] + "..."
-        if len(after_content) > 300:
-            after_content = after_content[:300] + "..."
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        self._loop.call_later(self.HEARTBEAT_INTERVAL, self._beat)
 
-        await LogSystem.log_action(
-            before.guild,
-            'message_edit',
-            author=f"{before.author} ({before.author.id})",
-            channel=before.channel.name,
-            before_content=before_content,
-            after_content=after_content,
-            message_id=before.id
-        )
+    def record_call(self, kind, name, elapsed):
+        """Guarda handlers e comandos que passaram de SLOW_HANDLER_THRESHOLD"""
+        if elapsed >= SLOW_HANDLER_THRESHOLD:
+            self.slow_calls.append((time.time(), kind, name, elapsed))
+
+    def _run(self):
+        interval = self.sample_interval or self.HEARTBEAT_INTERVAL
+        while not self._loop.is_closed():
+            time.sleep(interval)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            if self.sample_interval:
+                self._sample(frame)
+            self._check_stall(frame)
+
+    def _check_stall(self, frame):
+        blocked_for = time.monotonic() - self._last_beat - self.HEARTBEAT_INTERVAL
+        if blocked_for < self.stall_threshold:
+            self._current_stall = None
+            return
+        if self._current_stall is not None:
+            self._current_stall['duration'] = blocked_for
+            return
+        stack = "".join(traceback.format_stack(frame, limit=self.MAX_STACK_DEPTH))
+        self._current_stall = {'at': time.time(), 'duration': blocked_for, 'stack': stack}
+        self.stalls.append(self._current_stall)
+        metrics.inc('discord_event_loop_stalls_total')
+        print(f"⚠️ Event loop travado há {blocked_for:.2f}s em:\n{stack}")
+
+    def _sample(self, frame):
+        code = frame.f_code
+        if code.co_name in ('select', 'poll') and code.co_filename.endswith('selectors.py'):
+            stack = self.IDLE
+        else:
+            frames = []
+            while frame is not None and len(frames) < self.MAX_STACK_DEPTH:
+                frames.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            stack = tuple(frames)
+        second = int(time.monotonic())
+        with self._lock:
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append((second, collections.Counter()))
+            self._buckets[-1][1][stack] += 1
 
     @staticmethod
-    async def log_bulk_delete(messages):
-        """Log quando várias mensagens são deletadas de uma vez"""
-        if not messages or not messages[0].guild:
+    def _function(code):
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {code.co_name}"
+
+    def profile(self, seconds):
+        """Agrega as amostras dos últimos `seconds` segundos (tempo próprio, inclusivo e pilhas dobradas)"""
+        since = int(time.monotonic()) - seconds
+        stacks = collections.Counter()
+        with self._lock:
+            for second, counter in self._buckets:
+                if second >= since:
+                    stacks.update(counter)
+        idle = stacks.pop(self.IDLE, 0)
+
+        own = collections.Counter()        # linha no topo da pilha
+        inclusive = collections.Counter()  # função em qualquer ponto da pilha
+        folded = []                        # formato aceito por flamegraph.pl / speedscope
+        for stack, count in stacks.items():
+            code, lineno = stack[0]
+            own[f"{os.path.basename(code.co_filename)}:{lineno} {code.co_name}"] += count
+            functions = [self._function(code) for code, _ in reversed(stack)]
+            for function in {self._function(code) for code, _ in stack if not code.co_filename.startswith(self.ASYNCIO_DIR)}:
+                inclusive[function] += count
+            folded.append(f"{';'.join(functions)} {count}")
+        busy = sum(stacks.values())
+        return {'samples': busy + idle, 'busy': busy, 'own': own, 'inclusive': inclusive, 'folded': "\n".join(folded)}
+
+    def recent(self, entries, seconds):
+        """Entradas (travamentos ou chamadas lentas) dos últimos `seconds` segundos"""
+        since = time.time() - seconds
+        return [entry for entry in list(entries) if (entry['at'] if isinstance(entry, dict) else entry[0]) >= since]
+
+loop_watchdog = LoopWatchdog(WATCHDOG_STALL_THRESHOLD, PROFILER_SAMPLE_INTERVAL, PROFILER_WINDOW)
+metrics.describe('discord_event_loop_stalls_total', 'counter', 'Travamentos do event loop acima de WATCHDOG_STALL_THRESHOLD')
+
+# SISTEMA DE PERSISTÊNCIA EM SEGUNDO PLANO
+class PersistenceManager:
+    """Grava arquivos fora do event loop, agrupando várias alterações numa única escrita"""
+
+    def __init__(self, coalesce_window):
+        self.coalesce_window = coalesce_window
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+        self._lock = threading.Lock()
+        self._dirty = {}    # destino -> (gravador, função que serializa o conteúdo completo)
+        self._appends = {}  # destino -> (gravador, itens aguardando para serem anexados)
+        self._flush_handle = None
+        self._closed = False
+        self.stats = {
+            'pending_writes': 0,
+            'writes': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'bytes_written': 0,
+            'last_write_ms': 0.0,
+            'max_write_ms': 0.0,
+            'total_write_ms': 0.0
+        }
+
+    def write(self, path, serializer, writer=None, snapshot=None):
+        """Agenda a reescrita completa de um destino (por padrão, arquivo gravado de forma atômica).
+
+        Com `snapshot`, só ele roda no event loop na hora da gravação, tirando uma cópia barata do estado;
+        o `serializer` recebe essa cópia e roda na thread de persistência. Sem ele, o serializer roda no loop."""
+        with self._lock:
+            if path in self._dirty:
+                self.stats['coalesced'] += 1
+            self._dirty[path] = (writer or self.write_atomic, serializer, snapshot)
+            # Uma reescrita completa já inclui tudo que estava para ser anexado
+            self._appends.pop(path, None)
+        self._schedule()
+
+    def append(self, path, item, writer=None):
+        """Agenda um item para ser anexado a um destino (por padrão, texto no fim do arquivo)"""
+        with self._lock:
+            if path not in self._appends:
+                self._appends[path] = (writer or self._write_append, [])
+            self._appends[path][1].append(item)
+        self._schedule()
+
+    def write_now(self, path, content, writer=None):
+        """Grava um destino na hora, na thread atual (quando a leitura seguinte depende do arquivo)"""
+        with self._lock:
+            self.stats['pending_writes'] += 1
+        self._run_job(writer or self.write_atomic, path, content)
+
+    def _schedule(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Fora do event loop (inicialização, migrações): grava na hora
+            self.flush_sync()
             return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.coalesce_window, self.flush)
 
-        guild = messages[0].guild
-        users = {}
-        total_messages = len(messages)
+    def _collect(self):
+        """Serializa as alterações pendentes e devolve os trabalhos de escrita"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            appends, self._appends = self._appends, {}
+            self._flush_handle = None
 
-        for msg in messages:
-            if not msg.author.bot:
-                users[msg.author.id] = users.get(msg.author.id, 0) + 1
+        # Anexos primeiro: uma reescrita agendada depois deles sempre parte do estado mais recente
+        jobs = [(writer, path, items, None) for path, (writer, items) in appends.items()]
+        for path, (writer, serializer, snapshot) in dirty.items():
+            try:
+                if snapshot is None:
+                    jobs.append((writer, path, serializer(), None))
+                else:
+                    jobs.append((writer, path, snapshot(), serializer))
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Erro ao serializar {path}: {e}")
+        return jobs
 
-        user_summary = "\n".join([f"<@{uid}>: {count} mensagens" for uid, count in users.items()])
+    def flush(self):
+        """Envia as escritas pendentes para a thread de persistência"""
+        for job, path, content, serializer in self._collect():
+            with self._lock:
+                self.stats['pending_writes'] += 1
+            if self._closed:
+                self._run_job(job, path, content, serializer)
+            else:
+                self.executor.submit(self._run_job, job, path, content, serializer)
 
-        await LogSystem.log_action(
-            guild,
-            'message_bulk_delete',
-            channel=messages[0].channel.name,
-            total_messages=total_messages,
-            users_affected=len(users),
-            user_summary=user_summary[:500] + "..." if len(user_summary) > 500 else user_summary
-        )
+    def flush_sync(self):
+        """Grava tudo que está pendente e espera terminar (usado no desligamento)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        for job, path, content, serializer in self._collect():
+            with self._lock:
+                self.stats['pending_writes'] += 1
+            self._run_job(job, path, content, serializer)
 
-    @staticmethod
-    async def log_command(ctx):
-        """Log quando um comando é usado"""
-        await LogSystem.log_action(
-            ctx.guild,
-            'command_used',
-            user=f"{ctx.author} ({ctx.author.id})",
-            command=ctx.command.name,
-            channel=ctx.channel.name,
-            content=ctx.message.content[:200] + "..." if len(ctx.message.content) > 200 else ctx.message.content
-        )
+    def shutdown(self):
+        """Descarrega as escritas pendentes e encerra a thread de persistência"""
+        self.executor.shutdown(wait=True)
+        self._closed = True
+        self.flush_sync()
 
-    @staticmethod
-    async def log_user_join(member):
-        """Log quando um usuário entra no servidor"""
-        await LogSystem.log_action(
-            member.guild,
-            'user_join',
-            user=f"{member} ({member.id})",
-            account_created=member.created_at.strftime("%d/%m/%Y %H:%M"),
-            member_count=member.guild.member_count
-        )
+    def _run_job(self, job, path, content, serializer=None):
+        started = time.perf_counter()
+        try:
+            if serializer is not None:
+                content = serializer(content)
+            bytes_written = job(path, content)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                metrics.observe('bot_persistence_write_seconds', elapsed_ms / 1000)
+                self.stats['writes'] += 1
+                self.stats['bytes_written'] += bytes_written or 0
+                self.stats['last_write_ms'] = elapsed_ms
+                self.stats['total_write_ms'] += elapsed_ms
+                self.stats['max_write_ms'] = max(self.stats['max_write_ms'], elapsed_ms)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"Erro ao gravar {path}: {e}")
+        finally:
+            with self._lock:
+                self.stats['pending_writes'] -= 1
 
     @staticmethod
-    async def log_user_leave(member):
-        """Log quando um usuário sai do servidor"""
-        await LogSystem.log_action(
-            member.guild,
-            'user_leave',
-            user=f"{member} ({member.id})",
-            member_count=member.guild.member_count
-        )
+    def write_atomic(path, content):
+        # Arquivo temporário + rename: um crash no meio nunca deixa o arquivo truncado
+        data = content.encode('utf-8')
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        return len(data)
 
     @staticmethod
-    async def log_role_change(member, role, action):
-        """Log quando um cargo é adicionado/removido"""
-        await LogSystem.log_action(
-            member.guild,
-            f'role_{action}',
-            user=f"{member} ({member.id})",
-            role=role.name,
-            role_id=role.id
-        )
+    def _write_append(path, lines):
+        data = "".join(lines).encode('utf-8')
+        with open(path, 'ab') as f:
+            f.write(data)
+        return len(data)
 
-    @staticmethod
-    async def log_welcome_role(member, role):
-        """Log quando um cargo de boas-vindas é adicionado"""
-        await LogSystem.log_action(
-            member.guild,
-            'welcome_role_add',
-            user=f"{member} ({member.id})",
-            role=role.name,
-            role_id=role.id
+persistence = PersistenceManager(PERSIST_COALESCE_WINDOW)
+atexit.register(persistence.shutdown)
+
+# GRAVADOR DE EVENTOS (TRACE PARA REPLAY)
+class EventTraceRecorder:
+    """Grava os eventos do gateway tratados pelo bot num trace compacto, para o benchmarks/replay.py.
+
+    JSON Lines (gzip se o arquivo terminar em .gz): um cabeçalho por execução e depois uma lista
+    [ms desde o início, código do evento, campos...] por evento. Sem TRACE_CONTENT o texto das
+    mensagens vira só um preenchimento do mesmo tamanho."""
+
+    VERSION = 1
+    CODES = {
+        'cache_message': 'm',
+        'on_raw_message_delete': 'd',
+        'on_raw_bulk_message_delete': 'b',
+        'on_raw_message_edit': 'e',
+        'on_member_join': 'j',
+        'on_member_remove': 'l',
+        'on_command': 'c'
+    }
+    ENCODERS = {
+        'cache_message': lambda message: None if message.guild is None else (
+            message.guild.id, message.channel.id, message.id, message.author.id, str(message.author),
+            int(message.author.bot), EventTraceRecorder.text(message.content), len(message.attachments)
+        ),
+        'on_raw_message_delete': lambda payload: (payload.guild_id, payload.channel_id, payload.message_id),
+        'on_raw_bulk_message_delete': lambda payload: (payload.guild_id, payload.channel_id, sorted(payload.message_ids)),
+        'on_raw_message_edit': lambda payload: (
+            payload.guild_id, payload.channel_id, payload.message_id,
+            EventTraceRecorder.text(payload.data['content']) if 'content' in payload.data else None,
+            int(bool(payload.data.get('author', {}).get('bot')))
+        ),
+        'on_member_join': lambda member: (member.guild.id, member.id, str(member), int(member.bot)),
+        'on_member_remove': lambda member: (member.guild.id, member.id, str(member), int(member.bot)),
+        'on_command': lambda ctx: None if ctx.guild is None else (
+            ctx.guild.id, ctx.channel.id, ctx.author.id, str(ctx.author),
+            ctx.command.qualified_name, EventTraceRecorder.text(ctx.message.content)
         )
+    }
 
-log_system = LogSystem()
+    def __init__(self, path):
+        self.path = path
+        self.started = None
+        self.events = 0
 
-# SISTEMA DE CARGO AUTOMÁTICO PARA NOVOS MEMBROS
-class WelcomeRoleSystem:
     @staticmethod
-    async def set_welcome_role(guild_id, role_id):
-        """Define o cargo automático para novos membros"""
-        guild_key = str(guild_id)
-        data_system.welcome_roles_data[guild_key] = role_id
-        data_system.save_welcome_roles()
+    def text(content):
+        return content if TRACE_CONTENT else "x" * len(content or '')
+
+    def recorded(self, func):
+        """Decorador para handlers de evento: grava cada chamada antes de tratá-la (sem TRACE_FILE, não faz nada)"""
+        if not self.path:
+            return func
+        code, encode = self.CODES[func.__name__], self.ENCODERS[func.__name__]
+
+        @functools.wraps(func)
+        async def wrapper(*args):
+            try:
+                fields = encode(*args)
+                if fields is not None:
+                    self.record(code, fields)
+            except Exception as e:
+                print(f"Erro ao gravar evento no trace: {e}")
+            return await func(*args)
+        return wrapper
+
+    def record(self, code, fields):
+        if self.started is None:
+            self.started = time.monotonic()
+            self._append({'version': self.VERSION, 'started': datetime.datetime.now().isoformat(), 'content': TRACE_CONTENT})
+            print(f"🎥 Gravando eventos em {self.path}")
+        self.events += 1
+        self._append([round((time.monotonic() - self.started) * 1000), code, *fields])
+
+    def _append(self, item):
+        line = json.dumps(item, ensure_ascii=False, separators=(',', ':')) + "\n"
+        persistence.append(self.path, line, writer=self._write_gzip_append if self.path.endswith(".gz") else None)
 
     @staticmethod
-    async def get_welcome_role(guild_id):
-        """Obtém o cargo automático configurado"""
-        guild_key = str(guild_id)
-        return data_system.welcome_roles_data.get(guild_key)
+    def _write_gzip_append(path, lines):
+        # Cada lote vira um membro gzip novo no fim do arquivo; o gzip.open lê todos em sequência
+        data = gzip.compress("".join(lines).encode('utf-8'))
+        with open(path, 'ab') as f:
+            f.write(data)
+        return len(data)
+
+event_trace = EventTraceRecorder(TRACE_FILE)
+
+# ÍNDICES SECUNDÁRIOS DE LOGS
+class LogIndex:
+    """Índices incrementais dos logs em memória: por servidor, usuário, ação e canal, em ordem de tempo"""
+
+    FIELDS = ('action', 'user', 'channel')
+
+    def __init__(self):
+        self.by_guild = {}  # guild_id -> [log_id]
+        self.by_key = {}    # (campo, guild_id, valor) -> [log_id]
+
+    @classmethod
+    def build(cls, entries):
+        index = cls()
+        for log_id, entry in list(entries.items()):
+            index.add(log_id, entry)
+        return index
 
     @staticmethod
-    async def remove_welcome_role(guild_id):
-        """Remove a configuração de cargo automático"""
-        guild_key = str(guild_id)
-        if guild_key in data_system.welcome_roles_data:
-            del data_system.welcome_roles_data[guild_key]
-            data_system.save_welcome_roles()
-            return True
-        return False
+    def keys_for(entry):
+        """Chaves de índice de um log"""
+        guild_id = entry.get('guild_id')
+        values = (entry.get('action'), StorageBackend.extract_user_id(entry), entry.get('channel'))
+        return [(field, guild_id, value) for field, value in zip(LogIndex.FIELDS, values) if value is not None]
+
+    def add(self, log_id, entry):
+        self.by_guild.setdefault(entry.get('guild_id'), []).append(log_id)
+        for key in self.keys_for(entry):
+            self.by_key.setdefault(key, []).append(log_id)
+
+    def candidates(self, guild_id, action=None, user_id=None, channel=None):
+        """IDs candidatos, do mais recente ao mais antigo, a partir da menor lista que atende aos filtros"""
+        postings = [
+            self.by_key.get((field, guild_id, value), [])
+            for field, value in zip(self.FIELDS, (action, user_id, channel))
+            if value is not None
+        ]
+        if not postings:
+            postings = [self.by_guild.get(guild_id, [])]
+        return reversed(min(postings, key=len))
+
+    def summary(self):
+        """Resumo compacto (valores presentes por servidor), gravado ao lado dos segmentos fechados"""
+        summary = {}
+        for field, guild_id, value in self.by_key:
+            summary.setdefault(str(guild_id), {name: [] for name in self.FIELDS})[field].append(value)
+        return summary
+
+# SISTEMA DE ARMAZENAMENTO DE LOGS (SEGMENTOS APPEND-ONLY)
+class LogStore:
+    """Logs em segmentos diários JSON Lines; só o segmento do dia fica em memória"""
+
+    def __init__(self, directory, legacy_files=(), persistence=None):
+        self.directory = directory
+        self.legacy_files = legacy_files
+        self.persistence = persistence
+        self.entries = {}
+        self.index = LogIndex()
+        self.active_key = None
+        self.line_count = 0
+        self._pending_deletes = {}  # segmento fechado -> IDs a remover
+        self._summaries = {}        # segmento fechado -> resumo do índice (cache)
 
     @staticmethod
-    async def add_welcome_role(member):
-        """Adiciona o cargo automático ao novo membro"""
+    def segment_key(timestamp):
+        """Chave do segmento (dia) a partir de um datetime ou de um timestamp ISO"""
+        if isinstance(timestamp, str):
+            return timestamp[:10]
+        return timestamp.strftime("%Y-%m-%d")
+
+    @classmethod
+    def segment_key_for_id(cls, log_id):
+        """Chave do segmento a partir do instante embutido no ID do log"""
         try:
-            role_id = await WelcomeRoleSystem.get_welcome_role(member.guild.id)
-            if not role_id:
-                return False
+            return cls.segment_key(datetime.datetime.fromtimestamp(int(log_id.split('-')[1])))
+        except (IndexError, ValueError):
+            return None
+
+    def segment_path(self, key, closed=False):
+        return os.path.join(self.directory, f"{key}.jsonl.gz" if closed else f"{key}.jsonl")
+
+    def summary_path(self, key):
+        return os.path.join(self.directory, f"{key}.idx.json")
+
+    def closed_segments(self):
+        """Chaves dos segmentos fechados (comprimidos), do mais antigo ao mais novo"""
+        return sorted(name[:-len(".jsonl.gz")] for name in os.listdir(self.directory) if name.endswith(".jsonl.gz"))
+
+    def load(self):
+        """Carrega só o segmento do dia, fechando segmentos antigos que ficaram abertos"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.migrate_legacy()
+
+        self.active_key = self.segment_key(datetime.datetime.now())
+        for name in os.listdir(self.directory):
+            key = name[:-len(".jsonl")]
+            if name.endswith(".jsonl") and key != self.active_key:
+                entries, _ = self._read_segment(self.segment_path(key))
+                if os.path.exists(self.segment_path(key, closed=True)):
+                    entries = {**dict(self.iter_segment(key)), **entries}
+                self._close_segment(key, entries)
+
+        self.entries, self.line_count = self._read_segment(self.segment_path(self.active_key))
+        self.index = LogIndex.build(self.entries)
+        return self.entries
+
+    def migrate_legacy(self):
+        """Importa uma única vez o journal ou o logs.json antigos, dividindo-os em segmentos.
+
+        O arquivo antigo só é renomeado (.migrated) depois de todos os segmentos estarem no disco: se o processo
+        morrer no meio, a migração roda de novo no próximo início e mescla com o que já foi gravado."""
+        legacy_file = next((path for path in self.legacy_files if os.path.exists(path)), None)
+        if not legacy_file:
+            return
+        try:
+            if legacy_file.endswith(".jsonl"):
+                legacy_logs, _ = self._read_segment(legacy_file)
+            else:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    legacy_logs = json.load(f)
+        except Exception as e:
+            print(f"Erro ao ler logs antigos para migração: {e}")
+            return
+
+        today = self.segment_key(datetime.datetime.now())
+        segments = {}
+        for log_id, entry in sorted(legacy_logs.items(), key=lambda item: item[1].get('timestamp', '')):
+            key = self.segment_key(entry.get('timestamp') or today)
+            segments.setdefault(key, {})[log_id] = entry
+        # Tudo síncrono: o load() lê o segmento do dia logo em seguida, e o arquivo antigo só pode sair
+        # de cena depois que cada segmento (e seu resumo) estiver gravado
+        for key, entries in segments.items():
+            open_entries, _ = self._read_segment(self.segment_path(key))
+            if key == today:
+                self.persistence.write_now(self.segment_path(key), self._encode_all({**entries, **open_entries}))
+                continue
+            entries = {**entries, **dict(self.iter_segment(key)), **open_entries}
+            self.persistence.write_now(self.segment_path(key, closed=True), self._encode_all(entries), writer=self._write_gzip)
+            self.persistence.write_now(self.summary_path(key), json.dumps(LogIndex.build(entries).summary()))
+            self._summaries.pop(key, None)
+
+        # O journal substituiu o logs.json: os dois saem de cena juntos para o mais antigo não ser migrado depois
+        for path in self.legacy_files:
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+        print(f"📦 {len(legacy_logs)} logs migrados de {legacy_file} para {len(segments)} segmentos em {self.directory}/")
+
+    def append(self, log_id, entry):
+        """Anexa um log ao segmento ativo (custo constante, independente do histórico)"""
+        key = self.segment_key(datetime.datetime.now())
+        if key != self.active_key:
+            self._rotate(key)
+        self.entries[log_id] = entry
+        self.index.add(log_id, entry)
+        self.persistence.append(self.segment_path(self.active_key), self._encode(log_id, entry))
+        self.line_count += 1
+        if self.needs_compaction():
+            self.compact()
+
+    def delete(self, log_ids):
+        """Remove logs: tombstones no segmento ativo, reescrita em segundo plano nos fechados"""
+        removed = 0
+        for log_id in log_ids:
+            if self.entries.pop(log_id, None) is not None:
+                self.persistence.append(self.segment_path(self.active_key), self._encode(log_id, {'_deleted': True}))
+                self.line_count += 1
+                removed += 1
+                continue
+            key = self.segment_key_for_id(log_id)
+            if key and key != self.active_key and os.path.exists(self.segment_path(key, closed=True)):
+                self._pending_deletes.setdefault(key, set()).add(log_id)
+                self.persistence.write(
+                    f"{self.segment_path(key, closed=True)}#delete",
+                    lambda key=key: self._pending_deletes.pop(key, set()),
+                    writer=self._delete_from_closed
+                )
+                removed += 1
+        if self.needs_compaction():
+            self.compact()
+        return removed
+
+    def needs_compaction(self):
+        """Indica se o segmento ativo acumulou linhas mortas demais"""
+        return self.line_count > max(LOG_COMPACT_MIN_LINES, 2 * len(self.entries))
+
+    def compact(self):
+        """Reescreve o segmento ativo só com os logs vivos, de forma atômica"""
+        entries = self.entries
+        self.persistence.write(self.segment_path(self.active_key), self._encode_items, snapshot=lambda: list(entries.items()))
+        self.line_count = len(entries)
+        # Reconstruir também descarta dos índices os IDs já removidos
+        self.index = LogIndex.build(entries)
+
+    def _rotate(self, key):
+        """Fecha o segmento do dia anterior e começa um novo"""
+        self._close_segment(self.active_key, self.entries)
+        self.active_key = key
+        self.entries = {}
+        self.index = LogIndex()
+        self.line_count = 0
+
+    def _close_segment(self, key, entries):
+        """Comprime o segmento com gzip, grava o resumo do índice e remove a versão aberta"""
+        # Só a cópia da lista de logs acontece no loop; codificar o dia inteiro e montar o resumo ficam na thread
+        snapshot = lambda: list(entries.items())
+        self.persistence.write(self.segment_path(key, closed=True), self._encode_items, writer=self._write_gzip, snapshot=snapshot)
+        self.persistence.write(self.summary_path(key), lambda items: json.dumps(LogIndex.build(dict(items)).summary()), snapshot=snapshot)
+        self._summaries.pop(key, None)
+
+    def iter_segment(self, key):
+        """Lê um segmento fechado linha a linha, sem carregá-lo inteiro"""
+        path = self.segment_path(key, closed=True)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                yield from self._iter_records(f)
+        except FileNotFoundError:
+            return
+
+    def iter_all(self):
+        """Percorre todos os logs, dos segmentos fechados ao ativo"""
+        for key in self.closed_segments():
+            yield from self.iter_segment(key)
+        yield from list(self.entries.items())
+
+    def query(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, offset=0, before=None):
+        """Logs que atendem aos filtros, do mais recente ao mais antigo (ordem: timestamp, depois ID).
+
+        Com o cursor `before` (timestamp, log_id) a busca recomeça no segmento do cursor: as páginas seguintes
+        não descomprimem de novo os segmentos mais novos, como faria um offset."""
+        plan = self.plan_query(guild_id, action, user_id, channel, since, until, limit=limit, offset=offset, before=before)
+        results, loaded = self.scan_segments(*plan)
+        self._summaries.update(loaded)
+        return results
+
+    def plan_query(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, offset=0, before=None):
+        """Parte da consulta que lê o estado em memória (no event loop): os logs do segmento ativo que atendem
+        aos filtros e uma cópia de tudo que scan_segments precisa para percorrer os segmentos fechados"""
+        filters = (guild_id, action, user_id, channel)
+        matches = self._matcher(guild_id, action, user_id, channel, since, until)
+        before = tuple(before) if before is not None else None
+        accept = lambda log_id, entry: matches(entry) and (before is None or (entry.get('timestamp', ''), log_id) < before)
+        wanted = None if limit is None else offset + limit
+
+        # Segmento ativo: percorre só a menor lista de índice que atende aos filtros
+        results = []
+        if before is None or self.segment_key(before[0]) >= self.active_key:
+            for log_id in self._active_candidates(*filters):
+                entry = self.entries.get(log_id)
+                if entry is not None and accept(log_id, entry):
+                    results.append((log_id, entry))
+                    if wanted is not None and len(results) >= wanted:
+                        return results, (), {}, filters, accept, offset, wanted
+
+        keys = tuple(self._segments_in_range(since, until, before))
+        return results, keys, dict(self._summaries), filters, accept, offset, wanted
+
+    def scan_segments(self, results, keys, summaries, filters, accept, offset, wanted):
+        """Percorre os segmentos fechados de um plan_query. Pode rodar fora do event loop: só lê arquivos e
+        as cópias recebidas. Retorna a página e os resumos de índice lidos do disco (para o cache do loop)"""
+        loaded = {}
+        by_time = lambda item: (item[1].get('timestamp', ''), item[0])
+        for key in keys:
+            if wanted is not None and len(results) >= wanted:
+                break
+            # Pula os segmentos que o resumo do índice descarta
+            if filters[0] is not None and key not in summaries:
+                summaries[key] = loaded[key] = self._read_summary(key)
+            if self._summary_may_match(summaries.get(key), *filters):
+                results.extend(sorted(((log_id, entry) for log_id, entry in self.iter_segment(key) if accept(log_id, entry)), key=by_time, reverse=True))
+        return results[offset:wanted], loaded
+
+    def count(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None):
+        """Quantidade de logs que atendem aos filtros"""
+        filters = (guild_id, action, user_id, channel)
+        matches = self._matcher(guild_id, action, user_id, channel, since, until)
+        total = 0
+        for log_id in self._active_candidates(*filters):
+            entry = self.entries.get(log_id)
+            if entry is not None and matches(entry):
+                total += 1
+        for key in self._segments_in_range(since, until):
+            if self._segment_may_match(key, *filters):
+                total += sum(1 for _, entry in self.iter_segment(key) if matches(entry))
+        return total
+
+    def _active_candidates(self, guild_id, action, user_id, channel):
+        if guild_id is None:
+            return reversed(list(self.entries))
+        return self.index.candidates(guild_id, action, user_id, channel)
+
+    def _segment_may_match(self, key, guild_id, action, user_id, channel):
+        """Consulta o resumo do índice de um segmento fechado (sem resumo, assume que pode haver logs)"""
+        if guild_id is None:
+            return True
+        if key not in self._summaries:
+            self._summaries[key] = self._read_summary(key)
+        return self._summary_may_match(self._summaries[key], guild_id, action, user_id, channel)
+
+    def _read_summary(self, key):
+        try:
+            with open(self.summary_path(key), 'r', encoding='utf-8') as f:
+                return {
+                    guild: {field: set(values) for field, values in fields.items()}
+                    for guild, fields in json.load(f).items()
+                }
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _summary_may_match(summary, guild_id, action, user_id, channel):
+        if guild_id is None or summary is None:
+            return True
+        guild_summary = summary.get(str(guild_id))
+        if not guild_summary:
+            return False
+        return all(
+            value is None or value in guild_summary.get(field, ())
+            for field, value in zip(LogIndex.FIELDS, (action, user_id, channel))
+        )
+
+    @staticmethod
+    def _matcher(guild_id, action, user_id, channel, since, until):
+        since = since.isoformat() if since is not None else None
+        until = until.isoformat() if until is not None else None
+
+        def matches(entry):
+            if guild_id is not None and entry.get('guild_id') != guild_id:
+                return False
+            if action is not None and entry.get('action') != action:
+                return False
+            if channel is not None and entry.get('channel') != channel:
+                return False
+            if user_id is not None and StorageBackend.extract_user_id(entry) != user_id:
+                return False
+            timestamp = entry.get('timestamp', '')
+            if since is not None and timestamp < since:
+                return False
+            if until is not None and timestamp > until:
+                return False
+            return True
+        return matches
+
+    def _segments_in_range(self, since, until, before=None):
+        for key in reversed(self.closed_segments()):
+            if since is not None and key < self.segment_key(since):
+                break
+            if until is not None and key > self.segment_key(until):
+                continue
+            if before is not None and key > self.segment_key(before[0]):
+                continue
+            yield key
+
+    def prune(self, policy):
+        """Aplica a retenção aos segmentos fechados (roda na thread de persistência)"""
+        today = datetime.date.today()
+        shortest, longest = StorageBackend.retention_bounds(policy)
+        removed_segments = removed_logs = 0
+        for key in self.closed_segments():
+            age = (today - datetime.date.fromisoformat(key)).days
+            if age <= shortest:
+                break  # Este e todos os segmentos seguintes ainda estão dentro da retenção
+            path = self.segment_path(key, closed=True)
+            if age > longest:
+                os.remove(path)
+                self._remove_summary(key)
+                removed_segments += 1
+                continue
+            removed_logs += self._rewrite_closed(
+                path,
+                lambda log_id, entry: age <= StorageBackend.retention_days(policy, entry.get('guild_id'), entry.get('action'))
+            )
+        return removed_segments, removed_logs
+
+    def _delete_from_closed(self, path, log_ids):
+        self._rewrite_closed(path[:-len("#delete")], lambda log_id, entry: log_id not in log_ids)
+        return 0
+
+    def _rewrite_closed(self, path, keep):
+        """Reescreve um segmento comprimido mantendo só os logs aceitos por `keep`"""
+        removed = kept = 0
+        temp_path = f"{path}.tmp"
+        with gzip.open(path, 'rt', encoding='utf-8') as source, gzip.open(temp_path, 'wt', encoding='utf-8') as target:
+            for log_id, entry in self._iter_records(source):
+                if keep(log_id, entry):
+                    target.write(self._encode(log_id, entry))
+                    kept += 1
+                else:
+                    removed += 1
+        if not kept:
+            os.remove(temp_path)
+            os.remove(path)
+            self._remove_summary(os.path.basename(path)[:-len(".jsonl.gz")])
+        elif removed:
+            os.replace(temp_path, path)
+        else:
+            os.remove(temp_path)
+        return removed
+
+    def _remove_summary(self, key):
+        # O resumo de um segmento reescrito continua válido (só pode ter valores a mais)
+        self._summaries.pop(key, None)
+        if os.path.exists(self.summary_path(key)):
+            os.remove(self.summary_path(key))
+
+    @staticmethod
+    def _write_gzip(path, content):
+        data = gzip.compress(content.encode('utf-8'))
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        open_path = path[:-len(".gz")]
+        if os.path.exists(open_path):
+            os.remove(open_path)
+        return len(data)
+
+    def _read_segment(self, path):
+        """Reconstrói um segmento aberto aplicando os tombstones"""
+        entries = {}
+        line_count = 0
+        if not os.path.exists(path):
+            return entries, line_count
+        with open(path, 'r', encoding='utf-8') as f:
+            for log_id, record in self._iter_records(f, include_deleted=True):
+                line_count += 1
+                if record.get('_deleted'):
+                    entries.pop(log_id, None)
+                else:
+                    entries[log_id] = record
+        return entries, line_count
+
+    @staticmethod
+    def _iter_records(lines, include_deleted=False):
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                log_id = record.pop('id')
+            except (ValueError, KeyError) as e:
+                # Linha truncada por um crash no meio da escrita: ignora e segue
+                print(f"Linha {line_number} inválida nos logs ignorada: {e}")
+                continue
+            if include_deleted or not record.get('_deleted'):
+                yield log_id, record
+
+    @classmethod
+    def _encode_all(cls, entries):
+        return cls._encode_items(list(entries.items()))
+
+    @classmethod
+    def _encode_items(cls, items):
+        return "".join(cls._encode(log_id, entry) for log_id, entry in items)
+
+    @staticmethod
+    def _encode(log_id, entry):
+        return json.dumps({'id': log_id, **entry}, ensure_ascii=False, separators=(',', ':')) + "\n"
+
+# DOCUMENTOS CARREGADOS SOB DEMANDA
+class LazyDocument(MutableMapping):
+    """Dicionário de um documento carregado no primeiro acesso: por servidor no SQLite, inteiro no JSON"""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+        self._data = {}
+        self._loaded_keys = set()
+        self._deleted_keys = set()
+        self._touched_keys = set()  # Chaves lidas ou escritas por este processo
+        self._fully_loaded = False
+
+    def _ensure(self, key=None):
+        if self._fully_loaded:
+            return
+        if key is not None and self.storage.supports_partial_load:
+            if key not in self._loaded_keys:
+                value = self.storage.load_document_key(self.name, key)
+                if value is not None and key not in self._data:
+                    self._data[key] = value
+                self._loaded_keys.add(key)
+            return
+        # Chaves já carregadas (e alteradas) em memória prevalecem sobre o que está salvo
+        loaded = self.storage.load_document(self.name)
+        for key in self._loaded_keys:
+            loaded.pop(key, None)
+        loaded.update(self._data)
+        self._data = loaded
+        self._fully_loaded = True
+
+    def __getitem__(self, key):
+        self._ensure(key)
+        value = self._data[key]
+        self._touched_keys.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._ensure(key)
+        self._data[key] = value
+        self._touched_keys.add(key)
+        self._deleted_keys.discard(key)
+
+    def __delitem__(self, key):
+        self._ensure(key)
+        del self._data[key]
+        self._deleted_keys.add(key)
+
+    def __iter__(self):
+        self._ensure()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self._ensure()
+        return len(self._data)
+
+    def loaded_items(self):
+        """Pares já carregados em memória (sem forçar o carregamento do resto)"""
+        return list(self._data.items())
+
+    def pop_touched_items(self):
+        """Pares que este processo acessou (e pode ter alterado) desde a última gravação"""
+        touched, self._touched_keys = self._touched_keys, set()
+        return [(key, self._data[key]) for key in touched if key in self._data]
+
+    def pop_deleted_keys(self):
+        """Chaves removidas desde a última gravação"""
+        deleted, self._deleted_keys = self._deleted_keys, set()
+        return deleted
+
+# BACKENDS DE ARMAZENAMENTO
+class StorageBackend:
+    """Interface comum dos backends de armazenamento do DataSystem"""
+
+    DOCUMENTS = ('tickets', 'autoroles', 'embeds', 'welcome_roles', 'log_retention', 'backfill_jobs', 'command_stats')
+    supports_partial_load = False
+    USER_ID_PATTERN = re.compile(r'\((\d+)\)$')
+    _sequence = itertools.count(1)
+
+    @classmethod
+    def next_log_id(cls, guild_id):
+        """Gera um ID de log único e monotônico dentro do processo"""
+        return f"{guild_id}-{int(time.time())}-{next(cls._sequence)}"
+
+    @classmethod
+    def extract_user_id(cls, entry):
+        """Extrai o ID do usuário principal de um log ("nome (id)" em user/author/moderator)"""
+        if entry.get('user_id'):
+            return int(entry['user_id'])
+        for field in ('user', 'author', 'moderator'):
+            match = cls.USER_ID_PATTERN.search(str(entry.get(field, '')))
+            if match:
+                return int(match.group(1))
+        return None
+
+    @staticmethod
+    def retention_days(policy, guild_id, action):
+        """Dias de retenção de uma ação num servidor (ação > servidor > padrão global)"""
+        guild_policy = policy['guilds'].get(str(guild_id), {})
+        return guild_policy.get('actions', {}).get(action, guild_policy.get('default', policy['default']))
+
+    @staticmethod
+    def retention_bounds(policy):
+        """Menor e maior retenção configuradas em toda a política"""
+        values = [policy['default']]
+        for guild_policy in policy['guilds'].values():
+            values.extend(v for v in (guild_policy.get('default'),) if v is not None)
+            values.extend(guild_policy.get('actions', {}).values())
+        return min(values), max(values)
+
+    def load_document(self, name):
+        raise NotImplementedError
+
+    def load_document_key(self, name, key):
+        """Carrega só uma chave (servidor) de um documento, quando o backend permite"""
+        raise NotImplementedError
+
+    def save_document(self, name, data):
+        raise NotImplementedError
+
+    def load_logs(self):
+        """Prepara os logs para uso (no-op quando ficam fora da memória)"""
+
+    def ensure_logs(self):
+        """Carrega os logs se ainda não foram carregados (no modo FAST_START, no primeiro uso)"""
+
+    def append_log(self, guild_id, entry):
+        raise NotImplementedError
+
+    def delete_logs(self, log_ids):
+        raise NotImplementedError
+
+    def query_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, offset=0, before=None):
+        """Retorna [(log_id, log)] do mais recente para o mais antigo.
+
+        `before` é o cursor (timestamp, log_id) do último log da página anterior: só vêm logs mais antigos que ele"""
+        raise NotImplementedError
+
+    async def search_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, before=None):
+        """query_logs para o event loop: o trabalho pesado roda na thread de persistência"""
+        return self.query_logs(guild_id, action, user_id, channel, since, until, limit=limit, before=before)
+
+    def count_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None):
+        raise NotImplementedError
+
+    def compact_logs(self):
+        """Compacta o armazenamento de logs, quando aplicável"""
+
+    def prune_logs(self, policy):
+        """Remove logs fora da retenção; retorna (segmentos, logs) removidos"""
+        raise NotImplementedError
+
+    def close(self):
+        """Libera recursos do backend"""
+
+
+class JsonStorageBackend(StorageBackend):
+    """Backend em arquivos JSON, com os logs em segmentos JSON Lines"""
+
+    DOCUMENT_FILES = {
+        'tickets': "tickets.json",
+        'autoroles': "autoroles.json",
+        'embeds': "embeds.json",
+        'welcome_roles': "welcome_roles.json",
+        'log_retention': "log_retention.json",
+        'backfill_jobs': "backfill_jobs.json",
+        'command_stats': "command_stats.json"
+    }
+
+    def __init__(self, persistence, logs_dir=LOGS_SEGMENT_DIR, legacy_files=(LOGS_JOURNAL_FILE, "logs.json"), shared=False):
+        self.persistence = persistence
+        self.log_store = LogStore(logs_dir, legacy_files=legacy_files, persistence=persistence)
+        # Compartilhado entre processos: cada gravação trava o arquivo e mescla só as chaves deste processo
+        self.shared = shared
+
+    def load_document(self, name):
+        path = self.DOCUMENT_FILES[name]
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def save_document(self, name, data):
+        if self.shared and isinstance(data, LazyDocument):
+            self.persistence.write(
+                self.DOCUMENT_FILES[name],
+                lambda: (data.pop_touched_items(), data.pop_deleted_keys()),
+                writer=self._merge_shared_document
+            )
+            return
+        # No loop, só o encoder em C (compacto) tira uma cópia imutável do documento; a versão indentada,
+        # feita em Python puro e bem mais lenta, é montada na thread de persistência
+        self.persistence.write(
+            self.DOCUMENT_FILES[name],
+            lambda snapshot: json.dumps(json.loads(snapshot), indent=2),
+            snapshot=lambda: json.dumps(dict(data))
+        )
+
+    def _merge_shared_document(self, path, changes):
+        """Relê o arquivo sob trava exclusiva e aplica só as alterações deste processo"""
+        items, deleted = changes
+        with open(f"{path}.lock", 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                current = {}
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        current = json.load(f)
+                for key in deleted:
+                    current.pop(key, None)
+                current.update(items)
+                return self.persistence.write_atomic(path, json.dumps(current, indent=2))
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load_logs(self):
+        self.log_store.load()
+
+    def ensure_logs(self):
+        # No modo de início rápido o segmento do dia só é lido no primeiro uso
+        if self.log_store.active_key is None:
+            self.log_store.load()
+
+    def append_log(self, guild_id, entry):
+        self.ensure_logs()
+        log_id = self.next_log_id(guild_id)
+        self.log_store.append(log_id, entry)
+        return log_id
+
+    def delete_logs(self, log_ids):
+        self.ensure_logs()
+        return self.log_store.delete(log_ids)
+
+    def query_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, offset=0, before=None):
+        self.ensure_logs()
+        return self.log_store.query(guild_id, action, user_id, channel, since, until, limit=limit, offset=offset, before=before)
+
+    async def search_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, before=None):
+        # Estado em memória (segmento ativo, índices, cache de resumos) só é lido aqui no loop;
+        # a thread de persistência recebe uma cópia e só descomprime os segmentos fechados
+        self.ensure_logs()
+        plan = self.log_store.plan_query(guild_id, action, user_id, channel, since, until, limit=limit, before=before)
+        results, loaded = await asyncio.get_running_loop().run_in_executor(self.persistence.executor, self.log_store.scan_segments, *plan)
+        self.log_store._summaries.update(loaded)
+        return results
+
+    def count_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None):
+        self.ensure_logs()
+        return self.log_store.count(guild_id, action, user_id, channel, since, until)
+
+    def compact_logs(self):
+        self.ensure_logs()
+        self.log_store.compact()
+
+    def prune_logs(self, policy):
+        # Roda na thread de persistência: só mexe nos segmentos fechados e nunca dispara o load(),
+        # que precisa rodar no event loop (quem chama usa ensure_logs() antes)
+        return self.log_store.prune(policy)
+
+
+class SqliteStorageBackend(StorageBackend):
+    """Backend em SQLite (modo WAL) com índices para as consultas de logs"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        );
+        CREATE TABLE IF NOT EXISTS logs (
+            id TEXT PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            user_id INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_logs_guild_time ON logs (guild_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_logs_guild_action_time ON logs (guild_id, action, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_logs_guild_user_time ON logs (guild_id, user_id, timestamp);
+    """
+    INSERT_LOG_SQL = "INSERT OR REPLACE INTO logs (id, guild_id, action, timestamp, user_id, data) VALUES (?, ?, ?, ?, ?, ?)"
+    DELETE_LOG_SQL = "DELETE FROM logs WHERE id = ?"
+
+    def __init__(self, db_file, persistence):
+        self.db_file = db_file
+        self.persistence = persistence
+        # Escritas acontecem na thread de persistência; leituras no event loop (o WAL permite as duas juntas)
+        self._write_conn = self._connect()
+        self._write_conn.executescript(self.SCHEMA)
+        self._read_conn = self._connect()
+        self._search_conn = self._connect()  # Só usada pela busca de logs, na thread de persistência
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    supports_partial_load = True
+
+    def load_document(self, name):
+        rows = self._read_conn.execute("SELECT key, value FROM documents WHERE name = ?", (name,))
+        return {key: json.loads(value) for key, value in rows}
+
+    def load_document_key(self, name, key):
+        row = self._read_conn.execute("SELECT value FROM documents WHERE name = ? AND key = ?", (name, str(key))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_document(self, name, data):
+        self.persistence.write(f"{self.db_file}:{name}", lambda: self._document_changes(name, data), writer=self._write_document)
+
+    @staticmethod
+    def _document_changes(name, data):
+        """Linhas a gravar e chaves a remover; um dict comum substitui o documento inteiro"""
+        if isinstance(data, LazyDocument):
+            items, deleted, replace = data.loaded_items(), data.pop_deleted_keys(), False
+        else:
+            items, deleted, replace = list(data.items()), (), True
+        rows = [(name, str(key), json.dumps(value)) for key, value in items]
+        return name, rows, [(name, str(key)) for key in deleted], replace
+
+    def _write_document(self, path, changes):
+        name, rows, deleted, replace = changes
+        with self._write_conn:
+            if replace:
+                self._write_conn.execute("DELETE FROM documents WHERE name = ?", (name,))
+            self._write_conn.executemany("DELETE FROM documents WHERE name = ? AND key = ?", deleted)
+            self._write_conn.executemany("INSERT OR REPLACE INTO documents (name, key, value) VALUES (?, ?, ?)", rows)
+        return sum(len(row[2]) for row in rows)
+
+    def _log_row(self, log_id, entry):
+        return (
+            log_id,
+            entry.get('guild_id'),
+            entry.get('action', ''),
+            entry.get('timestamp', ''),
+            self.extract_user_id(entry),
+            json.dumps(entry, ensure_ascii=False)
+        )
+
+    def append_log(self, guild_id, entry):
+        log_id = self.next_log_id(guild_id)
+        self.persistence.append(f"{self.db_file}:logs", (self.INSERT_LOG_SQL, self._log_row(log_id, entry)), writer=self._write_log_ops)
+        return log_id
+
+    def delete_logs(self, log_ids):
+        for log_id in log_ids:
+            self.persistence.append(f"{self.db_file}:logs", (self.DELETE_LOG_SQL, (log_id,)), writer=self._write_log_ops)
+        return len(log_ids)
+
+    def _write_log_ops(self, path, operations):
+        # Um lote inteiro numa única transação, na ordem em que chegou
+        with self._write_conn:
+            for sql, params in operations:
+                self._write_conn.execute(sql, params)
+        return sum(len(params[-1]) for sql, params in operations if sql is self.INSERT_LOG_SQL)
+
+    def import_logs(self, logs):
+        """Importa pares (log_id, log) preservando seus IDs (usado na migração)"""
+        with self._write_conn:
+            cursor = self._write_conn.executemany(self.INSERT_LOG_SQL, (self._log_row(log_id, entry) for log_id, entry in logs))
+        return cursor.rowcount
+
+    def prune_logs(self, policy):
+        now = datetime.datetime.now()
+        removed = 0
+        with self._write_conn:
+            pairs = self._write_conn.execute("SELECT DISTINCT guild_id, action FROM logs").fetchall()
+            for guild_id, action in pairs:
+                cutoff = now - datetime.timedelta(days=self.retention_days(policy, guild_id, action))
+                removed += self._write_conn.execute(
+                    "DELETE FROM logs WHERE guild_id = ? AND action = ? AND timestamp < ?",
+                    (guild_id, action, cutoff.isoformat())
+                ).rowcount
+        return 0, removed
+
+    @staticmethod
+    def _where(guild_id, action, user_id, channel, since, until):
+        clauses, params = [], []
+        for column, operator, value in (
+            ('guild_id', '=', guild_id),
+            ('action', '=', action),
+            ('user_id', '=', user_id),
+            ("json_extract(data, '$.channel')", '=', channel),
+            ('timestamp', '>=', since.isoformat() if since else None),
+            ('timestamp', '<=', until.isoformat() if until else None)
+        ):
+            if value is not None:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, offset=0, before=None):
+        return self._select_logs(self._read_conn, guild_id, action, user_id, channel, since, until, limit, offset, before)
+
+    async def search_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None, limit=None, before=None):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.persistence.executor,
+            functools.partial(self._select_logs, self._search_conn, guild_id, action, user_id, channel, since, until, limit, 0, before)
+        )
+
+    def _select_logs(self, conn, guild_id, action, user_id, channel, since, until, limit, offset, before):
+        where, params = self._where(guild_id, action, user_id, channel, since, until)
+        if before is not None:
+            # Mesma ordem do ORDER BY: continua logo depois do cursor usando o índice (guild_id, timestamp)
+            where += (" AND " if where else " WHERE ") + "(timestamp < ? OR (timestamp = ? AND id < ?))"
+            params += [before[0], before[0], before[1]]
+        sql = f"SELECT id, data FROM logs{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?"
+        rows = conn.execute(sql, (*params, -1 if limit is None else limit, offset))
+        return [(log_id, json.loads(data)) for log_id, data in rows]
+
+    def count_logs(self, guild_id=None, action=None, user_id=None, channel=None, since=None, until=None):
+        where, params = self._where(guild_id, action, user_id, channel, since, until)
+        return self._read_conn.execute(f"SELECT COUNT(*) FROM logs{where}", params).fetchone()[0]
+
+    def close(self):
+        self._read_conn.close()
+        self._search_conn.close()
+        self._write_conn.close()
+
+
+def create_storage_backend(kind=None):
+    """Cria o backend de armazenamento configurado em STORAGE_BACKEND"""
+    kind = kind or STORAGE_BACKEND
+    if kind == 'sqlite':
+        return SqliteStorageBackend(SQLITE_DB_FILE, persistence)
+    if kind != 'json':
+        print(f"Backend de armazenamento desconhecido '{kind}', usando JSON")
+    if IS_CLUSTER_WORKER:
+        # Cada processo grava seus logs num diretório próprio; só o cluster 0 migra os logs antigos
+        print("⚠️ Modo cluster com backend JSON: prefira STORAGE_BACKEND=sqlite para consultas entre processos")
+        return JsonStorageBackend(
+            persistence,
+            logs_dir=os.path.join(LOGS_SEGMENT_DIR, f"cluster-{CLUSTER_ID}"),
+            legacy_files=(LOGS_JOURNAL_FILE, "logs.json") if CLUSTER_ID == 0 else (),
+            shared=True
+        )
+    return JsonStorageBackend(persistence)
+
+
+def migrate_json_to_sqlite(db_file=None):
+    """Importa os arquivos JSON existentes para o banco SQLite"""
+    source = JsonStorageBackend(persistence)
+    source.load_logs()
+    target = SqliteStorageBackend(db_file or SQLITE_DB_FILE, persistence)
+    for name in StorageBackend.DOCUMENTS:
+        document = source.load_document(name)
+        target.save_document(name, document)
+        print(f"📦 {name}: {len(document)} registros importados")
+    imported = target.import_logs(source.log_store.iter_all())
+    print(f"📦 logs: {imported} registros importados para {target.db_file}")
+    persistence.flush_sync()
+    target.close()
+
+# SISTEMA DE ARMAZENAMENTO
+class DataSystem:
+    def __init__(self, storage=None):
+        self.storage = storage or create_storage_backend()
+        self.load_data()
+
+    def load_data(self):
+        """Carrega dados do backend de armazenamento (sob demanda no modo FAST_START)"""
+        try:
+            self.tickets_data = LazyDocument(self.storage, 'tickets')
+            self.autoroles_data = LazyDocument(self.storage, 'autoroles')
+            self.embeds_data = LazyDocument(self.storage, 'embeds')
+            self.welcome_roles_data = LazyDocument(self.storage, 'welcome_roles')
+            self.log_retention_data = LazyDocument(self.storage, 'log_retention')
+            self.backfill_jobs_data = LazyDocument(self.storage, 'backfill_jobs')
+            self.command_stats_data = LazyDocument(self.storage, 'command_stats')
+            if not FAST_START:
+                for document in (self.tickets_data, self.autoroles_data, self.embeds_data, self.welcome_roles_data,
+                                 self.log_retention_data, self.backfill_jobs_data, self.command_stats_data):
+                    len(document)
+                self.storage.load_logs()
+
+        except Exception as e:
+            print(f"Erro ao carregar dados: {e}")
+            self.tickets_data = {}
+            self.autoroles_data = {}
+            self.embeds_data = {}
+            self.welcome_roles_data = {}
+            self.log_retention_data = {}
+            self.backfill_jobs_data = {}
+            self.command_stats_data = {}
+
+    def save_tickets(self):
+        """Salva dados dos tickets"""
+        self.storage.save_document('tickets', self.tickets_data)
+
+    def save_autoroles(self):
+        """Salva dados dos autoroles"""
+        self.storage.save_document('autoroles', self.autoroles_data)
+
+    def save_logs(self):
+        """Compacta o armazenamento de logs"""
+        try:
+            self.storage.compact_logs()
+        except Exception as e:
+            print(f"Erro ao salvar logs: {e}")
+
+    def save_embeds(self):
+        """Salva dados dos embeds"""
+        self.storage.save_document('embeds', self.embeds_data)
+
+    def save_welcome_roles(self):
+        """Salva dados dos welcome roles"""
+        self.storage.save_document('welcome_roles', self.welcome_roles_data)
+
+    def save_log_retention(self):
+        """Salva a configuração de retenção de logs"""
+        self.storage.save_document('log_retention', self.log_retention_data)
+
+    def save_backfill_jobs(self):
+        """Salva o progresso dos backfills de cargo"""
+        self.storage.save_document('backfill_jobs', self.backfill_jobs_data)
+
+    def save_command_stats(self):
+        """Salva os agregados de uso de comandos"""
+        self.storage.save_document('command_stats', self.command_stats_data)
+
+    def append_log(self, guild_id, entry):
+        """Registra um novo log e retorna seu ID"""
+        try:
+            return self.storage.append_log(guild_id, entry)
+        except Exception as e:
+            print(f"Erro ao salvar log: {e}")
+            return None
+
+    def delete_logs(self, log_ids):
+        """Remove logs pelo ID"""
+        try:
+            return self.storage.delete_logs(log_ids)
+        except Exception as e:
+            print(f"Erro ao remover logs: {e}")
+            return 0
+
+    def query_logs(self, guild_id, **filters):
+        """Consulta logs de um servidor (filtros: action, user_id, channel, since, until, limit, offset)"""
+        return self.storage.query_logs(guild_id=guild_id, **filters)
+
+    async def search_logs(self, guild_id, **filters):
+        """query_logs sem bloquear o event loop (filtros: action, user_id, channel, since, until, limit, before)"""
+        return await self.storage.search_logs(guild_id=guild_id, **filters)
+
+    def count_logs(self, guild_id, **filters):
+        """Conta logs de um servidor com os mesmos filtros de query_logs"""
+        return self.storage.count_logs(guild_id=guild_id, **filters)
+
+data_system = DataSystem()
+startup_timer.mark('data_load')
+
+# FILA DE ENTREGA DE LOGS
+class LogDeliveryQueue:
+    """Fila por servidor que agrupa embeds de log e respeita os rate limits do Discord"""
+
+    def __init__(self, batch_size, flush_interval, max_size, overflow_policy, batch_chars=LOG_BATCH_CHARS):
+        self.batch_size = batch_size
+        self.batch_chars = batch_chars
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self._queues = {}     # guild_id -> deque de embeds
+        self._overflow = {}   # guild_id -> {ação: quantidade descartada}
+        self._wakeups = {}    # guild_id -> asyncio.Event (lote cheio)
+        self._workers = {}    # guild_id -> tarefa de entrega
+        self._retry_at = {}   # guild_id -> instante liberado após um 429
+        self._split = {}      # guild_id -> máximo de embeds por lote depois de um lote recusado (400)
+        self.stats = {'enqueued': 0, 'delivered': 0, 'messages_sent': 0, 'dropped': 0, 'rate_limited': 0, 'split': 0}
+
+    def depth(self, guild_id=None):
+        """Quantidade de logs aguardando entrega"""
+        if guild_id is not None:
+            return len(self._queues.get(guild_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def enqueue(self, guild, action_type, embed):
+        """Coloca um embed na fila do servidor e retorna imediatamente"""
+        queue = self._queues.setdefault(guild.id, collections.deque())
+        if len(queue) >= self.max_size:
+            self.stats['dropped'] += 1
+            if self.overflow_policy == 'summarize':
+                overflow = self._overflow.setdefault(guild.id, collections.Counter())
+                overflow[action_type] += 1
+            return False
+
+        queue.append(embed)
+        self.stats['enqueued'] += 1
+        wakeup = self._wakeups.setdefault(guild.id, asyncio.Event())
+        if len(queue) >= self.batch_size:
+            wakeup.set()
+
+        worker = self._workers.get(guild.id)
+        if worker is None or worker.done():
+            self._workers[guild.id] = asyncio.ensure_future(self._deliver(guild))
+        return True
+
+    async def _deliver(self, guild):
+        """Envia os logs do servidor em lotes até a fila esvaziar"""
+        queue = self._queues[guild.id]
+        wakeup = self._wakeups[guild.id]
+        while queue or self._overflow.get(guild.id):
+            # Espera o lote encher ou o tempo limite passar
+            if len(queue) < self.batch_size:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            wakeup.clear()
+
+            retry_at = self._retry_at.get(guild.id, 0)
+            if retry_at > time.monotonic():
+                await asyncio.sleep(retry_at - time.monotonic())
+
+            max_embeds = self._split.get(guild.id, self.batch_size)
+            overflow = self._overflow.pop(guild.id, None)
+            summary = self._overflow_summary(overflow) if overflow else None
+            if summary:
+                batch = self._take_batch(queue, max_embeds - 1, self.batch_chars - len(summary)) + [summary]
+            else:
+                batch = self._take_batch(queue, max_embeds, self.batch_chars)
+            if not batch:
+                continue
+
+            log_channel = await LogSystem.get_log_channel(guild)
+            if not log_channel:
+                continue
+            try:
+                await log_channel.send(embeds=batch)
+                self.stats['messages_sent'] += 1
+                self.stats['delivered'] += len(batch)
+                self._split.pop(guild.id, None)
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None:
+                    if getattr(e, 'status', None) == 400 and len(batch) > 1:
+                        # Lote recusado pelo Discord: devolve para a fila e tenta de novo em lotes menores
+                        self.stats['split'] += 1
+                        self._split[guild.id] = max(1, len(batch) // 2)
+                        queue.extendleft(reversed([embed for embed in batch if embed is not summary]))
+                        if overflow:
+                            self._overflow.setdefault(guild.id, collections.Counter()).update(overflow)
+                        wakeup.set()
+                        continue
+                    print(f"Erro ao enviar logs: {e}")
+                    continue
+                # Devolve o lote para a frente da fila e aguarda o bucket liberar
+                self.stats['rate_limited'] += 1
+                self._retry_at[guild.id] = time.monotonic() + retry_after
+                queue.extendleft(reversed([embed for embed in batch if embed is not summary]))
+                if overflow:
+                    self._overflow.setdefault(guild.id, collections.Counter()).update(overflow)
+                wakeup.set()
+
+    @staticmethod
+    def _take_batch(queue, max_embeds, max_chars):
+        """Tira da fila o maior lote que cabe numa mensagem (em embeds e em caracteres somados)"""
+        batch = []
+        total = 0
+        while queue and len(batch) < max_embeds:
+            size = len(queue[0])
+            # Um embed sozinho acima do limite ainda é enviado: o Discord recusa e ele é descartado
+            if batch and total + size > max_chars:
+                break
+            batch.append(queue.popleft())
+            total += size
+        return batch
+
+    @staticmethod
+    def _overflow_summary(overflow):
+        """Embed resumindo os logs descartados por excesso de volume"""
+        embed = discord.Embed(
+            title="⚠️ Logs Resumidos",
+            description=f"{sum(overflow.values())} logs não foram enviados individualmente por excesso de volume",
+            color=0xf1c40f,
+            timestamp=datetime.datetime.utcnow()
+        )
+        for action_type, count in overflow.most_common(25):
+            embed.add_field(name=action_type.replace('_', ' ').title(), value=str(count), inline=True)
+        return embed
+
+log_delivery = LogDeliveryQueue(LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_QUEUE_MAX, LOG_OVERFLOW_POLICY)
+
+# CACHE COMPACTO DE MENSAGENS (para logar exclusões e edições de mensagens antigas)
+class CachedMessage:
+    """Só o que os logs precisam de uma mensagem: bem menor que um discord.Message"""
+    __slots__ = ('id', 'author_id', 'channel_id', 'content', 'attachments', 'size')
+
+    RECORD_OVERHEAD = 160  # objeto com __slots__ + entrada no OrderedDict do servidor
+
+    def __init__(self, message_id, author_id, channel_id, content, attachments):
+        self.id = message_id
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.content = content
+        self.attachments = attachments
+        self.size = self.RECORD_OVERHEAD + sys.getsizeof(content)
+
+    @classmethod
+    def from_message(cls, message):
+        """Versão compacta de um discord.Message (None para mensagens de bots ou fora de servidores)"""
+        if message.guild is None or message.author.bot:
+            return None
+        content = message.content
+        if len(content) > MESSAGE_CACHE_CONTENT_LIMIT:
+            content = content[:MESSAGE_CACHE_CONTENT_LIMIT] + "..."
+        return cls(message.id, message.author.id, message.channel.id, content, len(message.attachments))
+
+class MessageCache:
+    """Mensagens recentes de cada servidor em LRU, dentro de um orçamento de bytes para o processo todo.
+
+    Quando o orçamento estoura, o servidor que mais ocupa perde as mensagens mais antigas primeiro,
+    então um servidor com spam não apaga o histórico dos outros."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.bytes = 0
+        self._guilds = {}  # guild_id -> OrderedDict(message_id -> CachedMessage)
+        self._guild_bytes = collections.Counter()
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def __len__(self):
+        return sum(len(messages) for messages in self._guilds.values())
+
+    def add(self, guild_id, record):
+        messages = self._guilds.setdefault(guild_id, collections.OrderedDict())
+        previous = messages.pop(record.id, None)
+        if previous is not None:
+            self._account(guild_id, -previous.size)
+        messages[record.id] = record
+        self._account(guild_id, record.size)
+        if self.bytes > self.budget:
+            self._evict()
+
+    def get(self, guild_id, message_id):
+        record = self._guilds.get(guild_id, {}).get(message_id)
+        self.stats['hits' if record else 'misses'] += 1
+        return record
+
+    def update_content(self, guild_id, message_id, content):
+        """Atualiza o conteúdo depois de uma edição (a mensagem volta ao fim da LRU)"""
+        record = self._guilds.get(guild_id, {}).get(message_id)
+        if record is not None:
+            if len(content) > MESSAGE_CACHE_CONTENT_LIMIT:
+                content = content[:MESSAGE_CACHE_CONTENT_LIMIT] + "..."
+            self.add(guild_id, CachedMessage(record.id, record.author_id, record.channel_id, content, record.attachments))
+
+    def pop(self, guild_id, message_id):
+        record = self._guilds.get(guild_id, {}).pop(message_id, None)
+        self.stats['hits' if record else 'misses'] += 1
+        if record is not None:
+            self._account(guild_id, -record.size)
+        return record
+
+    def forget_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+        self.bytes -= self._guild_bytes.pop(guild_id, 0)
+
+    def _account(self, guild_id, size):
+        self.bytes += size
+        self._guild_bytes[guild_id] += size
+
+    def _evict(self):
+        """Corta os servidores que mais ocupam até um teto comum; os pequenos não perdem nada"""
+        # Libera 10% de folga de uma vez para não recalcular o teto a cada mensagem
+        target = self.budget * 0.9
+        sizes = sorted(self._guild_bytes.values())
+        remaining = target
+        for index, size in enumerate(sizes):
+            share = remaining / (len(sizes) - index)
+            if size > share:
+                cap = share
+                break
+            remaining -= size
+        else:
+            return
+
+        for guild_id, size in list(self._guild_bytes.items()):
+            if size <= cap:
+                continue
+            messages = self._guilds[guild_id]
+            while messages and self._guild_bytes[guild_id] > cap:
+                _, record = messages.popitem(last=False)
+                self._account(guild_id, -record.size)
+                self.stats['evicted'] += 1
+            if not messages:
+                self.forget_guild(guild_id)
+
+message_cache = MessageCache(MESSAGE_CACHE_BUDGET)
+
+# PERFIL DE MEMÓRIA
+class MemberChunker:
+    """Chunk de membros sob demanda para o perfil low: só nos servidores em que um recurso
+    precisou de um membro fora do cache, e só até LAZY_CHUNK_MAX_MEMBERS membros"""
+
+    def __init__(self, max_members):
+        self.max_members = max_members
+        self._requested = set()
+        self._semaphore = asyncio.Semaphore(1)  # Um chunk por vez para não disputar o gateway
+
+    def request(self, guild):
+        """Agenda o chunk do servidor em segundo plano (uma vez só); quem chamou segue sem esperar"""
+        if guild.chunked or guild.id in self._requested or (guild.member_count or 0) > self.max_members:
+            return
+        self._requested.add(guild.id)
+        asyncio.ensure_future(self._chunk(guild))
+
+    def forget_guild(self, guild_id):
+        self._requested.discard(guild_id)
+
+    async def _chunk(self, guild):
+        async with self._semaphore:
+            try:
+                await guild.chunk(cache=True)
+            except Exception as e:
+                print(f"Erro ao carregar membros de {guild.name}: {e}")
+
+member_chunker = MemberChunker(LAZY_CHUNK_MAX_MEMBERS)
+
+class MemoryReport:
+    """Estimativa de memória por servidor em cada perfil, mostrada uma vez depois do ready"""
+
+    # Tamanhos aproximados dos objetos do discord.py em CPython 3.11
+    MEMBER_BYTES = 1100   # Member + User
+    CHANNEL_BYTES = 700
+    ROLE_BYTES = 450
+    MESSAGE_BYTES = 2500  # discord.Message no cache do discord.py
+    reported = False
+
+    @staticmethod
+    def estimate(guild, cached_members):
+        return (cached_members * MemoryReport.MEMBER_BYTES
+                + len(guild.channels) * MemoryReport.CHANNEL_BYTES
+                + len(guild.roles) * MemoryReport.ROLE_BYTES)
+
+    @staticmethod
+    def profiles(guild):
+        """Bytes estimados do servidor no perfil default (todos os membros) e no low (membros do cache atual)"""
+        default = MemoryReport.estimate(guild, guild.member_count or len(guild.members))
+        low = MemoryReport.estimate(guild, len(guild.members) if LOW_MEMORY else 0)
+        return default, low
+
+    @staticmethod
+    def print_report(top=10):
+        if MemoryReport.reported:
+            return
+        MemoryReport.reported = True
+        rows = sorted(((guild,) + MemoryReport.profiles(guild) for guild in bot.guilds), key=lambda row: row[1], reverse=True)
+        # Cache de discord.Message: 1000 no perfil default, 100 no low (padrões de MAX_MESSAGES)
+        total_default = sum(row[1] for row in rows) + 1000 * MemoryReport.MESSAGE_BYTES
+        total_low = sum(row[2] for row in rows) + 100 * MemoryReport.MESSAGE_BYTES
+        size = lambda value: f"{value / 1024 / 1024:.1f} MB" if value >= 1024 * 1024 else f"{value / 1024:.0f} KB"
+
+        print(f"💾 Memória estimada (perfil atual: {MEMORY_PROFILE}, cache de membros: {MEMBER_CACHE}, max_messages: {MAX_MESSAGES}): "
+              f"default {size(total_default)} | low {size(total_low)} | + até {size(MESSAGE_CACHE_BUDGET)} do cache compacto de mensagens")
+        for guild, default, low in rows[:top]:
+            print(f"   - {guild.name} ({guild.member_count} membros): default {size(default)} | low {size(low)}")
+        if resource is not None:
+            print(f"   Pico de memória do processo: {size(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)}")
+
+# SISTEMA DE LOGS CORRIGIDO
+class LogSystem:
+    # Cache guild_id -> ID do canal de logs e criações em andamento (single-flight)
+    _log_channel_ids = {}
+    _pending_creations = {}
+    cache_stats = {'hits': 0, 'misses': 0}
+    # Mensagens apagadas pelo próprio bot (s!clear), que já entram no log resumido da limpeza
+    _suppressed_deletes = set()
+
+    @staticmethod
+    def suppress_delete_logs(message_ids, ttl=120):
+        """Não loga individualmente as exclusões feitas pelo bot; esquece os IDs depois de ttl segundos"""
+        ids = set(message_ids)
+        LogSystem._suppressed_deletes.update(ids)
+        asyncio.get_running_loop().call_later(ttl, LogSystem._suppressed_deletes.difference_update, ids)
+
+    @staticmethod
+    async def get_log_channel(guild):
+        """Encontra ou cria canal de logs"""
+        channel_id = LogSystem._log_channel_ids.get(guild.id)
+        if channel_id:
+            log_channel = guild.get_channel(channel_id)
+            if log_channel:
+                LogSystem.cache_stats['hits'] += 1
+                return log_channel
+            LogSystem._log_channel_ids.pop(guild.id, None)
+
+        LogSystem.cache_stats['misses'] += 1
+        log_channel = discord.utils.get(guild.text_channels, name=LOG_CHANNEL_NAME)
+        if log_channel:
+            LogSystem._log_channel_ids[guild.id] = log_channel.id
+            return log_channel
+
+        # Só uma criação por servidor: eventos concorrentes aguardam a mesma tarefa
+        pending = LogSystem._pending_creations.get(guild.id)
+        if pending is None:
+            pending = asyncio.ensure_future(LogSystem._create_log_channel(guild))
+            LogSystem._pending_creations[guild.id] = pending
+            pending.add_done_callback(lambda _: LogSystem._pending_creations.pop(guild.id, None))
+        return await asyncio.shield(pending)
+
+    @staticmethod
+    async def _create_log_channel(guild):
+        """Cria o canal de logs e guarda seu ID no cache"""
+        try:
+            overwrites = {
+                guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+            }
+
+            log_channel = await guild.create_text_channel(
+                name=LOG_CHANNEL_NAME,
+                overwrites=overwrites,
+                topic="Canal de logs do sistema"
+            )
+        except Exception as e:
+            print(f"Erro ao criar canal de logs: {e}")
+            return None
+        LogSystem._log_channel_ids[guild.id] = log_channel.id
+        return log_channel
+
+    @staticmethod
+    def invalidate_log_channel(channel, *others):
+        """Descarta o canal de logs em cache se o canal alterado puder afetá-lo"""
+        guild = channel.guild
+        cached_id = LogSystem._log_channel_ids.get(guild.id)
+        for changed in (channel, *others):
+            if changed.id == cached_id or getattr(changed, 'name', None) == LOG_CHANNEL_NAME:
+                LogSystem._log_channel_ids.pop(guild.id, None)
+                return
+
+    @staticmethod
+    def forget_guild(guild_id):
+        """Remove o servidor do cache de canais de logs"""
+        LogSystem._log_channel_ids.pop(guild_id, None)
+
+    @staticmethod
+    async def log_action(guild, action_type, **details):
+        """Sistema de logs simplificado"""
+        try:
+            LogSystem.store_log(guild, action_type, **details)
+            # Entrega no canal de logs em lotes, fora do handler do evento
+            log_delivery.enqueue(guild, action_type, LogSystem.build_log_embed(action_type, details))
+
+        except Exception as e:
+            print(f"Erro no sistema de logs: {e}")
+
+    @staticmethod
+    async def log_summary(guild, action_type, records, **details):
+        """Grava um log indexado por registro, mas entrega no canal um único embed de resumo"""
+        try:
+            for record in records:
+                LogSystem.store_log(guild, action_type, **record)
+            log_delivery.enqueue(guild, action_type, LogSystem.build_log_embed(action_type, details))
+
+        except Exception as e:
+            print(f"Erro no sistema de logs: {e}")
+
+    @staticmethod
+    def store_log(guild, action_type, **details):
+        """Salva no armazenamento (append, sem reescrever o histórico)"""
+        data_system.append_log(guild.id, {
+            'action': action_type,
+            'guild_id': guild.id,
+            'timestamp': datetime.datetime.now().isoformat(),
+            **details
+        })
+
+    @staticmethod
+    def build_log_embed(action_type, details):
+        """Embed de um log para o canal de logs"""
+        # Cores para diferentes tipos de ações
+        colors = {
+            'ban': 0xff0000,
+            'kick': 0xffa500,
+            'mute': 0x808080,
+            'unmute': 0x00ff00,
+            'clear': 0x00ff00,
+            'ticket_create': 0x00ff00,
+            'ticket_close': 0xff0000,
+            'autorole_add': 0x9b59b6,
+            'autorole_remove': 0xe74c3c,
+            'embed_create': 0x3498db,
+            'embed_send': 0x2ecc71,
+            'embed_broadcast': 0x2ecc71,
+            'message_delete': 0xe74c3c,
+            'message_edit': 0xf39c12,
+            'message_bulk_delete': 0xc0392b,
+            'command_used': 0x9b59b6,
+            'user_join': 0x2ecc71,
+            'user_leave': 0xe74c3c,
+            'role_add': 0x3498db,
+            'role_remove': 0xe74c3c,
+            'welcome_role_add': 0x1abc9c
+        }
+
+        embed = discord.Embed(
+            title=f"Log - {action_type.replace('_', ' ').title()}",
+            color=colors.get(action_type, 0x0000ff),
+            timestamp=datetime.datetime.utcnow()
+        )
+
+        # Adicionar detalhes
+        for key, value in details.items():
+            if value and str(value).strip():
+                embed.add_field(
+                    name=key.replace('_', ' ').title(),
+                    value=str(value)[:1024],
+                    inline=len(str(value)) < 50
+                )
+        return embed
+
+    @staticmethod
+    def describe_user(guild, user_id):
+        """"nome (id)" a partir só do ID, como nos outros logs"""
+        member = guild.get_member(user_id)
+        if member is None:
+            member_chunker.request(guild)  # Perfil low: próximos logs do servidor já saem com nome
+        return f"{member} ({user_id})" if member else f"<@{user_id}> ({user_id})"
+
+    @staticmethod
+    def channel_name(guild, channel_id):
+        channel = guild.get_channel_or_thread(channel_id)
+        return channel.name if channel else str(channel_id)
+
+    @staticmethod
+    async def log_message_delete(guild, record):
+        """Log quando uma mensagem é deletada (record é uma CachedMessage)"""
+        if record.id in LogSystem._suppressed_deletes:
+            return
+
+        await LogSystem.log_action(
+            guild,
+            'message_delete',
+            author=LogSystem.describe_user(guild, record.author_id),
+            channel=LogSystem.channel_name(guild, record.channel_id),
+            content=record.content,
+            message_id=record.id,
+            attachments_count=record.attachments
+        )
+
+    @staticmethod
+    async def log_message_edit(guild, before, after_content, edits=1):
+        """Log quando uma mensagem é editada (before é uma CachedMessage; edits > 1 quando agrupadas).
+        Retorna se o log foi registrado (edições só de embed, como previews de links, não geram log)"""
+        if before.content == after_content:
+            return False
+
+        # Limitar conteúdo muito longo
+        before_content = before.content
+        if len(before_content) > 300:
+            before_content = before_content[:300] + "..."
+        if len(after_content) > 300:
+            after_content = after_content[:300] + "..."
+
+        await LogSystem.log_action(
+            guild,
+            'message_edit',
+            author=LogSystem.describe_user(guild, before.author_id),
+            channel=LogSystem.channel_name(guild, before.channel_id),
+            before_content=before_content,
+            after_content=after_content,
+            message_id=before.id,
+            edits=str(edits) if edits > 1 else None
+        )
+        return True
+
+    @staticmethod
+    async def log_bulk_delete(guild, channel_id, message_ids, records):
+        """Log quando várias mensagens são deletadas de uma vez (records: as CachedMessage conhecidas)"""
+        message_ids = [message_id for message_id in message_ids if message_id not in LogSystem._suppressed_deletes]
+        if not message_ids:
+            return
+
+        users = collections.Counter(record.author_id for record in records if record.id not in LogSystem._suppressed_deletes)
+        user_summary = "\n".join([f"<@{uid}>: {count} mensagens" for uid, count in users.items()])
+        unknown = len(message_ids) - sum(users.values())
+        if unknown:
+            user_summary += f"\n{unknown} mensagens fora do cache"
+
+        await LogSystem.log_action(
+            guild,
+            'message_bulk_delete',
+            channel=LogSystem.channel_name(guild, channel_id),
+            total_messages=len(message_ids),
+            users_affected=len(users),
+            user_summary=user_summary[:500] + "..." if len(user_summary) > 500 else user_summary
+        )
+
+    @staticmethod
+    async def log_command(ctx):
+        """Log quando um comando é usado"""
+        await LogSystem.log_action(
+            ctx.guild,
+            'command_used',
+            user=f"{ctx.author} ({ctx.author.id})",
+            command=ctx.command.name,
+            channel=ctx.channel.name,
+            content=ctx.message.content[:200] + "..." if len(ctx.message.content) > 200 else ctx.message.content
+        )
+
+    @staticmethod
+    async def log_user_join(member):
+        """Log quando um usuário entra no servidor"""
+        await LogSystem.log_action(member.guild, 'user_join', **LogSystem.join_details(member))
+
+    @staticmethod
+    def join_details(member):
+        return {
+            'user': f"{member} ({member.id})",
+            'account_created': member.created_at.strftime("%d/%m/%Y %H:%M"),
+            'member_count': member.guild.member_count
+        }
+
+    @staticmethod
+    async def log_user_leave(member):
+        """Log quando um usuário sai do servidor"""
+        await LogSystem.log_action(
+            member.guild,
+            'user_leave',
+            user=f"{member} ({member.id})",
+            member_count=member.guild.member_count
+        )
+
+    @staticmethod
+    async def log_role_change(member, role, action):
+        """Log quando um cargo é adicionado/removido"""
+        await LogSystem.log_action(
+            member.guild,
+            f'role_{action}',
+            user=f"{member} ({member.id})",
+            role=role.name,
+            role_id=role.id
+        )
+
+    @staticmethod
+    async def log_welcome_role(member, role):
+        """Log quando um cargo de boas-vindas é adicionado"""
+        await LogSystem.log_action(member.guild, 'welcome_role_add', **LogSystem.welcome_role_details(member, role))
+
+    @staticmethod
+    def welcome_role_details(member, role):
+        return {'user': f"{member} ({member.id})", 'role': role.name, 'role_id': role.id}
+
+log_system = LogSystem()
+
+# AGRUPAMENTO DE EDIÇÕES DE MENSAGENS
+class EditCoalescer:
+    """Junta rajadas de edições da mesma mensagem num único log: o primeiro "antes", o último "depois"
+    e a quantidade de edições. O log sai após `window` segundos sem nova edição, ou no máximo
+    `max_delay` segundos depois da primeira."""
+
+    def __init__(self, window, max_delay):
+        self.window = window
+        self.max_delay = max_delay
+        self._pending = {}  # message_id -> edição aguardando o fim da rajada
+        self.stats = {'edits': 0, 'logged': 0}
+
+    def submit(self, guild, before, after_content):
+        self.stats['edits'] += 1
+        if self.window <= 0:
+            return asyncio.ensure_future(self._log(guild, before, after_content))
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        entry = self._pending.get(before.id)
+        if entry is None:
+            entry = self._pending[before.id] = {'guild': guild, 'before': before, 'after': after_content, 'count': 1, 'first_at': now, 'handle': None}
+        else:
+            entry['after'] = after_content
+            entry['count'] += 1
+            entry['handle'].cancel()
+        delay = min(self.window, entry['first_at'] + self.max_delay - now)
+        entry['handle'] = loop.call_later(max(0.0, delay), self.flush, before.id)
+
+    def flush(self, message_id):
+        """Registra agora a edição pendente da mensagem (ex.: antes do log de exclusão dela)"""
+        entry = self._pending.pop(message_id, None)
+        if entry is None:
+            return
+        entry['handle'].cancel()
+        asyncio.ensure_future(self._log(entry['guild'], entry['before'], entry['after'], edits=entry['count']))
+
+    async def _log(self, guild, before, after_content, edits=1):
+        # Só conta o que virou log: rajadas que terminam no mesmo conteúdo não geram nenhum
+        if await LogSystem.log_message_edit(guild, before, after_content, edits=edits):
+            self.stats['logged'] += 1
+
+edit_coalescer = EditCoalescer(EDIT_COALESCE_WINDOW, EDIT_COALESCE_MAX_DELAY)
+
+# SISTEMA DE RETENÇÃO DE LOGS
+class LogRetentionSystem:
+    """Retenção configurável por servidor e por tipo de ação, aplicada em segundo plano"""
+
+    def __init__(self):
+        self._task = None
+
+    def policy(self):
+        """Cópia da política atual, segura para ser lida fora do event loop"""
+        return {'default': LOG_RETENTION_DAYS, 'guilds': copy.deepcopy(dict(data_system.log_retention_data))}
+
+    def get_retention(self, guild_id):
+        """Configuração de retenção do servidor"""
+        return data_system.log_retention_data.get(str(guild_id), {})
+
+    def set_retention(self, guild_id, days, action=None):
+        """Define a retenção do servidor (ou de uma ação); 0 volta ao padrão"""
+        guild_policy = data_system.log_retention_data.setdefault(str(guild_id), {})
+        if action:
+            actions = guild_policy.setdefault('actions', {})
+            if days:
+                actions[action] = days
+            else:
+                actions.pop(action, None)
+        elif days:
+            guild_policy['default'] = days
+        else:
+            guild_policy.pop('default', None)
+        data_system.save_log_retention()
+
+    def start(self):
+        """Inicia a limpeza periódica (uma única tarefa por processo)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._prune_loop())
+
+    async def _prune_loop(self):
+        while True:
+            await self.prune_now()
+            await asyncio.sleep(LOG_PRUNE_INTERVAL)
+
+    async def prune_now(self):
+        """Remove os logs vencidos na thread de persistência"""
+        try:
+            # Carrega os logs aqui no loop: a migração e o fechamento de segmentos agendam escritas
+            data_system.storage.ensure_logs()
+            loop = asyncio.get_running_loop()
+            segments, logs = await loop.run_in_executor(persistence.executor, data_system.storage.prune_logs, self.policy())
+            if segments or logs:
+                print(f"🧹 Retenção de logs: {segments} segmentos e {logs} logs removidos")
+        except Exception as e:
+            print(f"Erro na limpeza de logs: {e}")
+
+log_retention_system = LogRetentionSystem()
+
+# SISTEMA DE BUSCA DE LOGS
+class LogSearch:
+    """Interpreta os filtros do s!logs e monta as páginas de resultado"""
+
+    PAGE_SIZE = 10
+    DURATION_PATTERN = re.compile(r'^(\d+)([smhdw])$')
+    DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+    CHANNEL_MENTION_PATTERN = re.compile(r'^<#(\d+)>$')
+
+    @staticmethod
+    def parse_time(value):
+        """Aceita durações relativas (30m, 2h, 7d) ou datas ISO (2025-10-31, 2025-10-31T20:00)"""
+        match = LogSearch.DURATION_PATTERN.match(value.lower())
+        if match:
+            amount, unit = match.groups()
+            return datetime.datetime.now() - datetime.timedelta(**{LogSearch.DURATION_UNITS[unit]: int(amount)})
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Data inválida: `{value}` (use 2h, 3d ou AAAA-MM-DD)")
+
+    @staticmethod
+    def parse_filters(guild, args):
+        """Converte argumentos `nome:valor` nos filtros de DataSystem.query_logs"""
+        filters = {}
+        for arg in args:
+            name, separator, value = arg.partition(':')
+            if not separator or not value:
+                raise ValueError(f"Filtro inválido: `{arg}`")
+            name = name.lower()
+            if name in ('usuario', 'user'):
+                digits = re.sub(r'\D', '', value)
+                if not digits:
+                    raise ValueError(f"Usuário inválido: `{value}`")
+                filters['user_id'] = int(digits)
+            elif name in ('acao', 'action'):
+                filters['action'] = value.lower()
+            elif name in ('canal', 'channel'):
+                mention = LogSearch.CHANNEL_MENTION_PATTERN.match(value)
+                channel = guild.get_channel(int(mention.group(1))) if mention else None
+                filters['channel'] = channel.name if channel else value.lstrip('#')
+            elif name in ('desde', 'since'):
+                filters['since'] = LogSearch.parse_time(value)
+            elif name in ('ate', 'until'):
+                filters['until'] = LogSearch.parse_time(value)
+            else:
+                raise ValueError(f"Filtro desconhecido: `{name}`")
+        return filters
+
+    @staticmethod
+    def format_entry(entry):
+        """Uma linha de resultado"""
+        who = entry.get('user') or entry.get('author') or entry.get('moderator') or '-'
+        where = f" em #{entry['channel']}" if entry.get('channel') else ""
+        when = entry.get('timestamp', '')[:16].replace('T', ' ')
+        return f"`{when}` **{entry.get('action', '?')}** — {who}{where}"[:390]
+
+    @staticmethod
+    async def build_page(guild_id, filters, page, before=None):
+        """Embed de uma página de resultados e o cursor da próxima (None na última página)"""
+        started = time.perf_counter()
+        results = await data_system.search_logs(guild_id, limit=LogSearch.PAGE_SIZE + 1, before=before, **filters)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        next_cursor = None
+        if len(results) > LogSearch.PAGE_SIZE:
+            log_id, entry = results[LogSearch.PAGE_SIZE - 1]
+            next_cursor = (entry.get('timestamp', ''), log_id)
+
+        lines = [LogSearch.format_entry(entry) for _, entry in results[:LogSearch.PAGE_SIZE]]
+        embed = discord.Embed(
+            title="🔎 Busca de Logs",
+            description="\n".join(lines) if lines else "Nenhum log encontrado com esses filtros.",
+            color=0x3498db
+        )
+        if filters:
+            embed.add_field(
+                name="Filtros",
+                value=", ".join(f"{name}: {value:%d/%m/%Y %H:%M}" if isinstance(value, datetime.datetime) else f"{name}: {value}" for name, value in filters.items()),
+                inline=False
+            )
+        embed.set_footer(text=f"Página {page + 1} • consulta em {elapsed_ms:.1f} ms")
+        return embed, next_cursor
+
+
+class LogSearchView(discord.ui.View):
+    """Botões de paginação do s!logs (só quem pesquisou pode usar)"""
+
+    def __init__(self, author_id, guild_id, filters, next_cursor):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.guild_id = guild_id
+        self.filters = filters
+        self.cursors = [None]  # cursor de início de cada página visitada (paginação por chave, sem offset)
+        self.next_cursor = next_cursor
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
+
+    async def interaction_check(self, interaction):
+        return interaction.user.id == self.author_id
+
+    @discord.ui.button(label="◀️ Anterior", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self._show_page(interaction)
+
+    @discord.ui.button(label="Próxima ▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        if self.next_cursor is not None:
+            self.cursors.append(self.next_cursor)
+        await self._show_page(interaction)
+
+    async def _show_page(self, interaction):
+        await interaction.response.defer()  # A consulta pode passar dos 3 s da interação
+        embed, self.next_cursor = await LogSearch.build_page(self.guild_id, self.filters, len(self.cursors) - 1, self.cursors[-1])
+        self._update_buttons()
+        await interaction.edit_original_response(embed=embed, view=self)
+
+# ESTATÍSTICAS DE COMANDOS
+class CommandAnalytics:
+    """Uso de comandos em contadores por minuto na memória, consolidados por hora e por dia no
+    documento command_stats a cada COMMAND_STATS_FLUSH_INTERVAL: uma escrita por lote, não por comando"""
+
+    TOP_KEYS = 100  # usuários e canais mantidos em cada agregado de hora/dia
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._minutes = {}  # (guild_id, minuto) -> contadores do minuto
+        self._task = None
+
+    @staticmethod
+    def new_bucket():
+        return {'count': 0, 'errors': 0, 'latency_ms': 0.0, 'max_latency_ms': 0.0, 'commands': {}, 'users': {}, 'channels': {}}
+
+    @staticmethod
+    def merge(target, source):
+        """Soma os contadores de source em target"""
+        target['count'] += source['count']
+        target['errors'] += source['errors']
+        target['latency_ms'] += source['latency_ms']
+        target['max_latency_ms'] = max(target['max_latency_ms'], source['max_latency_ms'])
+        for name, (count, errors, latency_ms) in source['commands'].items():
+            current = target['commands'].setdefault(name, [0, 0, 0.0])
+            current[0] += count
+            current[1] += errors
+            current[2] += latency_ms
+        for key in ('users', 'channels'):
+            for item, count in source[key].items():
+                target[key][item] = target[key].get(item, 0) + count
+
+    @classmethod
+    def trim(cls, bucket):
+        for key in ('users', 'channels'):
+            if len(bucket[key]) > cls.TOP_KEYS:
+                bucket[key] = dict(collections.Counter(bucket[key]).most_common(cls.TOP_KEYS))
+
+    def record(self, ctx, elapsed, failed):
+        """Conta uma execução de comando (chamado pelo after_invoke)"""
+        if ctx.guild is None:
+            return
+        key = (ctx.guild.id, int(time.time() // 60))
+        bucket = self._minutes.get(key)
+        if bucket is None:
+            bucket = self._minutes[key] = self.new_bucket()
+        latency_ms = elapsed * 1000
+        bucket['count'] += 1
+        bucket['errors'] += int(failed)
+        bucket['latency_ms'] += latency_ms
+        bucket['max_latency_ms'] = max(bucket['max_latency_ms'], latency_ms)
+        command = bucket['commands'].setdefault(ctx.command.qualified_name, [0, 0, 0.0])
+        command[0] += 1
+        command[1] += int(failed)
+        command[2] += latency_ms
+        user_key, channel_key = str(ctx.author.id), str(ctx.channel.id)
+        bucket['users'][user_key] = bucket['users'].get(user_key, 0) + 1
+        bucket['channels'][channel_key] = bucket['channels'].get(channel_key, 0) + 1
+
+    def flush(self, include_current=False):
+        """Consolida os minutos fechados (ou todos, no desligamento) nos agregados de hora e dia"""
+        current = int(time.time() // 60)
+        keys = [key for key in self._minutes if include_current or key[1] < current]
+        if not keys:
+            return
+        touched = set()
+        for guild_id, minute in sorted(keys, key=lambda key: key[1]):
+            bucket = self._minutes.pop((guild_id, minute))
+            at = datetime.datetime.utcfromtimestamp(minute * 60)
+            guild_key = str(guild_id)
+            stats = data_system.command_stats_data.get(guild_key) or {'hourly': {}, 'daily': {}}
+            for period, period_key in (('hourly', at.strftime('%Y-%m-%dT%H')), ('daily', at.strftime('%Y-%m-%d'))):
+                aggregate = stats[period].setdefault(period_key, self.new_bucket())
+                self.merge(aggregate, bucket)
+                self.trim(aggregate)
+            data_system.command_stats_data[guild_key] = stats
+            touched.add(guild_key)
+
+        # Descarta agregados antigos só dos servidores alterados
+        now = datetime.datetime.utcnow()
+        oldest_hour = (now - datetime.timedelta(hours=COMMAND_STATS_HOURLY_RETENTION)).strftime('%Y-%m-%dT%H')
+        oldest_day = (now - datetime.timedelta(days=COMMAND_STATS_DAILY_RETENTION)).strftime('%Y-%m-%d')
+        for guild_key in touched:
+            stats = data_system.command_stats_data[guild_key]
+            stats['hourly'] = {key: value for key, value in stats['hourly'].items() if key >= oldest_hour}
+            stats['daily'] = {key: value for key, value in stats['daily'].items() if key >= oldest_day}
+        data_system.save_command_stats()
+
+    def summary(self, guild_id, since):
+        """Soma dos agregados (e dos minutos ainda não consolidados) desde `since` (UTC)"""
+        total = self.new_bucket()
+        stats = data_system.command_stats_data.get(str(guild_id)) or {'hourly': {}, 'daily': {}}
+        # Horas para janelas de até dois dias, dias inteiros para o resto
+        now = datetime.datetime.utcnow()
+        if now - since <= datetime.timedelta(hours=COMMAND_STATS_HOURLY_RETENTION):
+            period, key_format, step = 'hourly', '%Y-%m-%dT%H', datetime.timedelta(hours=1)
+        else:
+            period, key_format, step = 'daily', '%Y-%m-%d', datetime.timedelta(days=1)
+        since_key = since.strftime(key_format)
+        for key, bucket in stats[period].items():
+            if key >= since_key:
+                self.merge(total, bucket)
+
+        # Linha do tempo com todos os períodos da janela (zeros inclusive); os minutos pendentes entram no atual
+        timeline = {}
+        at = since
+        while at <= now:
+            key = at.strftime(key_format)
+            timeline[key] = stats[period].get(key, {}).get('count', 0)
+            at += step
+        timeline.setdefault(now.strftime(key_format), 0)
+        for (bucket_guild, _), bucket in list(self._minutes.items()):
+            if bucket_guild == guild_id:
+                self.merge(total, bucket)
+                timeline[now.strftime(key_format)] += bucket['count']
+        return total, timeline
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao consolidar estatísticas de comandos: {e}")
+
+command_analytics = CommandAnalytics(COMMAND_STATS_FLUSH_INTERVAL)
+
+# LIMPEZA DE MENSAGENS EM STREAMING
+class PurgeEngine:
+    """s!clear sem limite de 100: percorre o histórico página a página, apaga em lotes de 100 as
+    mensagens com menos de 14 dias e uma a uma as mais antigas (o Discord não aceita bulk delete delas)"""
+
+    BULK_SIZE = 100
+    BULK_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=5)  # margem para diferença de relógio
+    LINK_PATTERN = re.compile(r'https?://|discord\.gg/', re.IGNORECASE)
+
+    def __init__(self):
+        self.jobs = {}  # channel_id -> estado da limpeza em andamento
+
+    def is_running(self, channel_id):
+        return channel_id in self.jobs
+
+    def cancel(self, channel_id):
+        job = self.jobs.get(channel_id)
+        if job is None:
+            return False
+        job['cancelled'] = True
+        return True
+
+    @staticmethod
+    def parse_filters(args):
+        """Converte `autor:@user`, `bots`, `regex:...`, `links`, `anexos`, `desde:2h`, `ate:30m` em filtros"""
+        filters = {}
+        for arg in args:
+            name, separator, value = arg.partition(':')
+            name = name.lower()
+            if not separator and name in ('bots', 'links', 'anexos', 'attachments'):
+                filters['attachments' if name == 'anexos' else name] = True
+            elif not value:
+                raise ValueError(f"Filtro inválido: `{arg}`")
+            elif name in ('autor', 'author', 'usuario', 'user'):
+                digits = re.sub(r'\D', '', value)
+                if not digits:
+                    raise ValueError(f"Usuário inválido: `{value}`")
+                filters.setdefault('authors', set()).add(int(digits))
+            elif name == 'regex':
+                try:
+                    filters['regex'] = re.compile(value, re.IGNORECASE)
+                except re.error as e:
+                    raise ValueError(f"Regex inválida: {e}")
+            elif name in ('desde', 'since'):
+                filters['since'] = LogSearch.parse_time(value).astimezone(datetime.timezone.utc)
+            elif name in ('ate', 'until'):
+                filters['until'] = LogSearch.parse_time(value).astimezone(datetime.timezone.utc)
+            else:
+                raise ValueError(f"Filtro desconhecido: `{name}`")
+        return filters
+
+    @staticmethod
+    def describe_filters(filters):
+        parts = []
+        if filters.get('authors'):
+            parts.append("autor: " + ", ".join(f"<@{author_id}>" for author_id in filters['authors']))
+        for key, label in (('bots', 'só bots'), ('links', 'com links'), ('attachments', 'com anexos')):
+            if filters.get(key):
+                parts.append(label)
+        if filters.get('regex'):
+            parts.append(f"regex: `{filters['regex'].pattern}`")
+        for key, label in (('since', 'desde'), ('until', 'até')):
+            if filters.get(key):
+                parts.append(f"{label}: {filters[key].astimezone():%d/%m/%Y %H:%M}")
+        return ", ".join(parts)
+
+    @classmethod
+    def matches(cls, message, filters):
+        if filters.get('authors') and message.author.id not in filters['authors']:
+            return False
+        if filters.get('bots') and not message.author.bot:
+            return False
+        if filters.get('links') and not cls.LINK_PATTERN.search(message.content):
+            return False
+        if filters.get('attachments') and not message.attachments:
+            return False
+        if filters.get('regex') and not filters['regex'].search(message.content):
+            return False
+        return True
+
+    async def run(self, channel, amount, filters, before, on_progress=None):
+        """Apaga até `amount` mensagens que passam nos filtros, mais novas primeiro; devolve o estado final"""
+        job = {'scanned': 0, 'deleted': 0, 'bulk': 0, 'single': 0, 'failed': 0, 'cancelled': False, 'amount': amount}
+        self.jobs[channel.id] = job
+        last_progress = time.monotonic()
+        bulk_cutoff = discord.utils.utcnow() - self.BULK_MAX_AGE
+        if filters.get('until'):
+            before = min(discord.utils.snowflake_time(before.id), filters['until'])
+        batch = []
+        try:
+            # O histórico vem em páginas de 100 sob demanda, sem carregar o canal inteiro
+            async for message in channel.history(limit=PURGE_SCAN_LIMIT, before=before, after=filters.get('since'), oldest_first=False):
+                if job['cancelled']:
+                    break
+                job['scanned'] += 1
+                if not self.matches(message, filters):
+                    continue
+
+                if message.created_at > bulk_cutoff:
+                    batch.append(message)
+                    if len(batch) == self.BULK_SIZE:
+                        await self._delete_bulk(channel, batch, job)
+                        batch = []
+                else:
+                    if batch:
+                        await self._delete_bulk(channel, batch, job)
+                        batch = []
+                    await self._delete_single(message, job)
+
+                if job['deleted'] + len(batch) >= amount:
+                    break
+                if on_progress and time.monotonic() - last_progress >= PURGE_PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    await on_progress(job)
+
+            if batch and not job['cancelled']:
+                await self._delete_bulk(channel, batch, job)
+        finally:
+            self.jobs.pop(channel.id, None)
+        return job
+
+    async def _delete_bulk(self, channel, messages, job):
+        LogSystem.suppress_delete_logs(message.id for message in messages)
+        for attempt in range(PURGE_RETRIES):
+            try:
+                await channel.delete_messages(messages)
+                job['deleted'] += len(messages)
+                job['bulk'] += len(messages)
+                return
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None or attempt == PURGE_RETRIES - 1:
+                    print(f"Erro ao apagar lote de mensagens em #{channel.name}: {e}")
+                    job['failed'] += len(messages)
+                    return
+                await asyncio.sleep(retry_after)
+
+    async def _delete_single(self, message, job):
+        """Mensagens com mais de 14 dias: uma requisição cada, no bucket de DELETE do canal"""
+        LogSystem.suppress_delete_logs([message.id])
+        for attempt in range(PURGE_RETRIES):
+            try:
+                await message.delete()
+                job['deleted'] += 1
+                job['single'] += 1
+                return
+            except discord.NotFound:
+                return
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None or attempt == PURGE_RETRIES - 1:
+                    job['failed'] += 1
+                    return
+                await asyncio.sleep(retry_after)
+
+purge_engine = PurgeEngine()
+
+class PurgeView(discord.ui.View):
+    """Botão de cancelar do s!clear (quem pode gerenciar mensagens no canal)"""
+
+    def __init__(self, channel_id):
+        super().__init__(timeout=None)
+        self.channel_id = channel_id
+
+    async def interaction_check(self, interaction):
+        return interaction.channel.permissions_for(interaction.user).manage_messages
+
+    @discord.ui.button(label="⏹️ Cancelar", style=discord.ButtonStyle.danger)
+    async def cancel_purge(self, interaction, button):
+        purge_engine.cancel(self.channel_id)
+        button.disabled = True
+        await interaction.response.edit_message(view=self)
+
+# SISTEMA DE CARGO AUTOMÁTICO PARA NOVOS MEMBROS
+class WelcomeRoleSystem:
+    @staticmethod
+    async def set_welcome_role(guild_id, role_id):
+        """Define o cargo automático para novos membros"""
+        guild_key = str(guild_id)
+        data_system.welcome_roles_data[guild_key] = role_id
+        data_system.save_welcome_roles()
+
+    @staticmethod
+    async def get_welcome_role(guild_id):
+        """Obtém o cargo automático configurado"""
+        guild_key = str(guild_id)
+        return data_system.welcome_roles_data.get(guild_key)
+
+    @staticmethod
+    async def remove_welcome_role(guild_id):
+        """Remove a configuração de cargo automático"""
+        guild_key = str(guild_id)
+        if guild_key in data_system.welcome_roles_data:
+            del data_system.welcome_roles_data[guild_key]
+            data_system.save_welcome_roles()
+            return True
+        return False
+
+    @staticmethod
+    async def add_welcome_role(member):
+        """Adiciona o cargo automático ao novo membro"""
+        try:
+            role_id = await WelcomeRoleSystem.get_welcome_role(member.guild.id)
+            if not role_id:
+                return False
+
+            role = member.guild.get_role(int(role_id))
+            if not role:
+                return False
+
+            await member.add_roles(role)
+            await log_system.log_welcome_role(member, role)
+            return True
+        except Exception as e:
+            print(f"Erro ao adicionar cargo de boas-vindas: {e}")
+            return False
+
+welcome_role_system = WelcomeRoleSystem()
+
+# PIPELINE DE ENTRADAS (RESISTENTE A RAIDS)
+class JoinPipeline:
+    """Processa entradas fora do handler: cargos por um pool limitado de workers e logs resumidos"""
+
+    def __init__(self, workers, queue_max, summary_window):
+        self.worker_count = workers
+        self.queue_max = queue_max
+        self.summary_window = summary_window
+        self.queue = None
+        self._workers = []
+        self._pending = {}  # (guild_id, tipo) -> [(membro, cargo)] aguardando o resumo
+        self._recent_joins = collections.deque(maxlen=100000)
+        self.stats = {'joins': 0, 'roles_assigned': 0, 'role_failures': 0, 'rate_limited': 0, 'dropped': 0}
+
+    def queue_depth(self):
+        """Atribuições de cargo aguardando um worker"""
+        return self.queue.qsize() if self.queue else 0
+
+    def throughput(self, seconds=60):
+        """Entradas por segundo na janela informada"""
+        cutoff = time.monotonic() - seconds
+        return sum(1 for joined_at in self._recent_joins if joined_at >= cutoff) / seconds
+
+    async def submit(self, member):
+        """Registra a entrada e agenda o cargo de boas-vindas; retorna imediatamente"""
+        self.stats['joins'] += 1
+        self._recent_joins.append(time.monotonic())
+        self._coalesce(member.guild, 'user_join', member)
+
+        role_id = await welcome_role_system.get_welcome_role(member.guild.id)
+        if not role_id:
+            return
+        self._start_workers()
+        try:
+            self.queue.put_nowait(member)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            print(f"Fila de entradas cheia: cargo de boas-vindas não aplicado a {member} ({member.id})")
+
+    def _start_workers(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_max)
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.ensure_future(self._worker()))
+
+    async def _worker(self):
+        while True:
+            member = await self.queue.get()
+            try:
+                await self._assign_role(member)
+            except Exception as e:
+                print(f"Erro ao adicionar cargo de boas-vindas: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _assign_role(self, member):
+        """Aplica o cargo de boas-vindas, aguardando e tentando de novo em caso de 429"""
+        role_id = await welcome_role_system.get_welcome_role(member.guild.id)
+        role = member.guild.get_role(int(role_id)) if role_id else None
+        if not role:
+            return
+
+        for attempt in range(JOIN_ROLE_RETRIES):
+            try:
+                await member.add_roles(role, reason="Cargo de boas-vindas")
+                self.stats['roles_assigned'] += 1
+                self._coalesce(member.guild, 'welcome_role_add', member, role)
+                return
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None or attempt == JOIN_ROLE_RETRIES - 1:
+                    self.stats['role_failures'] += 1
+                    print(f"Erro ao adicionar cargo de boas-vindas a {member}: {e}")
+                    return
+                self.stats['rate_limited'] += 1
+                await asyncio.sleep(retry_after)
+
+    def _coalesce(self, guild, kind, member, role=None):
+        """Agrupa eventos do mesmo tipo por servidor durante a janela de resumo"""
+        key = (guild.id, kind)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = []
+            asyncio.get_running_loop().call_later(
+                self.summary_window,
+                lambda: asyncio.ensure_future(self._flush_summary(guild, kind))
+            )
+        pending.append((member, role))
+
+    async def _flush_summary(self, guild, kind):
+        """Registra um log individual ou, no canal, um resumo com todas as entradas da janela.
+
+        Mesmo resumidas, as entradas ficam gravadas uma a uma: a busca por usuário acha cada membro de um raid"""
+        pending = self._pending.pop((guild.id, kind), [])
+        if not pending:
+            return
+        if len(pending) == 1:
+            member, role = pending[0]
+            if kind == 'user_join':
+                await log_system.log_user_join(member)
+            else:
+                await log_system.log_welcome_role(member, role)
+            return
+
+        members = "\n".join(f"{member} ({member.id})" for member, _ in pending)
+        if kind == 'user_join':
+            summary = f"{len(pending)} membros entraram nos últimos {self.summary_window:g}s"
+            extra = {'member_count': guild.member_count}
+            records = [log_system.join_details(member) for member, _ in pending]
+        else:
+            role = pending[0][1]
+            summary = f"Cargo aplicado a {len(pending)} membros nos últimos {self.summary_window:g}s"
+            extra = {'role': role.name, 'role_id': role.id}
+            records = [log_system.welcome_role_details(member, role) for member, role in pending]
+        await log_system.log_summary(
+            guild,
+            kind,
+            records,
+            summary=summary,
+            members=members[:1000] + "..." if len(members) > 1000 else members,
+            **extra
+        )
+
+join_pipeline = JoinPipeline(JOIN_WORKERS, JOIN_QUEUE_MAX, JOIN_SUMMARY_WINDOW)
+
+# BACKFILL DO CARGO DE BOAS-VINDAS
+class WelcomeRoleBackfill:
+    """Aplica o cargo de boas-vindas aos membros existentes, com checkpoint para retomar após reinícios"""
+
+    def __init__(self, concurrency, chunk_size):
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self._tasks = {}
+        self._paused_until = 0  # todos os workers esperam após um 429
+
+    def job(self, guild_id):
+        """Estado salvo do backfill do servidor"""
+        return data_system.backfill_jobs_data.get(str(guild_id))
+
+    def is_running(self, guild_id):
+        task = self._tasks.get(guild_id)
+        return task is not None and not task.done()
+
+    def start(self, guild, role, channel):
+        """Começa um backfill (ou continua do checkpoint um interrompido, cancelado ou falho com o mesmo cargo)"""
+        previous = self.job(guild.id)
+        # 'running' sem tarefa viva: interrompido por um reinício antes do resume_all
+        if previous and previous['role_id'] == role.id and previous['status'] in ('running', 'cancelled', 'failed'):
+            previous.update(status='running', channel_id=channel.id)
+            previous.pop('error', None)
+            data_system.save_backfill_jobs()
+            self._launch(guild)
+            return
+
+        data_system.backfill_jobs_data[str(guild.id)] = {
+            'role_id': role.id,
+            'channel_id': channel.id,
+            'after': 0,
+            'processed': 0,
+            'applied': 0,
+            'skipped': 0,
+            'failed': 0,
+            'status': 'running',
+            'started_at': datetime.datetime.now().isoformat()
+        }
+        data_system.save_backfill_jobs()
+        self._launch(guild)
+
+    def resume_all(self):
+        """Retoma os backfills interrompidos por um reinício"""
+        for guild_key, job in list(data_system.backfill_jobs_data.items()):
+            guild = bot.get_guild(int(guild_key))
+            if job.get('status') == 'running' and guild and not self.is_running(guild.id):
+                print(f"🔁 Retomando backfill de cargo em {guild.name} após {job['processed']} membros")
+                self._launch(guild)
+
+    def cancel(self, guild_id):
+        """Interrompe o backfill do servidor mantendo o checkpoint"""
+        job = self.job(guild_id)
+        if not job or job.get('status') != 'running':
+            return False
+        job['status'] = 'cancelled'
+        data_system.save_backfill_jobs()
+        task = self._tasks.get(guild_id)
+        if task:
+            task.cancel()
+        return True
+
+    def _launch(self, guild):
+        self._tasks[guild.id] = asyncio.ensure_future(self._run(guild))
+
+    async def _run(self, guild):
+        job = self.job(guild.id)
+        role = guild.get_role(job['role_id'])
+        channel = guild.get_channel(job.get('channel_id'))
+        if not role:
+            job['status'] = 'failed'
+            job['error'] = "Cargo não encontrado"
+            data_system.save_backfill_jobs()
+            return
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        progress_message = None
+        session = {'started': time.monotonic(), 'processed': 0, 'reported': 0.0}
+        try:
+            chunk = []
+            after = discord.Object(id=job['after']) if job['after'] else None
+            # fetch_members traz os membros em páginas de 1000, em ordem crescente de ID
+            async for member in guild.fetch_members(limit=None, after=after):
+                chunk.append(member)
+                if len(chunk) >= self.chunk_size:
+                    await self._process_chunk(chunk, role, job, semaphore, session)
+                    chunk = []
+                    progress_message = await self._report(guild, channel, job, session, progress_message)
+            if chunk:
+                await self._process_chunk(chunk, role, job, semaphore, session)
+            job['status'] = 'done'
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            print(f"Erro no backfill de cargo: {e}")
+        finally:
+            data_system.save_backfill_jobs()
+
+        await self._report(guild, channel, job, session, progress_message, final=True)
+        await log_system.log_action(
+            guild,
+            'welcome_role_backfill',
+            role=role.name,
+            role_id=role.id,
+            status=job['status'],
+            applied=job['applied'],
+            skipped=job['skipped'],
+            failed=job['failed']
+        )
+
+    async def _process_chunk(self, members, role, job, semaphore, session):
+        """Aplica o cargo a um lote e grava o checkpoint no fim"""
+        missing = [member for member in members if not member.get_role(role.id)]
+        results = await asyncio.gather(*(self._apply(member, role, semaphore) for member in missing))
+        job['applied'] += sum(1 for ok in results if ok)
+        job['failed'] += sum(1 for ok in results if not ok)
+        job['skipped'] += len(members) - len(missing)
+        job['processed'] += len(members)
+        job['after'] = members[-1].id
+        session['processed'] += len(members)
+        data_system.save_backfill_jobs()
+
+    async def _apply(self, member, role, semaphore):
+        async with semaphore:
+            for attempt in range(JOIN_ROLE_RETRIES):
+                if self._paused_until > time.monotonic():
+                    await asyncio.sleep(self._paused_until - time.monotonic())
+                try:
+                    await member.add_roles(role, reason="Backfill do cargo de boas-vindas")
+                    return True
+                except Exception as e:
+                    retry_after = retry_after_seconds(e)
+                    if retry_after is None or attempt == JOIN_ROLE_RETRIES - 1:
+                        print(f"Erro ao aplicar cargo a {member}: {e}")
+                        return False
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        return False
+
+    @staticmethod
+    def progress_embed(guild, job, session=None):
+        """Embed com progresso e ETA do backfill"""
+        total = max(guild.member_count or 0, job['processed'])
+        percent = job['processed'] / total * 100 if total else 100
+        embed = discord.Embed(
+            title="🔁 Backfill do Cargo de Boas-Vindas",
+            description=f"**{job['processed']}/{total}** membros verificados ({percent:.0f}%) — status: `{job['status']}`",
+            color=0x1abc9c if job['status'] == 'done' else 0x3498db
+        )
+        embed.add_field(name="Aplicados", value=str(job['applied']), inline=True)
+        embed.add_field(name="Já tinham", value=str(job['skipped']), inline=True)
+        embed.add_field(name="Falhas", value=str(job['failed']), inline=True)
+        if session and job['status'] == 'running':
+            elapsed = time.monotonic() - session['started']
+            rate = session['processed'] / elapsed if elapsed else 0
+            if rate:
+                eta = datetime.timedelta(seconds=int(max(total - job['processed'], 0) / rate))
+                embed.add_field(name="Velocidade", value=f"{rate:.1f} membros/s", inline=True)
+                embed.add_field(name="ETA", value=str(eta), inline=True)
+        return embed
+
+    async def _report(self, guild, channel, job, session, message, final=False):
+        """Atualiza a mensagem de progresso no máximo a cada BACKFILL_PROGRESS_INTERVAL"""
+        now = time.monotonic()
+        if not channel or (not final and now - session['reported'] < BACKFILL_PROGRESS_INTERVAL):
+            return message
+        session['reported'] = now
+        embed = self.progress_embed(guild, job, session)
+        try:
+            if message:
+                await message.edit(embed=embed)
+                return message
+            return await channel.send(embed=embed)
+        except Exception as e:
+            print(f"Erro ao atualizar progresso do backfill: {e}")
+            return message
+
+welcome_role_backfill = WelcomeRoleBackfill(BACKFILL_CONCURRENCY, BACKFILL_CHUNK_SIZE)
+
+# SISTEMA DE TICKETS
+class TicketSystem:
+    """Tickets em canais privados na categoria de tickets.
+
+    Cada servidor mantém uma reserva de canais ocultos já criados: abrir um ticket é só renomear o
+    canal e liberar o acesso numa única edição, e a reserva é reposta em segundo plano. Os tickets
+    abertos ficam indexados por usuário, e no fechamento o histórico vai para um .txt.gz página a página."""
+
+    POOL_CHANNEL_NAME = "ticket-livre"
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self._by_user = {}          # guild_id -> {user_id: channel_id} dos tickets abertos
+        self._opening = set()       # (guild_id, user_id) com abertura em andamento
+        self._refills = {}          # guild_id -> tarefa repondo a reserva
+        self._category_locks = {}   # guild_id -> asyncio.Lock (uma criação de categoria por vez)
+        self.stats = {'opened': 0, 'pool_hits': 0, 'pool_misses': 0, 'closed': 0, 'channels_created': 0}
+
+    def guild_data(self, guild_id):
+        """Estado dos tickets do servidor no tickets.json (criado no primeiro uso)"""
+        guild_key = str(guild_id)
+        data = data_system.tickets_data.get(guild_key)
+        if data is None:
+            data = data_system.tickets_data[guild_key] = {'counter': 0, 'pool': [], 'open': {}}
+        return data
+
+    def _index(self, guild_id):
+        """Índice usuário -> canal, montado uma vez por servidor a partir dos tickets salvos"""
+        index = self._by_user.get(guild_id)
+        if index is None:
+            index = self._by_user[guild_id] = {
+                ticket['user_id']: int(channel_key)
+                for channel_key, ticket in self.guild_data(guild_id)['open'].items()
+            }
+        return index
+
+    def user_ticket(self, guild, user_id):
+        """Canal do ticket aberto pelo usuário, ou None"""
+        channel_id = self._index(guild.id).get(user_id)
+        return guild.get_channel(channel_id) if channel_id else None
+
+    def ticket(self, channel):
+        """Dados do ticket aberto no canal, ou None se o canal não for um ticket"""
+        data = data_system.tickets_data.get(str(channel.guild.id))
+        return data['open'].get(str(channel.id)) if data else None
+
+    def pool_size_of(self, guild_id):
+        data = data_system.tickets_data.get(str(guild_id))
+        return len(data['pool']) if data else 0
+
+    @staticmethod
+    def support_role(guild):
+        return discord.utils.get(guild.roles, name=SUPPORT_ROLE_NAME)
+
+    @staticmethod
+    def hidden_overwrites(guild):
+        """Permissões de um canal da reserva: só o bot vê"""
+        return {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, manage_channels=True, read_message_history=True)
+        }
+
+    @staticmethod
+    def ticket_overwrites(guild, member):
+        """Permissões de um ticket aberto: o autor, a equipe de suporte e o bot"""
+        overwrites = TicketSystem.hidden_overwrites(guild)
+        overwrites[member] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, attach_files=True)
+        support_role = TicketSystem.support_role(guild)
+        if support_role:
+            overwrites[support_role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+        return overwrites
+
+    def can_close(self, channel, member):
+        """Autor do ticket, equipe de suporte ou quem gerencia canais"""
+        ticket = self.ticket(channel)
+        if ticket is None:
+            return False
+        support_role = self.support_role(channel.guild)
+        return (ticket['user_id'] == member.id
+                or (support_role is not None and support_role in member.roles)
+                or channel.permissions_for(member).manage_channels)
+
+    async def get_category(self, guild):
+        """Categoria de tickets (criada oculta na primeira vez)"""
+        lock = self._category_locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            category = discord.utils.get(guild.categories, name=TICKET_CATEGORY_NAME)
+            if category is None:
+                category = await guild.create_category(TICKET_CATEGORY_NAME, overwrites=self.hidden_overwrites(guild), reason="Categoria de tickets")
+            return category
+
+    def refill(self, guild):
+        """Repõe a reserva do servidor em segundo plano (uma tarefa por servidor)"""
+        task = self._refills.get(guild.id)
+        if task is None or task.done():
+            self._refills[guild.id] = asyncio.ensure_future(self._refill(guild))
+
+    def warm_all(self):
+        """Repõe as reservas dos servidores que já usam tickets (após um reinício)"""
+        for guild in bot.guilds:
+            if str(guild.id) in data_system.tickets_data:
+                self.refill(guild)
+
+    async def _refill(self, guild):
+        data = self.guild_data(guild.id)
+        # Canais da reserva apagados à mão saem da lista
+        data['pool'] = [channel_id for channel_id in data['pool'] if guild.get_channel(channel_id)]
+        while len(data['pool']) < self.pool_size:
+            try:
+                category = await self.get_category(guild)
+                channel = await guild.create_text_channel(
+                    self.POOL_CHANNEL_NAME,
+                    category=category,
+                    overwrites=self.hidden_overwrites(guild),
+                    reason="Reserva de canais de ticket"
+                )
+            except Exception as e:
+                print(f"Erro ao repor a reserva de tickets em {guild.name}: {e}")
+                break
+            self.stats['channels_created'] += 1
+            data['pool'].append(channel.id)
+        data_system.save_tickets()
+
+    async def open(self, guild, member, reason=None):
+        """Abre um ticket para o membro; retorna (canal, criado) ou (None, False) se já estiver abrindo um"""
+        existing = self.user_ticket(guild, member.id)
+        if existing is not None:
+            return existing, False
+        key = (guild.id, member.id)
+        if key in self._opening:
+            return None, False
+
+        # Reserva o canal e o número antes do primeiro await: aberturas simultâneas não disputam o mesmo canal
+        data = self.guild_data(guild.id)
+        channel = None
+        while data['pool'] and channel is None:
+            channel = guild.get_channel(data['pool'].pop(0))
+        data['counter'] += 1
+        number = data['counter']
+        name = f"ticket-{number:04d}"
+        topic = f"Ticket de {member} ({member.id})" + (f" • {reason}" if reason else "")
+
+        self._opening.add(key)
+        try:
+            if channel is not None:
+                self.stats['pool_hits'] += 1
+                await channel.edit(name=name, topic=topic, overwrites=self.ticket_overwrites(guild, member), reason="Ticket aberto")
+            else:
+                self.stats['pool_misses'] += 1
+                category = await self.get_category(guild)
+                channel = await guild.create_text_channel(name, category=category, topic=topic, overwrites=self.ticket_overwrites(guild, member), reason="Ticket aberto")
+        except Exception:
+            if channel is not None and guild.get_channel(channel.id):
+                data['pool'].insert(0, channel.id)
+            raise
+        finally:
+            self._opening.discard(key)
+            self.refill(guild)
+
+        data['open'][str(channel.id)] = {
+            'user_id': member.id,
+            'number': number,
+            'reason': reason or '',
+            'opened_at': datetime.datetime.now().isoformat()
+        }
+        self._index(guild.id)[member.id] = channel.id
+        data_system.save_tickets()
+        self.stats['opened'] += 1
+
+        await log_system.log_action(
+            guild,
+            'ticket_create',
+            user=f"{member} ({member.id})",
+            channel=channel.name,
+            reason=reason
+        )
+        return channel, True
+
+    def forget_channel(self, channel):
+        """Tira das listas um canal de ticket ou da reserva apagado fora do bot"""
+        data = data_system.tickets_data.get(str(channel.guild.id))
+        if not data:
+            return
+        if channel.id in data['pool']:
+            data['pool'].remove(channel.id)
+            data_system.save_tickets()
+        ticket = data['open'].pop(str(channel.id), None)
+        if ticket is not None:
+            self._index(channel.guild.id).pop(ticket['user_id'], None)
+            data_system.save_tickets()
+
+    async def close(self, channel, closed_by, reason=None):
+        """Fecha o ticket: transcrição comprimida, log e exclusão do canal. Retorna (arquivo, mensagens)"""
+        guild = channel.guild
+        data = self.guild_data(guild.id)
+        ticket = data['open'].pop(str(channel.id), None)
+        if ticket is None:
+            return None
+        self._index(guild.id).pop(ticket['user_id'], None)
+        data_system.save_tickets()
+
+        try:
+            path, count = await self.write_transcript(channel, ticket)
+        except Exception:
+            # Sem transcrição o canal não é apagado: o ticket volta a constar como aberto
+            data['open'][str(channel.id)] = ticket
+            self._index(guild.id)[ticket['user_id']] = channel.id
+            data_system.save_tickets()
+            raise
+        self.stats['closed'] += 1
+
+        await log_system.log_action(
+            guild,
+            'ticket_close',
+            moderator=f"{closed_by} ({closed_by.id})",
+            user=LogSystem.describe_user(guild, ticket['user_id']),
+            channel=channel.name,
+            reason=reason,
+            messages=str(count),
+            transcript=path
+        )
+        await self.upload_transcript(guild, ticket, path)
+        await channel.delete(reason=f"Ticket fechado por {closed_by}")
+        return path, count
+
+    async def write_transcript(self, channel, ticket):
+        """Grava o histórico do canal em gzip, página a página: só uma página de mensagens fica em memória.
+
+        Abrir, escrever e fechar (que comprime o final) rodam fora do event loop. O arquivo é montado num
+        temporário e só recebe o nome final quando está completo; numa falha, o parcial é apagado"""
+        directory = os.path.join(TICKET_TRANSCRIPT_DIR, str(channel.guild.id))
+        path = os.path.join(directory, f"ticket-{ticket['number']:04d}-{channel.id}.txt.gz")
+        temp_path = f"{path}.tmp"
+        count = 0
+        page = [f"Ticket #{ticket['number']} de {LogSystem.describe_user(channel.guild, ticket['user_id'])} • aberto em {ticket['opened_at']}\n\n"]
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+        f = await asyncio.to_thread(gzip.open, temp_path, 'wt', encoding='utf-8')
+        try:
+            async for message in channel.history(limit=None, oldest_first=True):
+                page.append(self.format_message(message))
+                count += 1
+                if len(page) >= TICKET_TRANSCRIPT_PAGE_SIZE:
+                    # Compressão e escrita fora do event loop, enquanto a próxima página é buscada
+                    await asyncio.to_thread(f.writelines, page)
+                    page = []
+            if page:
+                await asyncio.to_thread(f.writelines, page)
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.replace, temp_path, path)
+        except BaseException as e:
+            await asyncio.to_thread(self._discard_transcript, f, temp_path)
+            print(f"Erro ao gravar transcrição do ticket #{ticket['number']}: {e}")
+            raise
+        return path, count
+
+    @staticmethod
+    def _discard_transcript(f, temp_path):
+        try:
+            f.close()
+        except Exception:
+            pass
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    @staticmethod
+    def format_message(message):
+        content = message.content.replace("\n", "\n    ")
+        line = f"[{message.created_at.strftime('%d/%m/%Y %H:%M')}] {message.author} ({message.author.id}): {content}\n"
+        line += "".join(f"    📎 {attachment.url}\n" for attachment in message.attachments)
+        line += "".join(f"    🖼️ {embed.title or embed.description or 'embed'}\n" for embed in message.embeds)
+        return line
+
+    async def upload_transcript(self, guild, ticket, path):
+        """Anexa a transcrição no canal de logs quando cabe no limite de upload"""
+        if os.path.getsize(path) > TICKET_TRANSCRIPT_UPLOAD_LIMIT:
+            return
+        try:
+            log_channel = await LogSystem.get_log_channel(guild)
+            if log_channel:
+                await log_channel.send(f"📄 Transcrição do ticket #{ticket['number']}", file=discord.File(path, filename=os.path.basename(path)))
+        except Exception as e:
+            print(f"Erro ao enviar transcrição do ticket: {e}")
+
+ticket_system = TicketSystem(TICKET_POOL_SIZE)
+
+class TicketPanelView(discord.ui.View):
+    """Botão de abrir ticket (persistente: continua funcionando depois de reiniciar o bot)"""
+
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    @discord.ui.button(label="🎫 Abrir ticket", style=discord.ButtonStyle.primary, custom_id="ticket:open")
+    async def open_ticket(self, interaction, button):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            channel, created = await ticket_system.open(interaction.guild, interaction.user)
+        except Exception as e:
+            await interaction.followup.send(f"❌ Erro ao abrir ticket: {e}", ephemeral=True)
+            return
+        if channel is None:
+            await interaction.followup.send("⏳ Seu ticket já está sendo aberto.", ephemeral=True)
+        elif created:
+            await send_ticket_welcome(channel, interaction.user)
+            await interaction.followup.send(f"✅ Ticket aberto: {channel.mention}", ephemeral=True)
+        else:
+            await interaction.followup.send(f"ℹ️ Você já tem um ticket aberto: {channel.mention}", ephemeral=True)
+
+async def send_ticket_welcome(channel, member, reason=None):
+    """Primeira mensagem do ticket, chamando o autor e a equipe de suporte"""
+    support_role = TicketSystem.support_role(channel.guild)
+    embed = discord.Embed(
+        title="🎫 Ticket Aberto",
+        description=f"Olá {member.mention}! Descreva seu problema e a equipe de suporte já vai te atender.",
+        color=0x00ff00
+    )
+    if reason:
+        embed.add_field(name="📝 Assunto", value=reason[:1024], inline=False)
+    embed.set_footer(text=f"Use {COMMAND_HINT}ticket_close para fechar")
+    await channel.send(content=" ".join(m.mention for m in (member, support_role) if m), embed=embed)
+
+# SISTEMA DE EMBEDS (simplificado para evitar erros)
+class EmbedTemplate:
+    """Embed salvo já compilado: os textos viram pedaços fixos + variáveis, resolvidos a cada envio.
+
+    Variáveis desconhecidas ficam como texto. A renderização monta direto o dict no formato
+    da API do Discord, sem passar pelos setters do discord.Embed."""
+    __slots__ = ('title', 'description', 'color', 'fields', 'footer', 'thumbnail', 'image')
+
+    PLACEHOLDER = re.compile(r'\{([a-z_]+(?:\.[a-z_]+)?)\}')
+    VARIABLES = {
+        'member': lambda c: c['member'].mention if c['member'] else '',
+        'member.mention': lambda c: c['member'].mention if c['member'] else '',
+        'member.name': lambda c: c['member'].name if c['member'] else '',
+        'member.display_name': lambda c: c['member'].display_name if c['member'] else '',
+        'member.id': lambda c: str(c['member'].id) if c['member'] else '',
+        'member.avatar': lambda c: c['member'].display_avatar.url if c['member'] else '',
+        'guild': lambda c: c['guild'].name if c['guild'] else '',
+        'guild.name': lambda c: c['guild'].name if c['guild'] else '',
+        'guild.id': lambda c: str(c['guild'].id) if c['guild'] else '',
+        'guild.member_count': lambda c: str(c['guild'].member_count or 0) if c['guild'] else '',
+        'guild.icon': lambda c: c['guild'].icon.url if c['guild'] and c['guild'].icon else '',
+        'channel': lambda c: c['channel'].mention if c['channel'] else '',
+        'channel.name': lambda c: c['channel'].name if c['channel'] else '',
+        'date': lambda c: c['now'].strftime('%d/%m/%Y'),
+        'time': lambda c: c['now'].strftime('%H:%M')
+    }
+
+    def __init__(self, embed_data):
+        self.title = self.compile_text(embed_data.get('title', ''))
+        self.description = self.compile_text(embed_data.get('description', ''))
+        self.color = embed_data.get('color', 0x3498db)
+        self.fields = tuple(
+            (self.compile_text(field.get('name', 'Campo')), self.compile_text(field.get('value', 'Valor')), field.get('inline', False))
+            for field in embed_data.get('fields', [])
+        )
+        self.footer = self.compile_text(embed_data.get('footer', ''))
+        self.thumbnail = self.compile_text(embed_data.get('thumbnail', ''))
+        self.image = self.compile_text(embed_data.get('image', ''))
 
-            role = member.guild.get_role(int(role_id))
-            if not role:
-                return False
+    @classmethod
+    def compile_text(cls, text):
+        """Texto sem variáveis fica como str; com variáveis vira tupla de str e funções"""
+        text = text or ''
+        parts, position = [], 0
+        for match in cls.PLACEHOLDER.finditer(text):
+            resolver = cls.VARIABLES.get(match.group(1))
+            if resolver is None:
+                continue
+            if match.start() > position:
+                parts.append(text[position:match.start()])
+            parts.append(resolver)
+            position = match.end()
+        if not parts:
+            return text
+        if position < len(text):
+            parts.append(text[position:])
+        return tuple(parts)
 
-            await member.add_roles(role)
-            await log_system.log_welcome_role(member, role)
-            return True
-        except Exception as e:
-            print(f"Erro ao adicionar cargo de boas-vindas: {e}")
-            return False
+    @staticmethod
+    def fill(parts, context):
+        if isinstance(parts, str):
+            return parts
+        return "".join(part if isinstance(part, str) else part(context) for part in parts)
 
-welcome_role_system = WelcomeRoleSystem()
+    def render(self, member=None, guild=None, channel=None):
+        """Payload do embed (formato da API) com as variáveis resolvidas para este envio"""
+        context = {'member': member, 'guild': guild or getattr(member, 'guild', None), 'channel': channel, 'now': datetime.datetime.now()}
+        payload = {'type': 'rich', 'color': self.color}
+        for key in ('title', 'description'):
+            value = self.fill(getattr(self, key), context)
+            if value:
+                payload[key] = value
+        if self.fields:
+            payload['fields'] = [
+                {'name': self.fill(name, context) or 'Campo', 'value': self.fill(value, context) or 'Valor', 'inline': inline}
+                for name, value, inline in self.fields
+            ]
+        footer = self.fill(self.footer, context)
+        if footer:
+            payload['footer'] = {'text': footer}
+        for key in ('thumbnail', 'image'):
+            url = self.fill(getattr(self, key), context)
+            if url.startswith(('http://', 'https://')):
+                payload[key] = {'url': url}
+        return payload
+
+    def to_embed(self, **context):
+        return discord.Embed.from_dict(self.render(**context))
 
-# SISTEMA DE EMBEDS (simplificado para evitar erros)
 class EmbedSystem:
+    # Templates compilados: guild_id -> {nome: EmbedTemplate}, servidores em ordem de uso (LRU)
+    _templates = collections.OrderedDict()
+    cache_stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def new_embed_data(title=None, description=None):
+        """Dados de um embed novo, no formato salvo no embeds.json"""
+        return {
+            'title': title or '',
+            'description': description or '',
+            'color': 0x3498db,
+            'fields': [],
+            'footer': '',
+            'thumbnail': '',
+            'image': ''
+        }
+
     @staticmethod
     async def create_embed_interactive(ctx):
         """Cria embed de forma interativa"""
         try:
-            embed_data = {
-                'title': '',
-                'description': '',
-                'color': 0x3498db,
-                'fields': [],
-                'footer': '',
-                'thumbnail': '',
-                'image': ''
-            }
+            embed_data = EmbedSystem.new_embed_data()
 
             # Perguntar título
             await ctx.send("📝 **Digite o título do embed (ou 'pular' para pular):**")
@@ -437,36 +3722,104 @@ class EmbedSystem:
             return None
 
     @staticmethod
-    def build_embed(embed_data):
-        """Constrói o embed a partir dos dados"""
-        embed = discord.Embed(
-            title=embed_data.get('title', ''),
-            description=embed_data.get('description', ''),
-            color=embed_data.get('color', 0x3498db)
-        )
+    def build_embed(embed_data, **context):
+        """Constrói o embed a partir dos dados (variáveis resolvidas com member/guild/channel)"""
+        return EmbedTemplate(embed_data).to_embed(**context)
 
-        # Adicionar campos se existirem
-        for field in embed_data.get('fields', []):
-            embed.add_field(
-                name=field.get('name', 'Campo'),
-                value=field.get('value', 'Valor'),
-                inline=field.get('inline', False)
-            )
+    @staticmethod
+    def get_template(guild_id, name):
+        """Template compilado de um embed salvo (compila na primeira vez depois de reiniciar ou sair do cache)"""
+        guild_key = str(guild_id)
+        templates = EmbedSystem._templates.get(guild_key)
+        if templates is not None:
+            EmbedSystem._templates.move_to_end(guild_key)
+            template = templates.get(name)
+            if template is not None:
+                EmbedSystem.cache_stats['hits'] += 1
+                return template
 
-        # Adicionar footer se existir
-        if embed_data.get('footer'):
-            embed.set_footer(text=embed_data['footer'])
+        EmbedSystem.cache_stats['misses'] += 1
+        embed_data = data_system.embeds_data.get(guild_key, {}).get(name)
+        if embed_data is None:
+            return None
+        template = EmbedTemplate(embed_data)
+        EmbedSystem._cache_template(guild_key, name, template)
+        return template
 
-        return embed
+    @staticmethod
+    def _cache_template(guild_key, name, template):
+        EmbedSystem._templates.setdefault(guild_key, {})[name] = template
+        EmbedSystem._templates.move_to_end(guild_key)
+        while len(EmbedSystem._templates) > EMBED_TEMPLATE_CACHE_SIZE:
+            EmbedSystem._templates.popitem(last=False)
+
+    @staticmethod
+    def invalidate_templates(guild_id, name=None):
+        """Descarta os templates compilados de um embed (ou de todo o servidor)"""
+        guild_key = str(guild_id)
+        if name is None:
+            EmbedSystem._templates.pop(guild_key, None)
+        elif guild_key in EmbedSystem._templates:
+            EmbedSystem._templates[guild_key].pop(name, None)
 
     @staticmethod
     async def save_embed(guild_id, name, embed_data):
-        """Salva embed no arquivo"""
+        """Salva embed no arquivo e já deixa o template compilado no cache"""
         guild_key = str(guild_id)
         if guild_key not in data_system.embeds_data:
             data_system.embeds_data[guild_key] = {}
         data_system.embeds_data[guild_key][name] = embed_data
         data_system.save_embeds()
+        EmbedSystem.invalidate_templates(guild_id, name)
+        EmbedSystem._cache_template(guild_key, name, EmbedTemplate(embed_data))
+
+    @staticmethod
+    def resolve_broadcast_targets(guild, targets):
+        """Canais de texto a partir de #menções/nomes, categoria:Nome e padrao:glob (sem repetir canais)"""
+        channels, unknown = {}, []
+        for target in targets:
+            key, _, value = target.partition(':')
+            if key in ('categoria', 'category') and value:
+                category = discord.utils.find(lambda c: c.name.lower() == value.lower() or str(c.id) == value, guild.categories)
+                found = category.text_channels if category else []
+            elif key in ('padrao', 'pattern') and value:
+                found = [channel for channel in guild.text_channels if fnmatch.fnmatchcase(channel.name, value.lower())]
+            else:
+                channel_id = target.strip('<#>')
+                channel = guild.get_channel(int(channel_id)) if channel_id.isdigit() else discord.utils.get(guild.text_channels, name=target.lstrip('#'))
+                found = [channel] if isinstance(channel, discord.TextChannel) else []
+            if not found:
+                unknown.append(target)
+            for channel in found:
+                channels[channel.id] = channel
+        return list(channels.values()), unknown
+
+    @staticmethod
+    async def broadcast(template, channels, author):
+        """Envia o template para vários canais ao mesmo tempo; devolve [(canal, erro ou None)].
+
+        Cada canal tem o próprio bucket de rate limit no Discord, então os envios rodam em paralelo
+        (limitados por BROADCAST_CONCURRENCY para não esbarrar no limite global)."""
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+        async def send(channel):
+            if not channel.permissions_for(author).send_messages:
+                return channel, "autor sem permissão para enviar"
+            permissions = channel.permissions_for(channel.guild.me)
+            if not (permissions.send_messages and permissions.embed_links):
+                return channel, "bot sem permissão para enviar embeds"
+            async with semaphore:
+                for attempt in range(BROADCAST_RETRIES):
+                    try:
+                        await channel.send(embed=template.to_embed(member=author, guild=channel.guild, channel=channel))
+                        return channel, None
+                    except Exception as e:
+                        retry_after = retry_after_seconds(e)
+                        if retry_after is None or attempt == BROADCAST_RETRIES - 1:
+                            return channel, str(e)
+                        await asyncio.sleep(retry_after)
+
+        return await asyncio.gather(*(send(channel) for channel in channels))
 
     @staticmethod
     async def load_embed(guild_id, name):
@@ -486,48 +3839,372 @@ class EmbedSystem:
 
 embed_system = EmbedSystem()
 
+# SISTEMA DE SHARDS
+class ShardStatusSystem:
+    """Estado de cada shard, publicado por processo em SHARD_STATUS_DIR para a visão do cluster inteiro"""
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self._task = None
+
+    def local_status(self):
+        """Shards deste processo: latência, conexão e quantidade de servidores"""
+        guild_counts = collections.Counter(guild.shard_id for guild in bot.guilds)
+        latency_ms = lambda latency: round(latency * 1000, 1) if math.isfinite(latency) else None
+        if isinstance(bot, commands.AutoShardedBot):
+            shards = [
+                {'id': shard_id, 'latency_ms': latency_ms(shard.latency), 'connected': not shard.is_closed(), 'guilds': guild_counts.get(shard_id, 0)}
+                for shard_id, shard in sorted(bot.shards.items())
+            ]
+        else:
+            shards = [{'id': bot.shard_id or 0, 'latency_ms': latency_ms(bot.latency), 'connected': bot.is_ready(), 'guilds': len(bot.guilds)}]
+        return {'cluster': CLUSTER_ID, 'pid': os.getpid(), 'updated_at': time.time(), 'shard_count': bot.shard_count or 1, 'shards': shards}
+
+    def publish(self):
+        os.makedirs(self.directory, exist_ok=True)
+        status = self.local_status()
+        persistence.write(os.path.join(self.directory, f"cluster-{CLUSTER_ID}.json"), lambda: json.dumps(status))
+
+    def collect(self):
+        """Estado de todos os processos (marcando como desatualizados os que pararam de publicar)"""
+        if not os.path.isdir(self.directory):
+            return [self.local_status()] if bot.is_ready() else []
+        clusters = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if status.get('cluster') == CLUSTER_ID and bot.is_ready():
+                status = self.local_status()  # O próprio processo sempre com dados atuais
+            status['stale'] = time.time() - status.get('updated_at', 0) > 3 * self.interval
+            clusters.append(status)
+        return clusters
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._publish_loop())
+
+    async def _publish_loop(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"Erro ao publicar estado das shards: {e}")
+            await asyncio.sleep(self.interval)
+
+shard_status = ShardStatusSystem(SHARD_STATUS_DIR, SHARD_STATUS_INTERVAL)
+
+
+class ShardClusterLauncher:
+    """Divide as shards em faixas, roda cada faixa num processo e reinicia os que caírem"""
+
+    def __init__(self, clusters, shard_count):
+        self.clusters = clusters
+        self.shard_count = shard_count
+        self.processes = {}
+
+    def recommended_shard_count(self):
+        """Quantidade de shards recomendada pelo Discord (GET /gateway/bot)"""
+        request = urllib.request.Request(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={'Authorization': f"Bot {TOKEN}", 'User-Agent': "DiscordBot (cluster launcher)"}
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)['shards']
+
+    def shard_ranges(self):
+        """Faixas contíguas de shards, uma por processo"""
+        clusters = min(self.clusters, self.shard_count)
+        size, extra = divmod(self.shard_count, clusters)
+        ranges, start = [], 0
+        for cluster_id in range(clusters):
+            end = start + size + (1 if cluster_id < extra else 0)
+            ranges.append(list(range(start, end)))
+            start = end
+        return ranges
+
+    def spawn(self, cluster_id, shard_ids):
+        env = dict(os.environ, SHARD_MODE='cluster', SHARD_COUNT=str(self.shard_count),
+                   SHARD_IDS=",".join(map(str, shard_ids)), CLUSTER_ID=str(cluster_id))
+        print(f"🧩 Cluster {cluster_id}: shards {shard_ids[0]}-{shard_ids[-1]} de {self.shard_count}")
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+    def readiness(self):
+        """Pronto quando todos os processos publicam estado recente com as shards conectadas"""
+        clusters = [cluster for cluster in shard_status.collect() if not cluster.get('stale')]
+        connected = all(shard['connected'] for cluster in clusters for shard in cluster['shards'])
+        return {
+            'ready': bool(self.processes) and len(clusters) >= len(self.processes) and connected,
+            'connected': connected,
+            'clusters': len(clusters),
+            'expected_clusters': len(self.processes)
+        }
+
+    async def run(self):
+        web_server.ready_check = self.readiness
+        await web_server.start()
+        if not self.shard_count:
+            self.shard_count = await asyncio.to_thread(self.recommended_shard_count)
+        ranges = self.shard_ranges()
+        for cluster_id, shard_ids in enumerate(ranges):
+            self.processes[cluster_id] = self.spawn(cluster_id, shard_ids)
+
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        while self.processes:
+            await asyncio.sleep(5)
+            for cluster_id, process in list(self.processes.items()):
+                if process.poll() is not None:
+                    print(f"⚠️ Cluster {cluster_id} saiu com código {process.returncode}; reiniciando")
+                    await asyncio.sleep(5)
+                    self.processes[cluster_id] = self.spawn(cluster_id, ranges[cluster_id])
+
+    def stop(self):
+        """Encerra todos os processos do cluster"""
+        processes, self.processes = self.processes, {}
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+        sys.exit(0)
+
+# SINCRONIZAÇÃO DOS COMANDOS DE BARRA
+def app_command_payload(command):
+    """Payload de um comando de barra como enviado no sync (to_dict recebe a árvore a partir do discord.py 2.4)"""
+    if 'tree' in inspect.signature(command.to_dict).parameters:
+        return command.to_dict(bot.tree)
+    return command.to_dict()
+
+async def sync_app_commands():
+    """Publica os comandos de barra só quando mudaram desde o último sync (o sync tem rate limit próprio)"""
+    if APP_COMMANDS_SYNC == 'off' or (IS_CLUSTER_WORKER and CLUSTER_ID != 0):
+        return
+    try:
+        payload = json.dumps([app_command_payload(command) for command in bot.tree.get_commands()], sort_keys=True)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        if APP_COMMANDS_SYNC == 'auto' and os.path.exists(APP_COMMANDS_HASH_FILE):
+            with open(APP_COMMANDS_HASH_FILE, 'r', encoding='utf-8') as f:
+                if f.read().strip() == digest:
+                    return
+        synced = await bot.tree.sync()
+    except Exception as e:
+        # Roda como tarefa solta: sem este print uma falha aqui passaria em silêncio
+        print(f"Erro ao sincronizar comandos de barra: {e}")
+        traceback.print_exc()
+        return
+    persistence.write(APP_COMMANDS_HASH_FILE, lambda: digest)
+    print(f"🔁 {len(synced)} comandos de barra sincronizados")
+
+# DESLIGAMENTO
+async def shutdown_on_signal():
+    """SIGTERM (parada do container): fecha o bot e grava o que está pendente antes de o processo sair"""
+    print("🛑 SIGTERM recebido, encerrando o bot...")
+    try:
+        await bot.close()
+    finally:
+        command_analytics.flush(include_current=True)
+        persistence.shutdown()  # O bot.run retorna em seguida e o finally do __main__ só confirma
+
 # EVENTOS DO BOT
 @bot.event
+async def setup_hook():
+    """Chamado pelo discord.py logo após o login HTTP"""
+    startup_timer.mark('login')
+    loop_watchdog.start()
+    bot.add_view(TicketPanelView())  # Botões de painéis publicados antes do reinício
+    try:
+        # O bot.run só trata Ctrl+C: sem isto o SIGTERM mata o processo sem o finally nem o atexit
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(shutdown_on_signal()))
+    except NotImplementedError:
+        pass  # Windows: o event loop não aceita handlers de sinal
+    await web_server.start()
+    asyncio.ensure_future(sync_app_commands())  # Não atrasa a conexão ao gateway
+
+@bot.event
+@metrics.timed_event
+async def on_connect():
+    startup_timer.mark('gateway')
+
+@bot.event
+@metrics.timed_event
 async def on_ready():
     print(f'✅ {bot.user.name} está online!')
-    print(f'🔧 Prefixo: {PREFIX}')
+    print(f'🔧 Prefixo: {PREFIX}' if PREFIX_COMMANDS else f'🔧 Só comandos de barra (MESSAGE_CONTENT={MESSAGE_CONTENT})')
     print(f'🚀 Sistemas carregados: Tickets, AutoRoles, Logs, Embeds, WelcomeRoles')
+    startup_timer.mark('ready')
+    startup_timer.print_report()
+    MemoryReport.print_report()
 
     activity = discord.Activity(
         type=discord.ActivityType.watching,
-        name=f"{PREFIX}ajuda | Sistema Completo"
+        name=f"{COMMAND_HINT}ajuda | Sistema Completo"
     )
     await bot.change_presence(activity=activity)
+    log_retention_system.start()
+    shard_status.start()
+    metrics.start()
+    command_analytics.start()
+    welcome_role_backfill.resume_all()
+    ticket_system.warm_all()
+
+@bot.event
+@metrics.timed_event
+async def on_guild_channel_create(channel):
+    """Um novo canal "logs" pode passar a ser o canal de logs"""
+    log_system.invalidate_log_channel(channel)
+
+@bot.event
+@metrics.timed_event
+async def on_guild_channel_delete(channel):
+    """Invalida o cache se o canal de logs for apagado e esquece tickets apagados à mão"""
+    log_system.invalidate_log_channel(channel)
+    ticket_system.forget_channel(channel)
+
+@bot.event
+@metrics.timed_event
+async def on_guild_channel_update(before, after):
+    """Invalida o cache quando o canal de logs é renomeado ou tem permissões alteradas"""
+    if before.name != after.name or before.overwrites != after.overwrites:
+        log_system.invalidate_log_channel(before, after)
+
+@bot.event
+@metrics.timed_event
+async def on_guild_remove(guild):
+    """Esquece o canal de logs e as mensagens em cache de servidores que o bot deixou"""
+    log_system.forget_guild(guild.id)
+    message_cache.forget_guild(guild.id)
+    member_chunker.forget_guild(guild.id)
 
 @bot.event
-async def on_message_delete(message):
-    """Log quando uma mensagem é deletada"""
-    await log_system.log_message_delete(message)
+@metrics.timed_event
+async def on_message(message):
+    """Comandos por prefixo só com MESSAGE_CONTENT=full; nos outros modos nenhuma mensagem é interpretada"""
+    if PREFIX_COMMANDS:
+        await bot.process_commands(message)
+
+@bot.listen('on_message')
+@metrics.timed_event
+@event_trace.recorded
+async def cache_message(message):
+    """Guarda a versão compacta da mensagem para os logs de exclusão e edição"""
+    record = CachedMessage.from_message(message)
+    if record is not None:
+        message_cache.add(message.guild.id, record)
+
+def cached_record(guild_id, message_id, message=None, remove=False):
+    """CachedMessage a partir do cache do discord.py (se ainda tiver) ou do cache compacto"""
+    record = message_cache.pop(guild_id, message_id) if remove else message_cache.get(guild_id, message_id)
+    if message is not None:
+        return CachedMessage.from_message(message)
+    return record
+
+@bot.event
+@metrics.timed_event
+@event_trace.recorded
+async def on_raw_message_delete(payload):
+    """Log quando uma mensagem é deletada, mesmo fora do cache do discord.py"""
+    guild = bot.get_guild(payload.guild_id) if payload.guild_id else None
+    if guild is None:
+        return
+    edit_coalescer.flush(payload.message_id)  # A edição pendente sai antes da exclusão
+    record = cached_record(guild.id, payload.message_id, payload.cached_message, remove=True)
+    if record is not None:
+        await log_system.log_message_delete(guild, record)
 
 @bot.event
-async def on_message_edit(before, after):
-    """Log quando uma mensagem é editada"""
-    await log_system.log_message_edit(before, after)
+@metrics.timed_event
+@event_trace.recorded
+async def on_raw_bulk_message_delete(payload):
+    """Log quando várias mensagens são deletadas de uma vez"""
+    guild = bot.get_guild(payload.guild_id) if payload.guild_id else None
+    if guild is None:
+        return
+    for message_id in payload.message_ids:
+        edit_coalescer.flush(message_id)
+    cached = {message.id: message for message in payload.cached_messages}
+    records = [cached_record(guild.id, message_id, cached.get(message_id), remove=True) for message_id in payload.message_ids]
+    await log_system.log_bulk_delete(guild, payload.channel_id, payload.message_ids, [record for record in records if record])
 
 @bot.event
+@metrics.timed_event
+@event_trace.recorded
+async def on_raw_message_edit(payload):
+    """Log quando uma mensagem é editada (atualizações só de embeds/unfurl são ignoradas)"""
+    guild = bot.get_guild(payload.guild_id) if payload.guild_id else None
+    if guild is None or MESSAGE_CONTENT == 'off' or 'content' not in payload.data or payload.data.get('author', {}).get('bot'):
+        return
+    before = cached_record(guild.id, payload.message_id, payload.cached_message)
+    if before is None:
+        return
+    message_cache.update_content(guild.id, payload.message_id, payload.data['content'])
+    edit_coalescer.submit(guild, before, payload.data['content'])
+
+@bot.event
+@metrics.timed_event
+@event_trace.recorded
 async def on_member_join(member):
     """Quando um usuário entra no servidor"""
-    await log_system.log_user_join(member)
-    await welcome_role_system.add_welcome_role(member)
+    await join_pipeline.submit(member)
 
 @bot.event
+@metrics.timed_event
+@event_trace.recorded
 async def on_member_remove(member):
     """Log quando um usuário sai do servidor"""
     await log_system.log_user_leave(member)
 
 @bot.event
+@metrics.timed_event
+@event_trace.recorded
 async def on_command(ctx):
-    """Log quando um comando é usado"""
-    await log_system.log_command(ctx)
+    """Log de cada comando usado: todos, uma amostra ou nenhum (o uso agregado fica no s!stats)"""
+    if COMMAND_LOG_MODE == 'all' or (COMMAND_LOG_MODE == 'sample' and random.random() < COMMAND_LOG_SAMPLE_RATE):
+        await log_system.log_command(ctx)
+
+@bot.event
+async def on_command_error(ctx, error):
+    """Comandos de barra precisam de uma resposta: falhas de permissão ou argumento viram mensagem efêmera"""
+    if ctx.interaction is None:
+        await commands.Bot.on_command_error(bot, ctx, error)
+        return
+    if isinstance(error, commands.BotMissingPermissions):
+        message = "❌ O bot não tem permissão para isso: " + ", ".join(error.missing_permissions)
+    elif isinstance(error, commands.CheckFailure):
+        message = "❌ Você não tem permissão para usar este comando."
+    elif isinstance(error, commands.UserInputError):
+        message = f"❌ {error}"
+    else:
+        print(f"Erro no comando /{ctx.command.qualified_name}: {error}")
+        message = f"❌ Erro ao executar o comando: {error}"
+    try:
+        await ctx.send(message, ephemeral=True)
+    except discord.HTTPException:
+        pass
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.metrics_started = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_metrics(ctx):
+    """Duração e resultado de cada comando (chamado mesmo quando o comando falha)"""
+    labels = (('command', ctx.command.qualified_name),)
+    elapsed = time.perf_counter() - ctx.metrics_started
+    metrics.observe('discord_command_duration_seconds', elapsed, labels)
+    loop_watchdog.record_call('comando', ctx.command.qualified_name, elapsed)
+    command_analytics.record(ctx, elapsed, ctx.command_failed)
+    metrics.inc('discord_commands_total', labels + (('status', 'error' if ctx.command_failed else 'ok'),))
 
 # COMANDOS DO SISTEMA DE CARGO AUTOMÁTICO
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
+@app_commands.describe(role="Cargo dado aos novos membros")
 async def set_welcome_role(ctx, role: discord.Role):
     """Define um cargo para ser dado automaticamente a novos membros"""
     try:
@@ -551,8 +4228,10 @@ async def set_welcome_role(ctx, role: discord.Role):
     except Exception as e:
         await ctx.send(f"❌ Erro ao configurar cargo de boas-vindas: {e}")
 
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
 async def remove_welcome_role(ctx):
     """Remove o cargo automático de boas-vindas"""
     try:
@@ -571,8 +4250,10 @@ async def remove_welcome_role(ctx):
     except Exception as e:
         await ctx.send(f"❌ Erro ao remover cargo de boas-vindas: {e}")
 
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
 async def show_welcome_role(ctx):
     """Mostra o cargo automático configurado"""
     try:
@@ -588,25 +4269,97 @@ async def show_welcome_role(ctx):
                 )
                 await ctx.send(embed=embed)
             else:
-                await ctx.send("❌ Cargo configurado não encontrado. Use `set_welcome_role` para configurar um novo.")
+                await ctx.send(f"❌ Cargo configurado não encontrado. Use `{COMMAND_HINT}set_welcome_role` para configurar um novo.")
         else:
-            await ctx.send("ℹ️ Nenhum cargo de boas-vindas configurado. Use `set_welcome_role` para configurar.")
+            await ctx.send(f"ℹ️ Nenhum cargo de boas-vindas configurado. Use `{COMMAND_HINT}set_welcome_role` para configurar.")
 
     except Exception as e:
         await ctx.send(f"❌ Erro ao verificar cargo de boas-vindas: {e}")
 
+@bot.hybrid_command()
+@commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
+async def backfill_welcome_role(ctx):
+    """Aplica o cargo de boas-vindas a todos os membros que ainda não o têm"""
+    try:
+        if welcome_role_backfill.is_running(ctx.guild.id):
+            await ctx.send(f"ℹ️ Já existe um backfill em andamento. Use `{COMMAND_HINT}backfill_status`.")
+            return
+
+        role_id = await welcome_role_system.get_welcome_role(ctx.guild.id)
+        role = ctx.guild.get_role(int(role_id)) if role_id else None
+        if not role:
+            await ctx.send(f"❌ Nenhum cargo de boas-vindas configurado. Use `{COMMAND_HINT}set_welcome_role` primeiro.")
+            return
+
+        welcome_role_backfill.start(ctx.guild, role, ctx.channel)
+        await ctx.send(f"🔁 Backfill iniciado: aplicando {role.mention} aos membros que ainda não o têm.")
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao iniciar backfill: {e}")
+
+@bot.hybrid_command()
+@commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
+async def backfill_status(ctx):
+    """Mostra o progresso do backfill do cargo de boas-vindas"""
+    job = welcome_role_backfill.job(ctx.guild.id)
+    if not job:
+        await ctx.send("ℹ️ Nenhum backfill foi executado neste servidor.")
+        return
+    await ctx.send(embed=welcome_role_backfill.progress_embed(ctx.guild, job))
+
+@bot.hybrid_command()
+@commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
+async def backfill_cancel(ctx):
+    """Cancela o backfill em andamento"""
+    if welcome_role_backfill.cancel(ctx.guild.id):
+        await ctx.send("🛑 Backfill cancelado.")
+    else:
+        await ctx.send("ℹ️ Nenhum backfill em andamento.")
+
+@bot.hybrid_command()
+@commands.has_permissions(manage_roles=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_roles=True)
+async def join_stats(ctx):
+    """Mostra as métricas do pipeline de entradas"""
+    stats = join_pipeline.stats
+    embed = discord.Embed(title="📈 Pipeline de Entradas", color=0x3498db)
+    embed.add_field(name="Entradas/s (1 min)", value=f"{join_pipeline.throughput():.2f}", inline=True)
+    embed.add_field(name="Fila de cargos", value=str(join_pipeline.queue_depth()), inline=True)
+    embed.add_field(name="Entradas", value=str(stats['joins']), inline=True)
+    embed.add_field(name="Cargos aplicados", value=str(stats['roles_assigned']), inline=True)
+    embed.add_field(name="Falhas", value=str(stats['role_failures']), inline=True)
+    embed.add_field(name="429 recebidos", value=str(stats['rate_limited']), inline=True)
+    await ctx.send(embed=embed)
+
 # COMANDOS DE EMBEDS
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(manage_messages=True)
-async def embed_create(ctx, nome_salvo: str = None):
-    """Cria um embed personalizado de forma interativa"""
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.describe(nome_salvo="Nome para salvar o embed", titulo="Título do embed", descricao="Descrição do embed (aceita variáveis)")
+async def embed_create(ctx, nome_salvo: str = None, titulo: str = None, *, descricao: str = None):
+    """Cria um embed personalizado (interativo, ou direto com título e descrição)"""
     try:
-        embed_data = await embed_system.create_embed_interactive(ctx)
+        if titulo or descricao:
+            embed_data = embed_system.new_embed_data(titulo, descricao)
+        elif ctx.interaction is not None:
+            # O modo interativo lê as respostas do chat, o que depende do conteúdo das mensagens
+            await ctx.send("❌ Informe `titulo` e/ou `descricao`.", ephemeral=True)
+            return
+        else:
+            embed_data = await embed_system.create_embed_interactive(ctx)
         if not embed_data:
             return
 
         # Construir e mostrar preview
-        embed = embed_system.build_embed(embed_data)
+        embed = embed_system.build_embed(embed_data, member=ctx.author, channel=ctx.channel)
         await ctx.send("**👀 Preview do Embed:**", embed=embed)
 
         # Salvar se um nome foi fornecido
@@ -625,21 +4378,24 @@ async def embed_create(ctx, nome_salvo: str = None):
     except Exception as e:
         await ctx.send(f"❌ Erro ao criar embed: {e}")
 
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(manage_messages=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.describe(nome_embed="Nome do embed salvo", canal="Canal de destino (padrão: este canal)")
 async def embed_send(ctx, nome_embed: str, canal: discord.TextChannel = None):
-    """Envia um embed salvo"""
+    """Envia um embed salvo (variáveis como {member} e {guild.member_count} são resolvidas no envio)"""
     try:
-        embed_data = await embed_system.load_embed(ctx.guild.id, nome_embed)
-        if not embed_data:
+        template = embed_system.get_template(ctx.guild.id, nome_embed)
+        if not template:
             await ctx.send(f"❌ Embed `{nome_embed}` não encontrado.")
             return
 
-        embed = embed_system.build_embed(embed_data)
         target_channel = canal or ctx.channel
+        payload = template.render(member=ctx.author, guild=ctx.guild, channel=target_channel)
 
-        await target_channel.send(embed=embed)
-        await ctx.send(f"✅ Embed `{nome_embed}` enviado para {target_channel.mention}", delete_after=5)
+        await target_channel.send(embed=discord.Embed.from_dict(payload))
+        await ctx.send(f"✅ Embed `{nome_embed}` enviado para {target_channel.mention}", delete_after=5, ephemeral=True)
 
         await log_system.log_action(
             ctx.guild,
@@ -647,14 +4403,72 @@ async def embed_send(ctx, nome_embed: str, canal: discord.TextChannel = None):
             user=f"{ctx.author} ({ctx.author.id})",
             embed_name=nome_embed,
             channel=target_channel.name,
-            title=embed_data.get('title', 'Sem titulo')
+            title=payload.get('title', 'Sem titulo')
         )
 
     except Exception as e:
         await ctx.send(f"❌ Erro ao enviar embed: {e}")
 
-@bot.command()
+@bot.hybrid_command()
+@commands.has_permissions(manage_messages=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.describe(nome_embed="Nome do embed salvo", alvos="#canais, categoria:Nome ou padrao:anuncios-* separados por espaço")
+async def embed_broadcast(ctx, nome_embed: str, *, alvos: str = ''):
+    """Envia um embed salvo para vários canais: #canais, categoria:Nome ou padrao:anuncios-*"""
+    try:
+        alvos = split_arguments(alvos)
+        template = embed_system.get_template(ctx.guild.id, nome_embed)
+        if not template:
+            await ctx.send(f"❌ Embed `{nome_embed}` não encontrado.")
+            return
+        if not alvos:
+            await ctx.send(f"❌ Uso: `{COMMAND_HINT}embed_broadcast nome #canal1 #canal2 categoria:Nome padrao:anuncios-*`")
+            return
+
+        channels, unknown = embed_system.resolve_broadcast_targets(ctx.guild, alvos)
+        if not channels:
+            await ctx.send("❌ Nenhum canal de texto encontrado para: " + ", ".join(f"`{target}`" for target in unknown))
+            return
+
+        await ctx.defer()  # Comando de barra: os envios podem passar dos 3 s da resposta inicial
+        status_msg = await ctx.send(f"📣 Enviando `{nome_embed}` para {len(channels)} canais...")
+        results = await embed_system.broadcast(template, channels, ctx.author)
+        sent = [channel for channel, error in results if error is None]
+        failed = [(channel, error) for channel, error in results if error is not None]
+
+        report = discord.Embed(
+            title=f"📣 Broadcast de `{nome_embed}`",
+            description=f"✅ {len(sent)} enviados • ❌ {len(failed)} falharam",
+            color=0x2ecc71 if not failed else 0xf39c12
+        )
+        if sent:
+            report.add_field(name="Enviados", value=" ".join(channel.mention for channel in sent)[:1024], inline=False)
+        if failed:
+            report.add_field(name="Falhas", value="\n".join(f"{channel.mention}: {error}" for channel, error in failed)[:1024], inline=False)
+        if unknown:
+            report.add_field(name="Não encontrados", value=", ".join(f"`{target}`" for target in unknown)[:1024], inline=False)
+        await status_msg.edit(content=None, embed=report)
+
+        # Um único log para o broadcast inteiro
+        await log_system.log_action(
+            ctx.guild,
+            'embed_broadcast',
+            user=f"{ctx.author} ({ctx.author.id})",
+            embed_name=nome_embed,
+            sent=f"{len(sent)}/{len(channels)}",
+            channels=", ".join(f"#{channel.name}" for channel in sent),
+            failed=", ".join(f"#{channel.name}" for channel, _ in failed),
+            title=template.render(member=ctx.author, guild=ctx.guild).get('title', 'Sem titulo')
+        )
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro no broadcast: {e}")
+
+@bot.hybrid_command()
 @commands.has_permissions(manage_messages=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_messages=True)
 async def embed_list(ctx):
     """Lista todos os embeds salvos"""
     try:
@@ -680,10 +4494,181 @@ async def embed_list(ctx):
     except Exception as e:
         await ctx.send(f"❌ Erro ao listar embeds: {e}")
 
+# COMANDOS DE TICKETS
+@bot.hybrid_command()
+@app_commands.guild_only()
+@app_commands.describe(assunto="Assunto do ticket")
+async def ticket(ctx, *, assunto: str = None):
+    """Abre um ticket privado com a equipe de suporte"""
+    try:
+        await ctx.defer(ephemeral=True)
+        channel, created = await ticket_system.open(ctx.guild, ctx.author, assunto)
+        if channel is None:
+            await ctx.send("⏳ Seu ticket já está sendo aberto.", ephemeral=True)
+            return
+        if not created:
+            await ctx.send(f"ℹ️ Você já tem um ticket aberto: {channel.mention}", ephemeral=True)
+            return
+
+        await send_ticket_welcome(channel, ctx.author, assunto)
+        await ctx.send(f"✅ Ticket aberto: {channel.mention}", ephemeral=True)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao abrir ticket: {e}")
+
+@bot.hybrid_command()
+@app_commands.guild_only()
+@app_commands.describe(motivo="Motivo do fechamento")
+async def ticket_close(ctx, *, motivo: str = None):
+    """Fecha o ticket deste canal e salva a transcrição"""
+    try:
+        if ticket_system.ticket(ctx.channel) is None:
+            await ctx.send("❌ Este canal não é um ticket aberto.", ephemeral=True)
+            return
+        if not ticket_system.can_close(ctx.channel, ctx.author):
+            await ctx.send("❌ Só o autor do ticket ou a equipe de suporte podem fechá-lo.", ephemeral=True)
+            return
+
+        await ctx.defer()  # A transcrição de um ticket longo passa dos 3 s da resposta inicial
+        await ctx.send(f"🔒 Ticket será fechado em {TICKET_CLOSE_DELAY} segundos...")
+        await asyncio.sleep(TICKET_CLOSE_DELAY)
+        await ticket_system.close(ctx.channel, ctx.author, motivo)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao fechar ticket: {e}")
+
+@bot.hybrid_command()
+@commands.has_permissions(manage_guild=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+async def ticket_panel(ctx):
+    """Publica o painel com o botão de abrir ticket e prepara a reserva de canais"""
+    try:
+        embed = discord.Embed(
+            title="🎫 Suporte",
+            description="Clique no botão abaixo para abrir um ticket privado com a equipe de suporte.",
+            color=0x3498db
+        )
+        await ctx.send(embed=embed, view=TicketPanelView())
+        ticket_system.refill(ctx.guild)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao publicar painel de tickets: {e}")
+
+# COMANDOS DE LOGS
+@bot.hybrid_command()
+@commands.has_permissions(view_audit_log=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(view_audit_log=True)
+@app_commands.describe(filtros="usuario:<id> acao:<tipo> canal:<nome> desde:<2h|3d|AAAA-MM-DD> ate:<...>")
+async def logs(ctx, *, filtros: str = ''):
+    """Pesquisa os logs salvos com filtros e paginação"""
+    try:
+        filters = LogSearch.parse_filters(ctx.guild, split_arguments(filtros))
+    except ValueError as e:
+        await ctx.send(f"❌ {e}\n💡 Uso: `{COMMAND_HINT}logs usuario:<id> acao:<tipo> canal:<nome> desde:<2h|3d|AAAA-MM-DD> ate:<...>`")
+        return
+
+    try:
+        await ctx.defer()
+        embed, next_cursor = await LogSearch.build_page(ctx.guild.id, filters, 0)
+        view = LogSearchView(ctx.author.id, ctx.guild.id, filters, next_cursor)
+        await ctx.send(embed=embed, view=view)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao pesquisar logs: {e}")
+
+@bot.hybrid_command()
+@commands.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(dias="Dias de retenção (0 volta ao padrão)", acao="Tipo de ação (opcional)")
+async def log_retention(ctx, dias: int = None, acao: str = None):
+    """Mostra ou define por quantos dias os logs são mantidos"""
+    try:
+        if dias is None:
+            config = log_retention_system.get_retention(ctx.guild.id)
+            embed = discord.Embed(
+                title="🗄️ Retenção de Logs",
+                description=f"Padrão do servidor: **{config.get('default', LOG_RETENTION_DAYS)} dias**",
+                color=0x3498db
+            )
+            for action_type, days in sorted(config.get('actions', {}).items()):
+                embed.add_field(name=action_type, value=f"{days} dias", inline=True)
+            await ctx.send(embed=embed)
+            return
+
+        if dias < 0:
+            await ctx.send("❌ A retenção deve ser um número de dias positivo (ou 0 para voltar ao padrão).")
+            return
+
+        log_retention_system.set_retention(ctx.guild.id, dias, acao)
+        alvo = f"da ação `{acao}`" if acao else "do servidor"
+        if dias:
+            await ctx.send(f"✅ Logs {alvo} serão mantidos por {dias} dias.")
+        else:
+            await ctx.send(f"✅ Retenção {alvo} voltou ao padrão.")
+
+        await log_system.log_action(
+            ctx.guild,
+            'log_retention_set',
+            user=f"{ctx.author} ({ctx.author.id})",
+            days=dias,
+            log_action=acao or 'todas'
+        )
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao configurar retenção de logs: {e}")
+
+@bot.hybrid_command()
+@commands.has_permissions(manage_guild=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.describe(dias="Período em dias")
+async def stats(ctx, dias: int = 1):
+    """Uso de comandos no servidor: totais, erros, latência e os mais usados"""
+    try:
+        dias = max(1, min(dias, COMMAND_STATS_DAILY_RETENTION))
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=dias)
+        total, timeline = command_analytics.summary(ctx.guild.id, since)
+        if not total['count']:
+            await ctx.send(f"ℹ️ Nenhum comando registrado nos últimos {dias} dia(s).")
+            return
+
+        embed = discord.Embed(
+            title=f"📊 Uso de Comandos ({'24h' if dias == 1 else f'{dias} dias'})",
+            description=f"**{total['count']}** execuções • **{total['errors']}** erros ({total['errors'] / total['count']:.1%}) • "
+                        f"latência média {total['latency_ms'] / total['count']:.0f} ms (máx. {total['max_latency_ms']:.0f} ms)",
+            color=0x3498db
+        )
+        commands_lines = [
+            f"`{COMMAND_HINT}{name}` {count}× • {errors} erros • {latency_ms / count:.0f} ms"
+            for name, (count, errors, latency_ms) in sorted(total['commands'].items(), key=lambda item: item[1][0], reverse=True)[:10]
+        ]
+        embed.add_field(name="Comandos", value="\n".join(commands_lines)[:1024], inline=False)
+        top_users = collections.Counter(total['users']).most_common(5)
+        embed.add_field(name="Usuários", value="\n".join(f"<@{user_id}>: {count}" for user_id, count in top_users) or "-", inline=True)
+        top_channels = collections.Counter(total['channels']).most_common(5)
+        embed.add_field(name="Canais", value="\n".join(f"<#{channel_id}>: {count}" for channel_id, count in top_channels) or "-", inline=True)
+
+        # Barras por hora (24h) ou por dia
+        if timeline:
+            peak = max(timeline.values())
+            bars = "▁▂▃▄▅▆▇█"
+            sparkline = "".join(bars[min(len(bars) - 1, count * len(bars) // (peak + 1))] for count in timeline.values())
+            embed.add_field(name=f"Por {'hora' if dias <= 2 else 'dia'} (pico {peak})", value=f"`{sparkline[-60:]}`", inline=False)
+        await ctx.send(embed=embed)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao gerar estatísticas: {e}")
+
 # COMANDOS DE MODERAÇÃO
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(ban_members=True)
-async def ban(ctx, member: discord.Member, *, reason="Não especificado"):
+@app_commands.guild_only()
+@app_commands.default_permissions(ban_members=True)
+@app_commands.describe(member="Membro a banir", reason="Motivo do banimento")
+async def ban(ctx, member: discord.Member, *, reason: str = "Não especificado"):
     """Bane um usuário"""
     try:
         await member.ban(reason=reason)
@@ -709,48 +4694,174 @@ async def ban(ctx, member: discord.Member, *, reason="Não especificado"):
     except Exception as e:
         await ctx.send(f"❌ Erro ao banir: {e}")
 
-@bot.command()
+@bot.hybrid_command()
 @commands.has_permissions(manage_messages=True)
-async def clear(ctx, amount: int = 10):
-    """Limpa mensagens"""
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_messages=True)
+@app_commands.describe(amount="Quantidade de mensagens", filtros="autor:@user bots links anexos regex:... desde:2h ate:30m")
+async def clear(ctx, amount: int = 10, *, filtros: str = ''):
+    """Limpa mensagens (até PURGE_MAX), com filtros opcionais"""
     try:
-        if amount > 100:
-            await ctx.send("❌ Máximo de 100 mensagens.")
+        filtros = split_arguments(filtros)
+        if amount < 1 or amount > PURGE_MAX:
+            await ctx.send(f"❌ Quantidade deve estar entre 1 e {PURGE_MAX}.")
+            return
+        try:
+            filters = purge_engine.parse_filters(filtros)
+        except ValueError as e:
+            await ctx.send(f"❌ {e}")
+            return
+        if purge_engine.is_running(ctx.channel.id):
+            await ctx.send(f"⏳ Já existe uma limpeza em andamento neste canal. Use `{COMMAND_HINT}clear_cancel` para interromper.")
             return
 
-        deleted = await ctx.channel.purge(limit=amount + 1)
+        if ctx.interaction is None:
+            LogSystem.suppress_delete_logs([ctx.message.id])
+            try:
+                await ctx.message.delete()
+            except discord.HTTPException:
+                pass
+        else:
+            await ctx.defer(ephemeral=True)  # A limpeza leva bem mais que os 3 s da resposta inicial
+
+        view = PurgeView(ctx.channel.id)
+        status_msg = await ctx.send(f"🧹 Limpando até {amount} mensagens...", view=view)
 
+        async def on_progress(job):
+            await status_msg.edit(content=f"🧹 {job['deleted']}/{amount} apagadas • {job['scanned']} verificadas"
+                                          + (f" • {job['single']} antigas uma a uma" if job['single'] else ""))
+
+        job = await purge_engine.run(ctx.channel, amount, filters, ctx.message, on_progress)
+
+        summary = f"{job['deleted']} mensagens deletadas" + (" (cancelado)" if job['cancelled'] else "")
+        if job['failed']:
+            summary += f", {job['failed']} falharam"
+
+        # Um log resumido para a limpeza inteira
         await log_system.log_action(
             ctx.guild,
             'clear',
             moderator=f"{ctx.author} ({ctx.author.id})",
             channel=ctx.channel.name,
-            messages_deleted=str(len(deleted) - 1)
+            messages_deleted=str(job['deleted']),
+            scanned=str(job['scanned']),
+            old_messages=str(job['single']) if job['single'] else None,
+            failed=str(job['failed']) if job['failed'] else None,
+            filters=purge_engine.describe_filters(filters),
+            cancelled="sim" if job['cancelled'] else None
         )
 
-        msg = await ctx.send(f"✅ {len(deleted) - 1} mensagens deletadas!")
-        await asyncio.sleep(3)
-        await msg.delete()
+        view.stop()
+        await status_msg.edit(content=f"✅ {summary}!", view=None)
+        if ctx.interaction is None:
+            await asyncio.sleep(3)
+            await status_msg.delete()
 
     except Exception as e:
         await ctx.send(f"❌ Erro ao limpar: {e}")
 
+@bot.hybrid_command()
+@commands.has_permissions(manage_messages=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_messages=True)
+async def clear_cancel(ctx):
+    """Interrompe a limpeza em andamento no canal"""
+    if purge_engine.cancel(ctx.channel.id):
+        await ctx.send("⏹️ Limpeza será interrompida.")
+    else:
+        await ctx.send("ℹ️ Nenhuma limpeza em andamento neste canal.")
+
+# COMANDOS DO SISTEMA
+@bot.hybrid_command()
+@commands.has_permissions(administrator=True)
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+async def shards(ctx):
+    """Mostra o estado de cada shard em todos os processos"""
+    try:
+        clusters = shard_status.collect() or [shard_status.local_status()]
+        embed = discord.Embed(
+            title="🧩 Shards",
+            description=f"Este servidor está na shard **{ctx.guild.shard_id}**",
+            color=0x3498db
+        )
+        for cluster in clusters:
+            lines = [
+                f"{'🟢' if shard['connected'] else '🔴'} `#{shard['id']}` {shard['latency_ms'] if shard['latency_ms'] is not None else '—'} ms • {shard['guilds']} servidores"
+                for shard in cluster['shards']
+            ]
+            name = f"Cluster {cluster['cluster']} (pid {cluster['pid']})" + (" ⚠️ sem resposta" if cluster.get('stale') else "")
+            embed.add_field(name=name, value="\n".join(lines)[:1024] or "-", inline=False)
+        await ctx.send(embed=embed)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao consultar shards: {e}")
+
+@bot.hybrid_command()
+@commands.is_owner()
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(segundos="Janela do profile em segundos")
+async def profile(ctx, segundos: int = 30):
+    """Profile por amostragem do event loop nos últimos N segundos, com travamentos e handlers lentos"""
+    try:
+        await ctx.defer(ephemeral=True)
+        if not PROFILER_SAMPLE_INTERVAL:
+            await ctx.send("❌ Profiler desativado (PROFILER_SAMPLE_INTERVAL=0)")
+            return
+        segundos = max(1, min(segundos, PROFILER_WINDOW))
+        report = await asyncio.to_thread(loop_watchdog.profile, segundos)
+        if not report['samples']:
+            await ctx.send("❌ Nenhuma amostra coletada ainda")
+            return
+
+        busy = report['busy']
+        embed = discord.Embed(
+            title=f"🔬 Profile do event loop ({segundos}s)",
+            description=f"Loop ocupado em **{busy / report['samples']:.0%}** das {report['samples']} amostras "
+                        f"(a cada {PROFILER_SAMPLE_INTERVAL * 1000:.0f} ms) • "
+                        f"429 desde o início: {int(metrics.total('discord_http_rate_limited_total'))}",
+            color=0x9b59b6
+        )
+        top = lambda counter: "\n".join(f"`{count / busy:6.1%}` {name}" for name, count in counter.most_common(10))[:1024] or "-"
+        if busy:
+            embed.add_field(name="Tempo próprio", value=top(report['own']), inline=False)
+            embed.add_field(name="Tempo inclusivo", value=top(report['inclusive']), inline=False)
+
+        stalls = loop_watchdog.recent(loop_watchdog.stalls, segundos)
+        if stalls:
+            lines = [f"`{stall['duration']:.2f}s` {stall['stack'].strip().splitlines()[-2].strip()}" for stall in stalls[-5:]]
+            embed.add_field(name=f"⚠️ Travamentos ({len(stalls)})", value="\n".join(lines)[:1024], inline=False)
+        slow_calls = loop_watchdog.recent(loop_watchdog.slow_calls, segundos)
+        if slow_calls:
+            lines = [f"`{elapsed:.2f}s` {kind} {name}" for _, kind, name, elapsed in slow_calls[-10:]]
+            embed.add_field(name=f"🐢 Handlers lentos ({len(slow_calls)})", value="\n".join(lines)[:1024], inline=False)
+
+        file = discord.File(io.BytesIO(report['folded'].encode('utf-8')), filename="profile.folded")
+        await ctx.send(embed=embed, file=file)
+
+    except Exception as e:
+        await ctx.send(f"❌ Erro ao gerar profile: {e}")
+
 # COMANDO AJUDA
-@bot.command()
+@bot.hybrid_command()
 async def ajuda(ctx):
     """Mostra todos os comandos"""
+    p = COMMAND_HINT
     embed = discord.Embed(
         title="🤖 Sistema Completo de Moderação",
-        description=f"**Prefixo:** `{PREFIX}`",
+        description=f"**Prefixo:** `{PREFIX}` • também como comandos de barra (`/`)" if PREFIX_COMMANDS else "**Comandos de barra:** `/`",
         color=0x00ff00
     )
 
     embed.add_field(
         name="🎯 Sistema de Boas-Vindas",
         value=f"""
-        `{PREFIX}set_welcome_role @cargo` - Define cargo automático
-        `{PREFIX}remove_welcome_role` - Remove cargo automático
-        `{PREFIX}show_welcome_role` - Mostra cargo configurado
+        `{p}set_welcome_role @cargo` - Define cargo automático
+        `{p}remove_welcome_role` - Remove cargo automático
+        `{p}show_welcome_role` - Mostra cargo configurado
+        `{p}backfill_welcome_role` - Aplica o cargo aos membros atuais
+        `{p}backfill_status` / `{p}backfill_cancel` - Acompanha ou cancela
+        `{p}join_stats` - Métricas de entradas
         """,
         inline=False
     )
@@ -758,9 +4869,40 @@ async def ajuda(ctx):
     embed.add_field(
         name="📝 Sistema de Embeds",
         value=f"""
-        `{PREFIX}embed_create [nome]` - Cria embed interativo
-        `{PREFIX}embed_send nome [canal]` - Envia embed salvo
-        `{PREFIX}embed_list` - Lista embeds salvos
+        `{p}embed_create [nome] [titulo] [descricao]` - Cria embed (interativo sem título e descrição)
+        `{p}embed_send nome [canal]` - Envia embed salvo
+        `{p}embed_broadcast nome #canais categoria:Nome padrao:anuncios-*` - Envia para vários canais
+        `{p}embed_list` - Lista embeds salvos
+        Variáveis: `{{member}}` `{{member.name}}` `{{guild}}` `{{guild.member_count}}` `{{channel}}` `{{date}}` `{{time}}`
+        """,
+        inline=False
+    )
+
+    embed.add_field(
+        name="🎫 Tickets",
+        value=f"""
+        `{p}ticket [assunto]` - Abre um ticket privado
+        `{p}ticket_close [motivo]` - Fecha o ticket e salva a transcrição
+        `{p}ticket_panel` - Publica o painel com botão de abrir ticket
+        """,
+        inline=False
+    )
+
+    embed.add_field(
+        name="📜 Logs",
+        value=f"""
+        `{p}logs [usuario:id] [acao:tipo] [canal:nome] [desde:2h] [ate:1d]` - Pesquisa logs
+        `{p}log_retention [dias] [ação]` - Retenção dos logs
+        """,
+        inline=False
+    )
+
+    embed.add_field(
+        name="⚙️ Sistema",
+        value=f"""
+        `{p}stats [dias]` - Uso de comandos no servidor
+        `{p}shards` - Estado das shards
+        `{p}profile [segundos]` - Profile do event loop (dono do bot)
         """,
         inline=False
     )
@@ -768,46 +4910,163 @@ async def ajuda(ctx):
     embed.add_field(
         name="🛡️ Moderação",
         value=f"""
-        `{PREFIX}ban @user [motivo]` - Banir usuário
-        `{PREFIX}clear [quantidade]` - Limpar mensagens
+        `{p}ban @user [motivo]` - Banir usuário
+        `{p}clear [quantidade] [autor:@user] [bots] [links] [anexos] [regex:...] [desde:2h] [ate:30m]` - Limpar mensagens
+        `{p}clear_cancel` - Interrompe a limpeza em andamento
         """,
         inline=False
     )
 
-    await ctx.send(embed=embed)
+    await ctx.send(embed=embed, ephemeral=True)
+
+# MÉTRICAS DOS SISTEMAS (lidas só quando /metrics é consultado)
+def gateway_latencies():
+    if hasattr(bot, 'latencies'):
+        return {(('shard', str(shard_id)),): latency for shard_id, latency in bot.latencies}
+    return {(('shard', str(bot.shard_id or 0)),): bot.latency}
+
+def persistence_stat(key, scale=1):
+    return lambda: persistence.stats[key] * scale
+
+metrics.register('discord_gateway_latency_seconds', 'gauge', 'Latência do heartbeat do gateway', gateway_latencies)
+metrics.register('discord_event_loop_lag_last_seconds', 'gauge', 'Último atraso medido do event loop', lambda: metrics.loop_lag)
+metrics.register('bot_log_queue_depth', 'gauge', 'Logs aguardando entrega', log_delivery.depth)
+metrics.register('bot_log_delivery_total', 'counter', 'Eventos da fila de entrega de logs',
+                 lambda: {(('result', key),): value for key, value in list(log_delivery.stats.items())})
+metrics.register('bot_join_queue_depth', 'gauge', 'Entradas aguardando processamento', join_pipeline.queue_depth)
+metrics.register('bot_persistence_writes_total', 'counter', 'Escritas em disco concluídas', persistence_stat('writes'))
+metrics.register('bot_persistence_bytes_written_total', 'counter', 'Bytes gravados em disco', persistence_stat('bytes_written'))
+metrics.register('bot_persistence_errors_total', 'counter', 'Falhas de serialização ou escrita', persistence_stat('errors'))
+metrics.register('bot_persistence_pending_writes', 'gauge', 'Escritas enviadas e ainda não concluídas', persistence_stat('pending_writes'))
+metrics.register('bot_persistence_coalesced_total', 'counter', 'Reescritas absorvidas por outra pendente', persistence_stat('coalesced'))
+def cache_requests():
+    caches = {'log_channel': LogSystem.cache_stats, 'embed_template': EmbedSystem.cache_stats, 'message': message_cache.stats}
+    return {
+        (('cache', cache), ('result', result)): stats[key]
+        for cache, stats in caches.items()
+        for result, key in (('hit', 'hits'), ('miss', 'misses'))
+    }
+
+metrics.register('bot_cache_requests_total', 'counter', 'Consultas aos caches por resultado', cache_requests)
+metrics.register('bot_message_edits_total', 'counter', 'Edições recebidas e logs gerados depois do agrupamento',
+                 lambda: {(('stage', stage),): value for stage, value in edit_coalescer.stats.items()})
+metrics.register('bot_message_cache_bytes', 'gauge', 'Bytes estimados do cache compacto de mensagens', lambda: message_cache.bytes)
+metrics.register('bot_message_cache_evicted_total', 'counter', 'Mensagens removidas do cache por falta de espaço', lambda: message_cache.stats['evicted'])
+metrics.register('bot_tickets_opened_total', 'counter', 'Tickets abertos, pela reserva de canais ou criando o canal na hora',
+                 lambda: {(('source', 'pool'),): ticket_system.stats['pool_hits'], (('source', 'created'),): ticket_system.stats['pool_misses']})
+metrics.register('bot_tickets_closed_total', 'counter', 'Tickets fechados com transcrição', lambda: ticket_system.stats['closed'])
+
+# SERVIDOR WEB (aiohttp no mesmo event loop do bot, para UptimeRobot e health checks)
+class WebServer:
+    """Status, /health, /ready, /metrics e /shards servidos pelo event loop do bot.
 
-# CONFIGURAÇÃO FLASK PARA UPTIMEROBOT
-app = Flask('')
+    Os handlers rodam na mesma thread que o discord.py, então leem o estado do bot
+    diretamente, sem travas nem cópias entre threads."""
 
-@app.route('/')
-def home():
-    return f"""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self.ready_check = self.bot_readiness
+        self._runner = None
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/', self.home),
+            web.get('/ping', self.ping),
+            web.get('/health', self.health),
+            web.get('/ready', self.ready),
+            web.get('/metrics', self.metrics),
+            web.get('/shards', self.shards)
+        ])
+
+    async def start(self):
+        """Começa a aceitar conexões (uma vez só; falha de porta não derruba o bot)"""
+        if self._runner is not None:
+            return
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            print(f"🌐 Servidor web iniciado na porta {self.port}")
+        except OSError as e:
+            print(f"❌ Servidor web não iniciou na porta {self.port}: {e}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @staticmethod
+    def gateway_connected():
+        """Todas as conexões de gateway deste processo estão abertas"""
+        if isinstance(bot, commands.AutoShardedBot):
+            return bool(bot.shards) and all(not shard.is_closed() for shard in bot.shards.values())
+        return bot.ws is not None and bot.ws.open
+
+    @classmethod
+    def bot_readiness(cls):
+        return {
+            'ready': bot.is_ready(),
+            'connected': not bot.is_closed() and cls.gateway_connected(),
+            'guilds': len(bot.guilds),
+            'shards': shard_status.local_status()['shards']
+        }
+
+    async def home(self, request):
+        status = "🟢 Online" if bot.is_ready() else "🟡 Conectando"
+        return web.Response(content_type='text/html', text=f"""
     <h1>🚀 Bot Discord Online!</h1>
+    <p>Status: {status}{f" como {bot.user}" if bot.user else ""}</p>
+    <p>Servidores: {len(bot.guilds)}</p>
     <p>Hora: {datetime.datetime.now()}</p>
-    <p>Webview funcionando!</p>
-    """
+    """)
+
+    async def ping(self, request):
+        return web.Response(text="pong")
+
+    async def health(self, request):
+        """Liveness: responde enquanto o event loop estiver girando"""
+        return web.json_response({
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'loop_lag_ms': round(metrics.loop_lag * 1000, 1)
+        })
+
+    async def ready(self, request):
+        """Readiness: 200 só com o gateway conectado e o bot pronto, senão 503"""
+        status = self.ready_check()
+        return web.json_response(status, status=200 if status['ready'] and status['connected'] else 503)
 
-@app.route('/ping')
-def ping():
-    return "pong"
+    async def metrics(self, request):
+        return web.Response(text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
 
-def run_flask():
-    app.run(host='0.0.0.0', port=10000)
+    async def shards(self, request):
+        return web.json_response({'clusters': shard_status.collect()})
 
-def keep_alive():
-    server = Thread(target=run_flask)
-    server.start()
+# Processos do cluster usam uma porta própria cada, depois da porta do lançador
+web_server = WebServer(WEB_HOST, WEB_PORT + 1 + CLUSTER_ID if IS_CLUSTER_WORKER else WEB_PORT)
 
 # INICIAR TUDO
 if __name__ == "__main__":
+    if "--migrate-sqlite" in sys.argv:
+        migrate_json_to_sqlite()
+        sys.exit(0)
+
+    if SHARD_MODE == 'cluster' and not IS_CLUSTER_WORKER:
+        # Processo lançador: só o servidor web e a supervisão dos processos de shards
+        launcher = ShardClusterLauncher(SHARD_CLUSTERS, SHARD_COUNT)
+        try:
+            asyncio.run(launcher.run())
+        except KeyboardInterrupt:
+            launcher.stop()
+        sys.exit(0)
+
     print("🚀 Iniciando bot...")
     print("🔧 Configurações carregadas:")
     print(f"   - Prefixo: {PREFIX}")
     print(f"   - Token: {'✅ Configurado' if TOKEN else '❌ Não encontrado'}")
-    
-    keep_alive()
-    print("🌐 Servidor web iniciado na porta 8080")
-    
+    print(f"   - Porta web: {web_server.port}")
+
     try:
         if TOKEN:
             bot.run(TOKEN)
@@ -816,3 +5075,7 @@ if __name__ == "__main__":
             print("💡 Configure a variável de ambiente DISCORD_TOKEN")
     except Exception as e:
         print(f"❌ Erro ao iniciar bot: {e}")
+    finally:
+        command_analytics.flush(include_current=True)
+        persistence.shutdown()
+        print(f"💾 Dados salvos ({persistence.stats['writes']} escritas)")